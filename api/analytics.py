@@ -0,0 +1,212 @@
+"""
+Daily sales rollups per menu item and per category.
+
+Revenue is what the customer pays: an order's stored ``subtotal`` (its total
+less the discount), split over its menu items and categories in proportion
+to their share of the total.
+"""
+
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from .models import (
+    CENTS,
+    DailyCategorySales,
+    DailyMenuItemSales,
+    Job,
+    Order,
+    OrderItem,
+)
+
+
+def _allocate(net, gross):
+    """
+    Split ``net`` over the keys of ``gross`` in proportion to their values,
+    in cents that add up to ``net`` exactly. The key with the largest gross
+    takes the rounding difference.
+    """
+    gross_total = sum(gross.values())
+    if not gross_total:
+        return {key: Decimal(0) for key in gross}
+    shares = {
+        key: (net * value / gross_total).quantize(CENTS, rounding=ROUND_HALF_UP)
+        for key, value in gross.items()
+    }
+    largest = max(gross, key=lambda key: (gross[key], key))
+    shares[largest] += net - sum(shares.values())
+    return shares
+
+
+def _net_lines(quantities, gross, net):
+    """
+    ``{key: [orders, quantity, revenue]}`` for one order.
+    """
+    revenue = _allocate(net, gross)
+    return {key: [1, quantities[key], revenue[key]] for key in gross}
+
+
+def _order_lines(items, net):
+    """
+    Aggregate the items of a single order into
+    ``{key: [orders, quantity, revenue]}`` per menu item and per category,
+    sharing out the order's ``net`` revenue.
+    """
+    lines = []
+    for key_of in (
+        lambda item: item.menuitem_id,
+        lambda item: item.menuitem.category_id,
+    ):
+        quantities = defaultdict(int)
+        gross = defaultdict(Decimal)
+        for item in items:
+            quantities[key_of(item)] += item.quantity
+            gross[key_of(item)] += item.price * item.quantity
+        lines.append(_net_lines(quantities, gross, net))
+    return lines
+
+
+def _apply(model, key_field, day, status, lines, sign):
+    for key, (orders, quantity, revenue) in lines.items():
+        lookup = {"date": day, key_field: key, "status": status}
+        changes = {
+            "orders": F("orders") + sign * orders,
+            "quantity": F("quantity") + sign * quantity,
+            "revenue": F("revenue") + sign * revenue,
+        }
+        if model.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(
+                    **lookup,
+                    orders=sign * orders,
+                    quantity=sign * quantity,
+                    revenue=sign * revenue,
+                )
+        except IntegrityError:
+            # Another request created the row first.
+            model.objects.filter(**lookup).update(**changes)
+
+
+def _record(order, items, status, sign):
+    day = timezone.localdate(order.created)
+    by_menuitem, by_category = _order_lines(items, order.subtotal)
+    with transaction.atomic():
+        _apply(DailyMenuItemSales, "menuitem_id", day, status, by_menuitem, sign)
+        _apply(DailyCategorySales, "category_id", day, status, by_category, sign)
+
+
+def record_order_created(order, items, status=None):
+    """
+    Add a new order to the rollups under ``status`` (its current status by
+    default). ``items`` are its order items with ``menuitem`` loaded.
+    """
+    _record(order, items, status or order.status, 1)
+
+
+def record_status_change(order, old_status, new_status):
+    """
+    Move an order's sales from ``old_status`` to ``new_status``.
+    """
+    if old_status == new_status:
+        return
+    items = list(order.items.select_related("menuitem"))
+    with transaction.atomic():
+        _record(order, items, old_status, -1)
+        _record(order, items, new_status, 1)
+
+
+def _aggregate(queryset, key_field, orders, target):
+    """
+    Add the items in ``queryset`` to ``target``, per day, key and status.
+    ``orders`` maps order ids to ``(day, status, net revenue)``.
+    """
+    money = models.DecimalField(max_digits=14, decimal_places=2)
+    rows = (
+        queryset.values("order", key_field)
+        .annotate(
+            total_quantity=Sum("quantity"),
+            total_revenue=Sum(F("price") * F("quantity"), output_field=money),
+        )
+        .order_by()
+    )
+    by_order = defaultdict(lambda: ({}, {}))
+    for row in rows:
+        quantities, gross = by_order[row["order"]]
+        quantities[row[key_field]] = row["total_quantity"]
+        gross[row[key_field]] = row["total_revenue"]
+    for order_id, (quantities, gross) in by_order.items():
+        day, status, net = orders[order_id]
+        for key, line in _net_lines(quantities, gross, net).items():
+            totals = target[(day, key, status)]
+            for index, value in enumerate(line):
+                totals[index] += value
+
+
+def _rollup_rows(model, key_field, totals):
+    for (day, key, status), (orders, quantity, revenue) in totals.items():
+        yield model(
+            date=day,
+            status=status,
+            orders=orders,
+            quantity=quantity,
+            revenue=revenue,
+            **{key_field: key},
+        )
+
+
+def rebuild_rollups(chunk_size=5000):
+    """
+    Recompute both rollup tables from the orders, aggregating one chunk of
+    orders at a time. Returns the number of orders processed.
+
+    Sales jobs queued before the rebuild started describe changes it counts,
+    so they are marked done instead of being applied on top. Jobs already
+    running may still add theirs; run it while the job workers are idle for
+    an exact result.
+    """
+    from .tasks import move_order_sales, record_order_sales
+
+    sales_tasks = [record_order_sales.task_name, move_order_sales.task_name]
+    last_job_id = Job.objects.aggregate(last=Max("pk"))["last"] or 0
+    by_menuitem = defaultdict(lambda: [0, 0, Decimal(0)])
+    by_category = defaultdict(lambda: [0, 0, Decimal(0)])
+    processed = 0
+    last_id = 0
+    while True:
+        chunk = list(
+            Order.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", "created", "status", "subtotal")[:chunk_size]
+        )
+        if not chunk:
+            break
+        orders = {
+            pk: (timezone.localdate(created), status, subtotal)
+            for pk, created, status, subtotal in chunk
+        }
+        first_id, last_id = chunk[0][0], chunk[-1][0]
+        processed += len(chunk)
+        items = OrderItem.objects.filter(order_id__gte=first_id, order_id__lte=last_id)
+        _aggregate(items, "menuitem", orders, by_menuitem)
+        _aggregate(items, "menuitem__category", orders, by_category)
+
+    with transaction.atomic():
+        Job.objects.filter(
+            name__in=sales_tasks, status=Job.QUEUED, pk__lte=last_job_id
+        ).update(status=Job.SUCCEEDED, finished=timezone.now())
+        DailyMenuItemSales.objects.all().delete()
+        DailyCategorySales.objects.all().delete()
+        DailyMenuItemSales.objects.bulk_create(
+            _rollup_rows(DailyMenuItemSales, "menuitem_id", by_menuitem),
+            batch_size=1000,
+        )
+        DailyCategorySales.objects.bulk_create(
+            _rollup_rows(DailyCategorySales, "category_id", by_category),
+            batch_size=1000,
+        )
+    return processed
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import checks, signals, tasks  # noqa: F401
+        from .dbrouter import configure_sqlite, install_write_recorder
+        from .timing import install_query_recorder, instrument_serializers
+
+        instrument_serializers()
+        connection_created.connect(install_query_recorder)
+        connection_created.connect(configure_sqlite)
+        connection_created.connect(install_write_recorder)
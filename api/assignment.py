@@ -0,0 +1,145 @@
+"""
+Automatic assignment of delivery crew to pending orders.
+
+Unassigned pending orders are handed out oldest first, each to the active
+Crew member with the fewest open (pending) orders. The loads are read with
+one grouped query per batch and then tracked in memory. Each order is
+taken by its own UPDATE that only matches while it is still unassigned, so
+concurrent runs never assign or report an order twice.
+"""
+
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .events import publish_order_event
+from .models import Order
+from .roles import CREW
+
+OPEN_STATUS = "pending"
+ASSIGNMENT_BATCH_SIZE = getattr(settings, "ORDER_ASSIGNMENT_BATCH_SIZE", 500)
+
+
+class CrewLoad:
+    """
+    Open-order counts per crew member, with the least loaded one on top.
+    """
+
+    def __init__(self, loads, max_load=None):
+        self.max_load = max_load
+        self.loads = dict(loads)
+        self.heap = [(load, crew_id) for crew_id, load in self.loads.items()]
+        heapq.heapify(self.heap)
+
+    @classmethod
+    def load(cls, crew_ids, max_load=None):
+        counts = dict(
+            Order.objects.filter(status=OPEN_STATUS, delivery_crew__in=crew_ids)
+            .values_list("delivery_crew")
+            .annotate(open_orders=Count("id"))
+            .order_by()
+        )
+        return cls({pk: counts.get(pk, 0) for pk in crew_ids}, max_load)
+
+    def take(self):
+        """
+        Return the least loaded crew member and count one more order for
+        them, or None if everyone is at ``max_load``.
+        """
+        if not self.heap:
+            return None
+        load, crew_id = self.heap[0]
+        if self.max_load is not None and load >= self.max_load:
+            return None
+        heapq.heapreplace(self.heap, (load + 1, crew_id))
+        self.loads[crew_id] = load + 1
+        return crew_id
+
+
+def crew_members():
+    return list(
+        User.objects.filter(groups__name=CREW, is_active=True)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def assign_batch(crew_ids, batch_size, max_load=None):
+    """
+    Assign up to ``batch_size`` orders. Returns ``({order: crew}, loads)``.
+    """
+    with transaction.atomic():
+        candidates = Order.objects.filter(
+            status=OPEN_STATUS, delivery_crew__isnull=True
+        ).order_by("created", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        order_ids = list(candidates.values_list("pk", flat=True)[:batch_size])
+        if not order_ids:
+            return {}, {}
+
+        loads = CrewLoad.load(crew_ids, max_load)
+        plan = defaultdict(list)
+        for order_id in order_ids:
+            crew_id = loads.take()
+            if crew_id is None:
+                break
+            plan[crew_id].append(order_id)
+
+        now = timezone.now()
+        won = {}
+        for crew_id, ids in plan.items():
+            for pk in ids:
+                # Only an order that is still unassigned is taken, so of two
+                # runs that picked it only the one whose UPDATE matched wins.
+                taken = Order.objects.filter(
+                    pk=pk, status=OPEN_STATUS, delivery_crew__isnull=True
+                ).update(
+                    delivery_crew_id=crew_id, updated=now, version=F("version") + 1
+                )
+                if taken == 1:
+                    won[pk] = crew_id
+                else:
+                    loads.loads[crew_id] -= 1
+
+        customers = Order.objects.filter(pk__in=won).values_list("pk", "customer")
+        for pk, customer_id in customers:
+            publish_order_event(pk, customer_id, OPEN_STATUS, won[pk])
+        return won, loads.loads
+
+
+def assign_pending_orders(limit=None, max_load=None, batch_size=None):
+    """
+    Assign unassigned pending orders to crew by current load. Returns a
+    report with the number of orders assigned and the per-crew counts.
+    """
+    batch_size = batch_size or ASSIGNMENT_BATCH_SIZE
+    if max_load is None:
+        max_load = getattr(settings, "ORDER_ASSIGNMENT_MAX_LOAD", None)
+    crew_ids = crew_members()
+    assigned = defaultdict(int)
+    loads = {}
+    total = 0
+    while crew_ids and (limit is None or total < limit):
+        size = batch_size if limit is None else min(batch_size, limit - total)
+        assignments, batch_loads = assign_batch(crew_ids, size, max_load)
+        if not assignments:
+            break
+        for crew_id in assignments.values():
+            assigned[crew_id] += 1
+        loads.update(batch_loads)
+        total += len(assignments)
+        if len(assignments) < size:
+            break
+    return {
+        "assigned": total,
+        "crew": [
+            {"id": crew_id, "assigned": assigned[crew_id], "open_orders": load}
+            for crew_id, load in sorted(loads.items())
+        ],
+    }
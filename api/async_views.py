@@ -0,0 +1,373 @@
+"""
+Async versions of the hot menu and cart endpoints, served at
+``/api/v1/async/...``. They use Django's async ORM and cache APIs so that
+under an ASGI server a request waiting on the database does not hold a
+worker thread. Responses match the DRF views they mirror.
+
+The order event stream lives here too: it holds its connection open for as
+long as the client listens, which only an ASGI server can afford.
+"""
+
+import functools
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .authentication import RoleJWTAuthentication, aload_token_user
+from .carts import CartBusy, get_cart_store
+from .cache import (
+    MENU_NAMESPACE,
+    RESPONSE_CACHE_TIMEOUT,
+    arecord,
+    aresponse_cache_key,
+)
+from .events import MANAGERS_CHANNEL, get_broker, order_event, user_channel
+from .models import CartItem, MenuItem, Order
+from .pagination import MenuItemPagination
+from .roles import aget_roles
+from .search import SEARCH_TRUNCATED_HEADER, apply_search
+from .serializers import CartItemSerializer, MenuItemSerializer
+from .throttling import DEFAULT_SCOPE, get_bucket, rate_limit_headers
+from .views import MenuItemViewSet
+
+TRUE_VALUES = {"true", "True", "1"}
+FALSE_VALUES = {"false", "False", "0"}
+# How long an EventSource waits before reconnecting, in milliseconds.
+EVENT_STREAM_RETRY = 3000
+
+
+def error(detail, status):
+    return JsonResponse({"detail": detail, "status": "fail"}, status=status)
+
+
+def cart_busy(exc):
+    return JsonResponse(
+        exc.detail, status=exc.status_code, headers={"Retry-After": str(exc.wait)}
+    )
+
+
+def not_found(model):
+    return JsonResponse(
+        {"detail": f"No {model.__name__} matches the given query."}, status=404
+    )
+
+
+async def authenticate(request):
+    """
+    Resolve the user from a ``Token`` or ``Bearer`` header like the DRF
+    views, falling back to the session. Returns ``(user, uses_session)``.
+    """
+    auth = request.headers.get("Authorization", "").split()
+    if len(auth) == 2 and auth[0].lower() == "token":
+        return await aload_token_user(auth[1]), False
+    if len(auth) == 2 and auth[0].lower() == "bearer":
+        authenticator = RoleJWTAuthentication()
+        try:
+            token = authenticator.get_validated_token(auth[1])
+        except InvalidToken:
+            return None, False
+        return authenticator.get_user(token), False
+    return await request.auser(), True
+
+
+def csrf_failure(request):
+    # Session-authenticated writes need the same CSRF check DRF applies.
+    check = CsrfViewMiddleware(lambda request: None)
+    check.process_request(request)
+    return check.process_view(request, None, (), {})
+
+
+async def customer_or_error(request):
+    user, uses_session = await authenticate(request)
+    if user is None:
+        return None, error("Invalid token.", 401)
+    if not user.is_authenticated:
+        return None, error("Authentication credentials were not provided.", 403)
+    if uses_session and request.method not in ("GET", "HEAD", "OPTIONS"):
+        failure = csrf_failure(request)
+        if failure is not None:
+            return None, failure
+    return user, None
+
+
+async def check_rate(request, scope, user=None):
+    """
+    Take a token from the client's bucket in ``scope`` like RoleRateThrottle
+    does for the DRF views. Returns a 429 response when none is left.
+    """
+    roles = await aget_roles(user)
+    if roles.is_authenticated:
+        client = f"user:{user.pk}"
+    else:
+        client = f"ip:{BaseThrottle().get_ident(request)}"
+    bucket = get_bucket(scope, roles, client)
+    if bucket is None:
+        return None
+    limit = await bucket.aconsume()
+    request.api_rate_limit_headers = rate_limit_headers(limit)
+    if limit.allowed:
+        return None
+    wait = math.ceil(limit.wait)
+    return JsonResponse(
+        {"detail": f"Request was throttled. Expected available in {wait} seconds."},
+        status=429,
+    )
+
+
+def sends_rate_limit_headers(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        response = await view(request, *args, **kwargs)
+        for name, value in getattr(request, "api_rate_limit_headers", {}).items():
+            response[name] = value
+        return response
+
+    return wrapper
+
+
+def request_data(request):
+    if request.content_type == "application/json":
+        return json.loads(request.body or b"{}")
+    return request.POST
+
+
+async def cached_json(request, build):
+    """
+    Serve ``build(headers)`` from the cache; ``build`` returns the data and
+    status and may add response headers to ``headers``, which are cached too.
+    """
+    key = await aresponse_cache_key(MENU_NAMESPACE, request)
+    cached = await cache.aget(key)
+    if cached is not None:
+        await arecord(MENU_NAMESPACE, "hit")
+        data, headers = cached
+        return JsonResponse(data, safe=False, headers={**headers, "X-Cache": "HIT"})
+
+    await arecord(MENU_NAMESPACE, "miss")
+    headers = {}
+    data, status = await build(headers)
+    if status == 200:
+        await cache.aset(key, (data, headers), RESPONSE_CACHE_TIMEOUT)
+    return JsonResponse(
+        data, safe=False, status=status, headers={**headers, "X-Cache": "MISS"}
+    )
+
+
+@require_GET
+@sends_rate_limit_headers
+async def menu_item_list(request):
+    """
+    List menu items, filtered by ``category``/``featured``/``search`` and
+    ordered by ``ordering`` like MenuItemViewSet
+    """
+    throttled = await check_rate(request, "menu")
+    if throttled is not None:
+        return throttled
+
+    async def build(headers):
+        queryset = MenuItem.objects.select_related("category")
+        if "category" in request.GET:
+            try:
+                queryset = queryset.filter(category_id=int(request.GET["category"]))
+            except ValueError:
+                return {"category": ["Select a valid choice."]}, 400
+        featured = request.GET.get("featured")
+        if featured in TRUE_VALUES:
+            queryset = queryset.filter(featured=True)
+        elif featured in FALSE_VALUES:
+            queryset = queryset.filter(featured=False)
+        if request.GET.get("search"):
+            queryset, truncated = await sync_to_async(apply_search)(
+                queryset, request.GET["search"]
+            )
+            if truncated:
+                headers[SEARCH_TRUNCATED_HEADER] = "true"
+
+        paginator = MenuItemPagination()
+        ordering = [
+            term.strip()
+            for term in request.GET.get("ordering", "").split(",")
+            if term.strip().lstrip("-") in MenuItemViewSet.ordering_fields
+        ]
+        ordering = paginator.with_tiebreaker(
+            ordering or paginator.get_default_ordering(queryset)
+        )
+        try:
+            page = paginator.page_queryset(queryset, request, ordering)
+        except NotFound as exc:
+            return {"detail": str(exc.detail)}, 404
+        results = paginator.set_page([item async for item in page])
+        serializer = MenuItemSerializer(
+            results, many=True, context={"request": request}
+        )
+        return paginator.get_paginated_data(serializer.data), 200
+
+    return await cached_json(request, build)
+
+
+@require_GET
+@sends_rate_limit_headers
+async def menu_item_detail(request, pk):
+    """
+    Get a single menu item
+    """
+    throttled = await check_rate(request, "menu")
+    if throttled is not None:
+        return throttled
+
+    async def build(headers):
+        item = await MenuItem.objects.select_related("category").filter(pk=pk).afirst()
+        if item is None:
+            return {"detail": "No MenuItem matches the given query."}, 404
+        return MenuItemSerializer(item, context={"request": request}).data, 200
+
+    return await cached_json(request, build)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+@sends_rate_limit_headers
+async def cart(request):
+    """
+    List the cart items of the current user, or add an item to the cart
+    """
+    user, failure = await customer_or_error(request)
+    if failure is not None:
+        return failure
+    scope = DEFAULT_SCOPE if request.method in SAFE_METHODS else "cart_write"
+    throttled = await check_rate(request, scope, user)
+    if throttled is not None:
+        return throttled
+    if request.method == "POST":
+        return await add_to_cart(request, user)
+
+    items = await get_cart_store().aitems(user)
+    return JsonResponse(
+        {"customer": user.pk, "items": CartItemSerializer(items, many=True).data}
+    )
+
+
+async def add_to_cart(request, user):
+    try:
+        data = request_data(request)
+        item_id = int(data.get("menuitem"))
+        quantity = int(data.get("quantity", 1))
+    except (TypeError, ValueError):
+        return error("menuitem and quantity must be integers", 400)
+    if quantity < 0:
+        return error("quantity cannot be negative", 400)
+
+    menuitem = await MenuItem.objects.filter(pk=item_id).afirst()
+    if menuitem is None:
+        return not_found(MenuItem)
+    try:
+        cart_item = await get_cart_store().aset_item(user, menuitem, quantity)
+    except CartBusy as exc:
+        return cart_busy(exc)
+    return JsonResponse(CartItemSerializer(cart_item).data, status=201)
+
+
+@csrf_exempt
+@require_http_methods(["DELETE"])
+@sends_rate_limit_headers
+async def cart_item_remove(request, pk):
+    """
+    Remove an item from cart
+    """
+    user, failure = await customer_or_error(request)
+    if failure is not None:
+        return failure
+    throttled = await check_rate(request, "cart_write", user)
+    if throttled is not None:
+        return throttled
+    try:
+        removed = await get_cart_store().aremove(user, pk)
+    except CartBusy as exc:
+        return cart_busy(exc)
+    if not removed:
+        return not_found(CartItem)
+    return JsonResponse(
+        {"detail": "Item removed from cart", "status": "ok"}, status=204
+    )
+
+
+def event_frame(message):
+    return f"event: order\ndata: {message}\n\n"
+
+
+async def order_event_stream(channels, order_id=None):
+    keepalive = getattr(settings, "ORDER_EVENTS_KEEPALIVE", 15)
+    # Subscribing here rather than in the view means the subscription is only
+    # made once the response is being sent, and ``finally`` always ends it:
+    # the ASGI handler cancels this generator when the client goes away.
+    subscription = get_broker().subscribe(channels)
+    try:
+        yield f"retry: {EVENT_STREAM_RETRY}\n\n"
+        if order_id is not None:
+            # Read after subscribing so no change falls between the two.
+            order = await Order.objects.filter(pk=order_id).afirst()
+            if order is not None:
+                event = order_event(
+                    order.pk, order.status, order.delivery_crew_id, order.updated
+                )
+                yield event_frame(json.dumps(event))
+        while True:
+            message = await subscription.get(keepalive)
+            if message is None:
+                # Comments keep proxies from closing an idle connection.
+                yield ": keepalive\n\n"
+            elif order_id is None or json.loads(message)["order"] == order_id:
+                yield event_frame(message)
+    finally:
+        subscription.close()
+
+
+@require_GET
+@sends_rate_limit_headers
+async def order_events(request):
+    """
+    Stream status and delivery crew changes of the orders the user can see
+    as Server-Sent Events, optionally only those of ``?order=<id>``
+    """
+    user, failure = await customer_or_error(request)
+    if failure is not None:
+        return failure
+    throttled = await check_rate(request, DEFAULT_SCOPE, user)
+    if throttled is not None:
+        return throttled
+
+    roles = await aget_roles(user)
+    order_id = request.GET.get("order")
+    if order_id is not None:
+        try:
+            order_id = int(order_id)
+        except ValueError:
+            return error("order must be an integer", 400)
+        orders = Order.objects.filter(pk=order_id)
+        if not roles.is_manager:
+            orders = orders.filter(Q(customer=user) | Q(delivery_crew=user))
+        if not await orders.aexists():
+            return not_found(Order)
+
+    # Managers see every order; customers and crew get the changes to
+    # orders they placed or deliver on their own channel.
+    channels = [MANAGERS_CHANNEL] if roles.is_manager else [user_channel(user.pk)]
+    response = StreamingHttpResponse(
+        order_event_stream(channels, order_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx and similar proxies from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
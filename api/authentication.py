@@ -0,0 +1,203 @@
+"""
+Authentication without a database round trip per request.
+
+``CachedTokenAuthentication`` keeps token -> user and group names in a
+bounded, per-process LRU cache with a TTL. Entries are dropped when the
+token is deleted (djoser logout) or the user or their groups change; other
+processes see such changes once their entry expires (``TOKEN_CACHE_TIMEOUT``).
+
+``RoleJWTAuthentication`` is stateless: access tokens carry the user's
+roles as claims, so authenticating needs no queries at all.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .roles import Roles
+
+TOKEN_CACHE_SIZE = getattr(settings, "TOKEN_CACHE_SIZE", 10000)
+TOKEN_CACHE_TIMEOUT = getattr(settings, "TOKEN_CACHE_TIMEOUT", 60)
+
+
+class TokenCache:
+    """
+    Thread-safe LRU cache of ``token key -> (user fields, group names)``.
+    Every hit builds a fresh User so requests never share an instance.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, timeout=TOKEN_CACHE_TIMEOUT):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires"] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        user = User.from_db(entry["db"], entry["fields"], entry["values"])
+        user._api_roles = Roles(entry["groups"], is_superuser=user.is_superuser)
+        return user
+
+    def set(self, key, user, groups):
+        fields = [field.attname for field in User._meta.concrete_fields]
+        entry = {
+            "user_id": user.pk,
+            "db": user._state.db,
+            "fields": fields,
+            "values": tuple(getattr(user, name) for name in fields),
+            "groups": tuple(groups),
+            "expires": time.monotonic() + self.timeout,
+        }
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate_keys(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def invalidate_users(self, *user_ids):
+        user_ids = set(user_ids)
+        with self.lock:
+            stale = [
+                key
+                for key, entry in self.entries.items()
+                if entry["user_id"] in user_ids
+            ]
+            for key in stale:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def load_token_user(key):
+    """
+    Return the active user for token ``key`` (or None) and cache it.
+    """
+    user = token_cache.get(key)
+    if user is not None:
+        return user
+    token = Token.objects.select_related("user").filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return None
+    groups = list(token.user.groups.values_list("name", flat=True))
+    token_cache.set(key, token.user, groups)
+    return token_cache.get(key)
+
+
+async def aload_token_user(key):
+    user = token_cache.get(key)
+    if user is not None:
+        return user
+    token = await Token.objects.select_related("user").filter(key=key).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    groups = token.user.groups.values_list("name", flat=True)
+    groups = [name async for name in groups]
+    token_cache.set(key, token.user, groups)
+    return token_cache.get(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    ``Authorization: Token <key>``, served from the token cache.
+    """
+
+    def authenticate_credentials(self, key):
+        user = load_token_user(key)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        return user, Token(key=key, user=user)
+
+
+# Claims copied from the user into every token. Together with the user id
+# they are enough to build the request user without a query.
+USER_CLAIMS = ("username", "email", "is_staff", "is_superuser")
+
+
+def add_role_claims(token, user):
+    for name in USER_CLAIMS:
+        token[name] = getattr(user, name)
+    token["roles"] = sorted(user.groups.values_list("name", flat=True))
+    return token
+
+
+def jwt_user(validated_token):
+    """
+    Build the request user from token claims. Fields that are not claims are
+    deferred, so they load on access and ``save()`` only writes the claims.
+    """
+    try:
+        user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+    claims = {name: validated_token.get(name) for name in USER_CLAIMS}
+    claims.update(id=user_id, is_active=True)
+    # from_db() expects the values in field order.
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in claims]
+    user = User.from_db(User.objects.db, fields, [claims[name] for name in fields])
+    user._api_roles = Roles(
+        validated_token.get("roles", ()), is_superuser=user.is_superuser
+    )
+    return user
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    """
+    ``Authorization: Bearer <access token>``, without touching the database.
+    """
+
+    def get_user(self, validated_token):
+        return jwt_user(validated_token)
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_role_claims(super().get_token(user), user)
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh the access token with the user's current roles, and refuse if
+    the user was deactivated or deleted.
+    """
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs["refresh"])
+        user = User.objects.filter(
+            pk=refresh[jwt_settings.USER_ID_CLAIM], is_active=True
+        ).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed(_("User is inactive or deleted."))
+        return {"access": str(add_role_claims(refresh.access_token, user))}
@@ -0,0 +1,164 @@
+import time
+import uuid
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+RESPONSE_CACHE_TIMEOUT = getattr(settings, "API_RESPONSE_CACHE_TIMEOUT", 60 * 10)
+
+MENU_NAMESPACE = "menu"
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+
+def acquire_lock(key, timeout):
+    """
+    Take the lock ``key`` for at most ``timeout`` seconds. Returns the token
+    to release it with, or None if it is held elsewhere.
+    """
+    token = uuid.uuid4().hex
+    return token if cache.add(key, token, timeout) else None
+
+
+def release_lock(key, token):
+    """
+    Release the lock ``key`` only if ``token`` still holds it: once it has
+    expired it may have been taken by another request.
+    """
+    if cache.get(key) == token:
+        cache.delete(key)
+
+
+def get_namespace_version(namespace):
+    # Versions start from the current time, so a version key that was culled
+    # starts again above every version used before rather than at 1.
+    return cache.get_or_set(f"api:ns:{namespace}", time.time_ns, timeout=None)
+
+
+def bump_namespace(namespace):
+    """
+    Invalidate every cached response in ``namespace`` by moving to a new
+    version; old entries are simply never read again and expire on their own.
+    """
+    key = f"api:ns:{namespace}"
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        if cache.add(key, version, timeout=None):
+            return version
+        return cache.incr(key)
+
+
+def _response_key(namespace, version, host, path, params, media_type):
+    raw = f"{host}{path}?{sorted(params)}|{media_type}"
+    digest = md5(raw.encode("utf-8"), usedforsecurity=False).hexdigest()
+    return f"api:response:{namespace}:{version}:{digest}"
+
+
+def response_cache_key(namespace, request):
+    return _response_key(
+        namespace,
+        get_namespace_version(namespace),
+        request.get_host(),
+        request.path,
+        request.query_params.lists(),
+        request.accepted_media_type,
+    )
+
+
+async def aresponse_cache_key(namespace, request):
+    """
+    ``response_cache_key`` for plain Django requests in async views, which
+    always answer JSON.
+    """
+    version = await cache.aget_or_set(
+        f"api:ns:{namespace}", time.time_ns, timeout=None
+    )
+    return _response_key(
+        namespace,
+        version,
+        request.get_host(),
+        request.path,
+        request.GET.lists(),
+        "application/json",
+    )
+
+
+def record(namespace, outcome):
+    _incr(f"api:stats:{namespace}:{outcome}")
+
+
+async def arecord(namespace, outcome):
+    key = f"api:stats:{namespace}:{outcome}"
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, timeout=None):
+            await cache.aincr(key)
+
+
+def get_cache_stats(*namespaces):
+    stats = {}
+    for namespace in namespaces:
+        hits = cache.get(f"api:stats:{namespace}:hit", 0)
+        misses = cache.get(f"api:stats:{namespace}:miss", 0)
+        stats[namespace] = {
+            "version": get_namespace_version(namespace),
+            "hits": hits,
+            "misses": misses,
+        }
+    return stats
+
+
+class CachedReadMixin:
+    """
+    Serve ``list``/``retrieve`` from the cache framework, one entry per
+    path and query string (filters, search, ordering and cursor).
+    """
+
+    cache_namespace = None
+    # Response headers kept with the cached data.
+    cached_headers = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = response_cache_key(self.cache_namespace, request)
+        cached = cache.get(key)
+        if cached is not None:
+            record(self.cache_namespace, "hit")
+            data, status_code, headers = cached
+            response = Response(data, status=status_code, headers=headers)
+            response["X-Cache"] = "HIT"
+            return response
+
+        record(self.cache_namespace, "miss")
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            # Filter backends add their headers to the view, not the response.
+            headers = {
+                name: self.headers[name]
+                for name in self.cached_headers
+                if name in self.headers
+            }
+            cache.set(
+                key,
+                (response.data, response.status_code, headers),
+                RESPONSE_CACHE_TIMEOUT,
+            )
+        response["X-Cache"] = "MISS"
+        return response
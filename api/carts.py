@@ -0,0 +1,318 @@
+"""
+Cart storage backends, chosen with ``CART_BACKEND``.
+
+``DatabaseCartStore`` (the default) keeps carts in the Cart and CartItem
+tables. ``CacheCartStore`` keeps each active cart in the cache as
+``{menu item id: quantity}`` and only writes it to those tables at checkout
+and in a ``flush_cart`` job run ``CART_FLUSH_INTERVAL`` seconds after the
+first change, so a busy cart costs one write per interval rather than one
+per request. Prices are read from the menu when the cart is shown.
+
+With the cache backend the cart lives in the cache until it is flushed, so
+use a persistent cache shared by all workers (not ``LocMemCache``) and run
+``manage.py run_jobs``. Its line ids are the menu item ids.
+"""
+
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache import acquire_lock, release_lock
+from .jobs import enqueue
+from .models import Cart, CartItem, MenuItem
+
+CART_CACHE_TIMEOUT = getattr(settings, "CART_CACHE_TIMEOUT", 60 * 60 * 24 * 14)
+CART_FLUSH_INTERVAL = getattr(settings, "CART_FLUSH_INTERVAL", 60 * 5)
+# A cart lock held longer than this (by a dead worker) is given up, and a
+# request that waited this long for the lock is refused.
+CART_LOCK_TIMEOUT = getattr(settings, "CART_LOCK_TIMEOUT", 10)
+
+
+class CartBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The cart is being changed by another request."
+    default_code = "cart_busy"
+    wait = 1
+
+    def __init__(self):
+        super().__init__({"detail": self.default_detail, "status": "fail"})
+
+
+def get_cart_store():
+    backend = getattr(settings, "CART_BACKEND", "api.carts.DatabaseCartStore")
+    return import_string(backend)()
+
+
+def upsert_lines(cart, quantities, menuitems):
+    """
+    Write ``{menu item id: quantity}`` into ``cart``, priced from
+    ``menuitems``. Lines with a quantity of 0 are removed.
+    """
+    removed = [pk for pk, quantity in quantities.items() if quantity == 0]
+    if removed:
+        cart.items.filter(menuitem__in=removed).delete()
+    CartItem.objects.bulk_create(
+        [
+            CartItem(
+                cart=cart,
+                menuitem_id=pk,
+                quantity=quantity,
+                unit_price=menuitems[pk].price,
+                price=menuitems[pk].price * quantity,
+            )
+            for pk, quantity in quantities.items()
+            if quantity > 0
+        ],
+        update_conflicts=True,
+        unique_fields=["cart", "menuitem"],
+        update_fields=["quantity", "unit_price", "price"],
+    )
+
+
+class CartStore:
+    """
+    Reads and writes a customer's cart lines as (possibly unsaved) CartItem
+    instances with their menu item loaded, ready for CartItemSerializer.
+    """
+
+    def items(self, user):
+        raise NotImplementedError
+
+    def get_item(self, user, line_id):
+        raise NotImplementedError
+
+    def set_item(self, user, menuitem, quantity):
+        raise NotImplementedError
+
+    def update(self, user, quantities, menuitems, increment=False):
+        """
+        Set (or with ``increment`` add to) the quantities of many lines; a
+        resulting quantity of 0 removes the line. ``menuitems`` maps every
+        menu item id in ``quantities`` to the menu item.
+        """
+        raise NotImplementedError
+
+    def remove(self, user, line_id):
+        """
+        Remove a line. Returns False if the cart has no such line.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def checkout(self, user):
+        """
+        Make sure the cart is in the Cart/CartItem tables for the checkout
+        run inside this block.
+        """
+        yield
+
+    async def aitems(self, user):
+        return await sync_to_async(self.items)(user)
+
+    async def aset_item(self, user, menuitem, quantity):
+        return await sync_to_async(self.set_item)(user, menuitem, quantity)
+
+    async def aremove(self, user, line_id):
+        return await sync_to_async(self.remove)(user, line_id)
+
+
+class DatabaseCartStore(CartStore):
+    def lines(self, user):
+        return (
+            CartItem.objects.filter(cart__customer=user)
+            .select_related("menuitem")
+            .order_by("pk")
+        )
+
+    def items(self, user):
+        return list(self.lines(user))
+
+    def get_item(self, user, line_id):
+        return self.lines(user).filter(pk=line_id).first()
+
+    def set_item(self, user, menuitem, quantity):
+        cart, created = Cart.objects.get_or_create(customer=user)
+        cart_item, created = CartItem.objects.get_or_create(
+            cart=cart, menuitem=menuitem, defaults={"quantity": quantity}
+        )
+        if not created:
+            cart_item.quantity = quantity
+            cart_item.save()
+        return cart_item
+
+    def update(self, user, quantities, menuitems, increment=False):
+        quantities = dict(quantities)
+        with transaction.atomic():
+            # Lock the cart so a concurrent increment waits for this one
+            # instead of adding to the same stale quantities. (SQLite has no
+            # row locks, but fails the later writer rather than losing it.)
+            carts = Cart.objects.select_for_update()
+            cart, created = carts.get_or_create(customer=user)
+            if increment and not created:
+                existing = cart.items.filter(menuitem__in=quantities).values_list(
+                    "menuitem", "quantity"
+                )
+                for menuitem_id, quantity in existing:
+                    quantities[menuitem_id] += quantity
+            upsert_lines(cart, quantities, menuitems)
+
+    def remove(self, user, line_id):
+        deleted, _ = CartItem.objects.filter(cart__customer=user, pk=line_id).delete()
+        return bool(deleted)
+
+    async def aitems(self, user):
+        return [item async for item in self.lines(user)]
+
+    async def aset_item(self, user, menuitem, quantity):
+        cart, created = await Cart.objects.aget_or_create(customer=user)
+        cart_item, created = await CartItem.objects.aupdate_or_create(
+            cart=cart, menuitem=menuitem, defaults={"quantity": quantity}
+        )
+        return cart_item
+
+    async def aremove(self, user, line_id):
+        deleted, _ = await CartItem.objects.filter(
+            cart__customer=user, pk=line_id
+        ).adelete()
+        return bool(deleted)
+
+
+class CacheCartStore(CartStore):
+    def key(self, user_id):
+        return f"api:cart:{user_id}"
+
+    @contextmanager
+    def locked(self, user_id):
+        """
+        Serialize changes to one cart across workers, so that concurrent
+        requests do not overwrite each other's lines. Raises CartBusy if the
+        lock is not free within ``CART_LOCK_TIMEOUT`` seconds.
+        """
+        lock_key = f"{self.key(user_id)}:lock"
+        deadline = time.monotonic() + CART_LOCK_TIMEOUT
+        while (token := acquire_lock(lock_key, CART_LOCK_TIMEOUT)) is None:
+            if time.monotonic() >= deadline:
+                raise CartBusy()
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            release_lock(lock_key, token)
+
+    def load(self, user_id):
+        """
+        The cached cart, read through from the tables on a miss.
+        """
+        data = cache.get(self.key(user_id))
+        if data is None:
+            lines = CartItem.objects.filter(cart__customer_id=user_id).order_by("pk")
+            data = {"lines": dict(lines.values_list("menuitem", "quantity"))}
+            data["dirty"] = False
+            cache.add(self.key(user_id), data, CART_CACHE_TIMEOUT)
+        return data
+
+    def save(self, user_id, lines):
+        data = {"lines": lines, "dirty": True}
+        cache.set(self.key(user_id), data, CART_CACHE_TIMEOUT)
+        if CART_FLUSH_INTERVAL is None:
+            return
+        # One flush per interval, however often the cart changes meanwhile.
+        if cache.add(f"{self.key(user_id)}:flush", 1, CART_FLUSH_INTERVAL):
+            from .tasks import flush_cart
+
+            enqueue(
+                flush_cart.task_name, {"user_id": user_id}, delay=CART_FLUSH_INTERVAL
+            )
+
+    def line(self, menuitem, quantity):
+        return CartItem(
+            id=menuitem.pk,
+            menuitem=menuitem,
+            quantity=quantity,
+            unit_price=menuitem.price,
+            price=menuitem.price * quantity,
+        )
+
+    def items(self, user):
+        lines = self.load(user.pk)["lines"]
+        menuitems = MenuItem.objects.only("id", "name", "price").in_bulk(lines)
+        # Lines of menu items deleted since are left out.
+        return [
+            self.line(menuitems[pk], quantity)
+            for pk, quantity in lines.items()
+            if pk in menuitems
+        ]
+
+    def get_item(self, user, line_id):
+        quantity = self.load(user.pk)["lines"].get(line_id)
+        if quantity is None:
+            return None
+        menuitems = MenuItem.objects.only("id", "name", "price")
+        menuitem = menuitems.filter(pk=line_id).first()
+        return None if menuitem is None else self.line(menuitem, quantity)
+
+    def set_item(self, user, menuitem, quantity):
+        with self.locked(user.pk):
+            lines = self.load(user.pk)["lines"]
+            lines[menuitem.pk] = quantity
+            self.save(user.pk, lines)
+        return self.line(menuitem, quantity)
+
+    def update(self, user, quantities, menuitems, increment=False):
+        with self.locked(user.pk):
+            lines = self.load(user.pk)["lines"]
+            for pk, quantity in quantities.items():
+                if increment:
+                    quantity += lines.get(pk, 0)
+                if quantity == 0:
+                    lines.pop(pk, None)
+                else:
+                    lines[pk] = quantity
+            self.save(user.pk, lines)
+
+    def remove(self, user, line_id):
+        with self.locked(user.pk):
+            lines = self.load(user.pk)["lines"]
+            if lines.pop(line_id, None) is None:
+                return False
+            self.save(user.pk, lines)
+        return True
+
+    def persist(self, user_id, lines):
+        menuitems = MenuItem.objects.only("id", "price").in_bulk(lines)
+        quantities = {pk: lines[pk] for pk in menuitems}
+        with transaction.atomic():
+            cart, created = Cart.objects.get_or_create(customer_id=user_id)
+            cart.items.exclude(menuitem__in=quantities).delete()
+            upsert_lines(cart, quantities, menuitems)
+
+    def flush(self, user_id):
+        """
+        Write the cart to the tables if it changed since it was last written.
+        """
+        cache.delete(f"{self.key(user_id)}:flush")
+        with self.locked(user_id):
+            data = cache.get(self.key(user_id))
+            if data is None or not data["dirty"]:
+                return
+            self.persist(user_id, data["lines"])
+            data["dirty"] = False
+            cache.set(self.key(user_id), data, CART_CACHE_TIMEOUT)
+
+    @contextmanager
+    def checkout(self, user):
+        # The lock keeps the cart from changing, or being checked out twice,
+        # until the order is placed and the cached copy dropped.
+        with self.locked(user.pk):
+            data = cache.get(self.key(user.pk))
+            if data is not None and data["dirty"]:
+                self.persist(user.pk, data["lines"])
+            yield
+            cache.delete(self.key(user.pk))
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core import checks
+
+PER_PROCESS_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+NON_ATOMIC_CACHES = {
+    "django.core.cache.backends.filebased.FileBasedCache",
+}
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Rate limits, role invalidation, idempotency keys and cached carts only
+    work across worker processes when the default cache is shared by them,
+    and the locks and token buckets also need its add/incr to be atomic.
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND")
+    if backend in PER_PROCESS_CACHES:
+        return [
+            checks.Warning(
+                f"The default cache ({backend}) is not shared between processes.",
+                hint="With several workers, rate limits are multiplied by the "
+                "number of workers and role changes, idempotency keys and "
+                "cached carts are only seen by one of them. Set REDIS_URL or "
+                "use another shared cache backend.",
+                id="api.W001",
+            )
+        ]
+    if backend in NON_ATOMIC_CACHES:
+        return [
+            checks.Warning(
+                f"The default cache ({backend}) has no atomic add or incr "
+                "across processes.",
+                hint="Two workers can take the same idempotency or cart lock, "
+                "or the same rate limit token, at once. Set REDIS_URL for "
+                "locks and limits that hold.",
+                id="api.W001",
+            )
+        ]
+    return []
@@ -0,0 +1,113 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads of the models in
+``DATABASE_REPLICA_MODELS`` go to one of ``DATABASE_REPLICAS``, but only
+inside a request that ``ReplicaRoutingMiddleware`` marked as safe: unsafe
+methods, requests after a recent write (pin cookie) and everything outside
+a request (commands, job workers, the shell) read from the primary. The
+first INSERT, UPDATE or DELETE a request sends pins the rest of it to the
+primary, so a request always reads its own writes. Lookups Django merely
+routes as writes (the read in ``get_or_create``, ``select_for_update``) go
+to the primary but do not pin.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = "default"
+PIN_COOKIE = "api_db_pin"
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_current_state = ContextVar("api_db_routing", default=None)
+
+
+class RoutingState:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Let reads in this block go to replicas until the first write.
+    """
+    state = RoutingState(enabled)
+    token = _current_state.set(state)
+    try:
+        yield state
+    finally:
+        _current_state.reset(token)
+
+
+def get_replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def get_replica_models():
+    labels = getattr(settings, "DATABASE_REPLICA_MODELS", [])
+    return {label.lower() for label in labels}
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current_state.get()
+        if state is None or not state.use_replicas:
+            return PRIMARY
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # Follow relations on the database the instance came from.
+            return instance._state.db
+        replicas = get_replicas()
+        if not replicas or model._meta.label_lower not in get_replica_models():
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        if db in get_replicas():
+            return False
+        return None
+
+
+def record_write(execute, sql, params, many, context):
+    state = _current_state.get()
+    if state is not None and not state.wrote:
+        if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            state.use_replicas = False
+            state.wrote = True
+    return execute(sql, params, many, context)
+
+
+def install_write_recorder(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver marking the current request as having
+    written once a write statement is sent.
+    """
+    if record_write not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_write)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver applying ``SQLITE_PRAGMAS``, e.g. WAL
+    mode so readers do not block the writer.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
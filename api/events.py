@@ -0,0 +1,162 @@
+"""
+Publish/subscribe for order status changes, streamed to clients as
+Server-Sent Events by ``async_views.order_events``.
+
+Changes are published once their transaction commits, to the channels of
+everyone allowed to see them: the customer, the delivery crew (old and new)
+and managers. The backend is ``ORDER_EVENTS_BACKEND``; the default
+``InProcessBroker`` only reaches subscribers in the same process, so run a
+single ASGI worker or plug in a backend shared by all workers.
+"""
+
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+MANAGERS_CHANNEL = "managers"
+SUBSCRIPTION_QUEUE_SIZE = getattr(settings, "ORDER_EVENTS_QUEUE_SIZE", 100)
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """
+    Messages for one client, handed from any thread to its event loop.
+    """
+
+    def __init__(self, broker, channels, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The loop is gone; the client cannot be reached any more.
+            self.close()
+
+    def _put(self, message):
+        if self.queue.full():
+            # A slow client loses its oldest events rather than holding memory.
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        """
+        The next message, or None if there was none within ``timeout``.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channels):
+        """
+        Return a Subscription to ``channels``. Must be called from the event
+        loop that reads it.
+        """
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    def __init__(self):
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscriptions = list(self.channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self.lock:
+            for channel in channels:
+                self.channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.channels.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.channels[channel]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            backend = getattr(
+                settings, "ORDER_EVENTS_BACKEND", "api.events.InProcessBroker"
+            )
+            _broker = import_string(backend)()
+    return _broker
+
+
+def order_event(order_id, status, delivery_crew_id, updated=None):
+    return {
+        "order": order_id,
+        "status": status,
+        "delivery_crew": delivery_crew_id,
+        "updated": (updated or timezone.now()).isoformat(),
+    }
+
+
+def publish_order_change(order, previous_crew_id=None):
+    """
+    Tell the customer, crew and managers about the order's current status
+    and delivery crew once the surrounding transaction commits.
+    """
+    publish_order_event(
+        order.pk,
+        order.customer_id,
+        order.status,
+        order.delivery_crew_id,
+        previous_crew_id,
+    )
+
+
+def publish_order_event(
+    order_id, customer_id, status, delivery_crew_id, previous_crew_id=None
+):
+    message = json.dumps(order_event(order_id, status, delivery_crew_id))
+    channels = {MANAGERS_CHANNEL, user_channel(customer_id)}
+    for crew_id in (delivery_crew_id, previous_crew_id):
+        if crew_id is not None:
+            channels.add(user_channel(crew_id))
+
+    def publish():
+        broker = get_broker()
+        for channel in channels:
+            broker.publish(channel, message)
+
+    transaction.on_commit(publish)
@@ -0,0 +1,69 @@
+"""
+Sparse fieldsets for read endpoints.
+
+``?fields=id,status,total`` keeps only the listed fields. Nested relations
+named in ``fields`` are rendered as primary keys unless they are also
+listed in ``?expand=``. Without ``?fields=`` responses are unchanged.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def _names(value):
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def field_selection(request):
+    """
+    Return ``(fields, expand)`` for a read request with ``?fields=``, or None.
+    """
+    if request is None or request.method not in ("GET", "HEAD"):
+        return None
+    params = getattr(request, "query_params", request.GET)
+    if FIELDS_PARAM not in params:
+        return None
+    return _names(params[FIELDS_PARAM]), _names(params.get(EXPAND_PARAM, ""))
+
+
+def load_only(queryset, fields, always=()):
+    """
+    Restrict ``queryset`` to the columns behind the selected ``fields`` plus
+    ``always`` (keys needed for ordering, permissions and the like).
+    """
+    names = set(always)
+    for name in fields:
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete:
+            names.add(name)
+    return queryset.only(*names)
+
+
+class SparseFieldsMixin:
+    """
+    Serializer side of sparse fieldsets. ``Meta.expandable_fields`` lists
+    the nested relations that collapse to primary keys unless expanded.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = field_selection(self.context.get("request"))
+        if selection is None:
+            return fields
+        wanted, expand = selection
+        expandable = getattr(self.Meta, "expandable_fields", ())
+        for name in list(fields):
+            if name not in wanted:
+                del fields[name]
+            elif name in expandable and name not in expand:
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True,
+                    many=isinstance(fields[name], serializers.ListSerializer),
+                )
+        return fields
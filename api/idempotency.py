@@ -0,0 +1,139 @@
+"""
+``Idempotency-Key`` support for POST endpoints that clients retry.
+
+The first response to a key (per user, method and path) is kept in the
+cache for ``IDEMPOTENCY_KEY_TIMEOUT`` seconds and replayed to retries
+without running the view again. While the first request is still running, a
+retry waits up to ``IDEMPOTENCY_WAIT`` seconds for its response instead of
+running alongside it. Reusing a key for a different request body is refused.
+
+Waiting only covers requests that share a cache, so several processes need a
+shared cache backend (not the per-process ``LocMemCache``).
+"""
+
+import functools
+import json
+import time
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import acquire_lock, release_lock
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+KEY_TIMEOUT = getattr(settings, "IDEMPOTENCY_KEY_TIMEOUT", 60 * 60 * 24)
+# A request that dies while holding its key frees it after this long.
+LOCK_TIMEOUT = getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 30)
+WAIT_TIMEOUT = getattr(settings, "IDEMPOTENCY_WAIT", 10)
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    raw = json.dumps(data, sort_keys=True, default=str)
+    return sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotentRequest:
+    def __init__(self, request, key):
+        raw = f"{request.method}:{request.path}:{key}"
+        digest = sha256(raw.encode("utf-8")).hexdigest()
+        base = f"api:idempotency:{request.user.pk}:{digest}"
+        self.result_key = f"{base}:result"
+        self.lock_key = f"{base}:lock"
+        self.fingerprint = request_fingerprint(request)
+
+    def acquire(self):
+        self.lock_token = acquire_lock(self.lock_key, LOCK_TIMEOUT)
+        return self.lock_token is not None
+
+    def release(self):
+        release_lock(self.lock_key, self.lock_token)
+
+    def stored(self):
+        return cache.get(self.result_key)
+
+    def store(self, response):
+        result = {
+            "fingerprint": self.fingerprint,
+            "status": response.status_code,
+            "data": response.data,
+        }
+        cache.set(self.result_key, result, KEY_TIMEOUT)
+
+    def replay(self, result):
+        if result["fingerprint"] != self.fingerprint:
+            return Response(
+                {
+                    "detail": f"{IDEMPOTENCY_HEADER} was already used for a "
+                    "different request.",
+                    "status": "fail",
+                },
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(
+            result["data"],
+            status=result["status"],
+            headers={REPLAYED_HEADER: "true"},
+        )
+
+
+def idempotent(method):
+    """
+    Make a view method honour the ``Idempotency-Key`` request header.
+    Responses other than conflicts and server errors are stored and replayed.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return method(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {
+                    "detail": f"{IDEMPOTENCY_HEADER} must be 1 to "
+                    f"{MAX_KEY_LENGTH} characters.",
+                    "status": "fail",
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        idempotent_request = IdempotentRequest(request, key)
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        delay = 0.01
+        while not idempotent_request.acquire():
+            # Another request with this key is running: wait for its response.
+            result = idempotent_request.stored()
+            if result is not None:
+                return idempotent_request.replay(result)
+            if time.monotonic() >= deadline:
+                return Response(
+                    {
+                        "detail": f"A request with this {IDEMPOTENCY_HEADER} "
+                        "is still in progress.",
+                        "status": "fail",
+                    },
+                    status=status.HTTP_409_CONFLICT,
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+
+        try:
+            result = idempotent_request.stored()
+            if result is not None:
+                return idempotent_request.replay(result)
+            response = method(self, request, *args, **kwargs)
+            if response.status_code < 500 and response.status_code != 409:
+                idempotent_request.store(response)
+            return response
+        finally:
+            idempotent_request.release()
+
+    return wrapper
@@ -0,0 +1,191 @@
+"""
+Resized WebP/JPEG derivatives of ``MenuItem.image``.
+
+Derivatives are rendered in a process pool and stored next to the original
+(``coke.jpg`` -> ``coke_thumb.webp``, ``coke_thumb.jpg``, ...). Worker
+processes are spawned and only run ``render_derivatives``, which needs
+Pillow but not Django, so models are imported lazily below.
+
+Completion is recorded in the web process, on the executor's callback
+thread: it writes ``image_derivatives`` through the ORM on a connection of
+its own, which is closed after every call. Derivatives of a replaced or
+removed image are deleted once the change commits.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .cache import MENU_NAMESPACE, bump_namespace
+
+logger = logging.getLogger("api.images")
+
+IMAGE_SIZES = getattr(
+    settings, "MENU_IMAGE_SIZES", {"thumb": 160, "small": 480, "large": 1024}
+)
+IMAGE_FORMATS = getattr(settings, "MENU_IMAGE_FORMATS", ("webp", "jpeg"))
+IMAGE_QUALITY = getattr(settings, "MENU_IMAGE_QUALITY", 80)
+
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+_executor = None
+
+
+def derivative_name(name, size, image_format):
+    root = os.path.splitext(name)[0]
+    return f"{root}_{size}.{EXTENSIONS[image_format]}"
+
+
+def derivative_names(name):
+    """
+    ``{size: {format: storage name}}`` for the derivatives of ``name``.
+    """
+    return {
+        size: {
+            image_format: derivative_name(name, size, image_format)
+            for image_format in IMAGE_FORMATS
+        }
+        for size in IMAGE_SIZES
+    }
+
+
+def render_derivatives(source_path, jobs, quality):
+    """
+    Render ``jobs`` (``(max_px, format, path)`` tuples) from the image at
+    ``source_path``. Runs in a worker process.
+    """
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        for max_px, image_format, path in jobs:
+            resized = image.copy()
+            # thumbnail() keeps the aspect ratio and never upscales.
+            resized.thumbnail((max_px, max_px), Image.LANCZOS)
+            if image_format == "jpeg" and resized.mode not in ("RGB", "L"):
+                resized = resized.convert("RGB")
+            # Write to a temporary file first so readers never see a
+            # partially written derivative.
+            tmp_path = f"{path}.tmp"
+            resized.save(tmp_path, image_format.upper(), quality=quality)
+            os.replace(tmp_path, path)
+
+
+def _jobs(name):
+    return [
+        (IMAGE_SIZES[size], image_format, default_storage.path(derivative))
+        for size, derivatives in derivative_names(name).items()
+        for image_format, derivative in derivatives.items()
+    ]
+
+
+def store_derivatives(menuitem_id, name):
+    """
+    Record that the derivatives of ``name`` exist, unless the menu item's
+    image was replaced in the meantime.
+    """
+    from .models import MenuItem
+
+    updated = MenuItem.objects.filter(pk=menuitem_id, image=name).update(
+        image_derivatives={"source": name, "sizes": derivative_names(name)}
+    )
+    if updated:
+        # update() skips the signals that invalidate cached menu responses.
+        bump_namespace(MENU_NAMESPACE)
+    return updated
+
+
+def get_executor(workers=None):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=workers or getattr(settings, "MENU_IMAGE_WORKERS", 2),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def submit_derivatives(executor, name):
+    return executor.submit(
+        render_derivatives, default_storage.path(name), _jobs(name), IMAGE_QUALITY
+    )
+
+
+def _finish(menuitem_id, name, future):
+    # Runs on the executor's callback thread, outside any request: the ORM
+    # opens a connection for this thread, closed below so none is leaked.
+    global _executor
+    try:
+        future.result()
+        store_derivatives(menuitem_id, name)
+    except BrokenProcessPool:
+        logger.exception("Image worker died while rendering %s", name)
+        _executor = None
+    except Exception:
+        logger.exception("Could not render derivatives of %s", name)
+    finally:
+        connection.close()
+
+
+def generate_derivatives(menuitem_id, name):
+    """
+    Render the derivatives of ``name`` in the background. With
+    ``MENU_IMAGE_WORKERS = 0`` they are rendered inline instead.
+    """
+    if not getattr(settings, "MENU_IMAGE_WORKERS", 2):
+        render_derivatives(default_storage.path(name), _jobs(name), IMAGE_QUALITY)
+        store_derivatives(menuitem_id, name)
+        return
+    future = submit_derivatives(get_executor(), name)
+    future.add_done_callback(lambda future: _finish(menuitem_id, name, future))
+
+
+def delete_derivatives(menuitem_id, derivatives):
+    """
+    Delete the files in ``derivatives`` and forget them, unless the menu
+    item has recorded newer ones since.
+    """
+    from .models import MenuItem
+
+    for names in derivatives.get("sizes", {}).values():
+        for name in names.values():
+            default_storage.delete(name)
+    MenuItem.objects.filter(
+        pk=menuitem_id, image_derivatives__source=derivatives["source"]
+    ).update(image_derivatives={})
+
+
+def schedule_derivatives(menuitem):
+    """
+    Queue derivative rendering for a saved menu item once the transaction
+    commits, so the request never waits for it, and drop the derivatives of
+    the image it replaced.
+    """
+    name = menuitem.image.name if menuitem.image else ""
+    derivatives = menuitem.image_derivatives or {}
+    if derivatives.get("source") == name:
+        return
+    if derivatives.get("source"):
+        transaction.on_commit(lambda: delete_derivatives(menuitem.pk, derivatives))
+    if name:
+        transaction.on_commit(lambda: generate_derivatives(menuitem.pk, name))
+
+
+def derivative_urls(menuitem, request=None):
+    derivatives = menuitem.image_derivatives or {}
+    if not menuitem.image or derivatives.get("source") != menuitem.image.name:
+        return {}
+    urls = {}
+    for size, names in derivatives["sizes"].items():
+        urls[size] = {}
+        for image_format, name in names.items():
+            url = default_storage.url(name)
+            urls[size][image_format] = (
+                request.build_absolute_uri(url) if request is not None else url
+            )
+    return urls
@@ -0,0 +1,168 @@
+"""
+A small job queue stored in the database, run by ``manage.py run_jobs``.
+
+Jobs are enqueued in the caller's transaction, so they only become visible
+to workers if that transaction commits. A worker claims a batch with a
+conditional UPDATE (plus ``SKIP LOCKED`` where the database supports it) and
+runs each job in a transaction that also marks it done, so a job whose
+work only touches the database takes effect exactly once.
+"""
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger("api.jobs")
+
+JOB_MAX_ATTEMPTS = getattr(settings, "JOB_MAX_ATTEMPTS", 5)
+JOB_RETRY_BACKOFF = getattr(settings, "JOB_RETRY_BACKOFF", 10)
+JOB_RETRY_BACKOFF_MAX = getattr(settings, "JOB_RETRY_BACKOFF_MAX", 60 * 60)
+JOB_LOCK_TIMEOUT = getattr(settings, "JOB_LOCK_TIMEOUT", 60 * 10)
+
+TASKS = {}
+
+
+class UnknownTask(Exception):
+    pass
+
+
+class LostLock(Exception):
+    """
+    The job was requeued as stale and claimed again while it was running.
+    """
+
+
+def task(func=None, *, name=None):
+    """
+    Register ``func`` as a task that can be enqueued by name. Tasks take the
+    job payload as keyword arguments.
+    """
+
+    def register(func):
+        func.task_name = name or f"{func.__module__}.{func.__name__}"
+        TASKS[func.task_name] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def enqueue(task_name, payload=None, delay=0, max_attempts=None):
+    if task_name not in TASKS:
+        raise UnknownTask(task_name)
+    return Job.objects.create(
+        name=task_name,
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+    )
+
+
+def backoff(attempts):
+    """
+    Exponential backoff with jitter, in seconds.
+    """
+    delay = min(JOB_RETRY_BACKOFF * 2 ** (attempts - 1), JOB_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def requeue_stale():
+    """
+    Put back jobs whose worker died while running them.
+    """
+    cutoff = timezone.now() - timedelta(seconds=JOB_LOCK_TIMEOUT)
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.QUEUED, locked_by="", locked_at=None
+    )
+
+
+def claim_jobs(worker, batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by(
+            "run_at", "id"
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return []
+        # Only rows that are still queued are claimed, so two workers that
+        # picked the same candidates never both run a job.
+        Job.objects.filter(pk__in=ids, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+        )
+        return list(
+            Job.objects.filter(pk__in=ids, status=Job.RUNNING, locked_by=worker)
+        )
+
+
+def run_job(job):
+    """
+    Run a claimed job and record the outcome. Returns the new status.
+    """
+    func = TASKS.get(job.name)
+    claimed = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by
+    )
+    try:
+        if func is None:
+            raise UnknownTask(job.name)
+        with transaction.atomic():
+            func(**job.payload)
+            succeeded = claimed.update(
+                status=Job.SUCCEEDED,
+                locked_by="",
+                locked_at=None,
+                last_error="",
+                finished=timezone.now(),
+            )
+            if not succeeded:
+                # Roll the work back; the worker that holds the job now runs it.
+                raise LostLock(job.pk)
+        return Job.SUCCEEDED
+    except LostLock:
+        logger.warning("Job %s (%s) was claimed by another worker", job.pk, job.name)
+        return Job.RUNNING
+    except Exception:
+        error = traceback.format_exc()
+        if func is not None and job.attempts < job.max_attempts:
+            status = Job.QUEUED
+            delay = timedelta(seconds=backoff(job.attempts))
+            changes = {"run_at": timezone.now() + delay}
+        else:
+            status = Job.FAILED
+            changes = {"finished": timezone.now()}
+        logger.log(
+            logging.WARNING if status == Job.FAILED else logging.INFO,
+            "Job %s (%s) failed on attempt %s",
+            job.pk,
+            job.name,
+            job.attempts,
+        )
+        claimed.update(
+            status=status, locked_by="", locked_at=None, last_error=error, **changes
+        )
+        return status
+
+
+def retry_job(job):
+    """
+    Queue a failed job to run again now with a fresh set of attempts.
+    """
+    return Job.objects.filter(pk=job.pk, status=Job.FAILED).update(
+        status=Job.QUEUED,
+        attempts=0,
+        run_at=timezone.now(),
+        finished=None,
+    )
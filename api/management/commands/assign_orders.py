@@ -0,0 +1,56 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.assignment import assign_pending_orders
+
+
+class Command(BaseCommand):
+    help = "Assign unassigned pending orders to the least loaded delivery crew"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, help="Assign at most this many")
+        parser.add_argument(
+            "--max-load",
+            type=int,
+            help="Leave orders unassigned once every crew member has this many",
+        )
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Run again every this many seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        if options["interval"]:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        total = 0
+        while not self.stopping:
+            close_old_connections()
+            report = assign_pending_orders(
+                limit=options["limit"],
+                max_load=options["max_load"],
+                batch_size=options["batch_size"],
+            )
+            total += report["assigned"]
+            for crew in report["crew"] if report["assigned"] else []:
+                self.stdout.write(
+                    f"crew {crew['id']}: +{crew['assigned']}, "
+                    f"{crew['open_orders']} open"
+                )
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Assigned {total} orders"))
+
+    def stop(self, signum, frame):
+        # Finish the current run, then exit.
+        self.stopping = True
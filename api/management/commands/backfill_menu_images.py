@@ -0,0 +1,57 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.images import store_derivatives, submit_derivatives
+from api.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = "Render resized derivatives of existing menu item images in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=max(1, getattr(settings, "MENU_IMAGE_WORKERS", 2)),
+            help="Number of worker processes",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-render derivatives that already exist",
+        )
+
+    def handle(self, *args, **options):
+        pending = [
+            (pk, name)
+            for pk, name, derivatives in MenuItem.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .values_list("pk", "image", "image_derivatives")
+            if options["force"] or derivatives.get("source") != name
+        ]
+        rendered = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=options["workers"],
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            futures = {
+                submit_derivatives(executor, name): (pk, name) for pk, name in pending
+            }
+            for future in as_completed(futures):
+                pk, name = futures[future]
+                try:
+                    future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{name}: {exc}")
+                    continue
+                rendered += store_derivatives(pk, name)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered derivatives for {rendered} images ({failed} failed)"
+            )
+        )
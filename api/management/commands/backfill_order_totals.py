@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import F, Sum
+
+from api.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored total, discount_amount and subtotal of orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of orders updated per transaction",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        updated = 0
+        last_id = 0
+        while True:
+            orders = list(
+                Order.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .only("pk", "discount", "total")[:batch_size]
+            )
+            if not orders:
+                break
+            last_id = orders[-1].pk
+            totals = dict(
+                OrderItem.objects.filter(order__in=orders)
+                .values("order")
+                .annotate(total=Sum(F("price") * F("quantity"), output_field=money))
+                .values_list("order", "total")
+            )
+            for order in orders:
+                order.total = totals.get(order.pk) or Decimal(0)
+                order.apply_discount()
+            with transaction.atomic():
+                Order.objects.bulk_update(
+                    orders, ["total", "discount_amount", "subtotal"]
+                )
+            updated += len(orders)
+            self.stdout.write(f"Updated {updated} orders")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled totals for {updated} orders"))
@@ -0,0 +1,393 @@
+import json
+import logging
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+
+from api import urls as api_urls
+from api.carts import get_cart_store
+from api.jobs import enqueue
+from api.menu_io import export_rows
+from api.models import Category, Job, MenuItem, Order
+from api.tasks import record_order_sales
+from api.roles import CREW, MANAGERS
+
+
+# Routes the test client cannot time, with the reason.
+UNTIMED_ROUTES = {
+    "async-order-events": "streams until the client disconnects",
+}
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+class Command(BaseCommand):
+    help = (
+        "Exercise every route in api/urls.py through the test client and "
+        "report latency, query count and response size per endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Clear the cache before every request",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != "*"]
+        self.host = hosts[0].lstrip(".") if hosts else "localhost"
+        self.users = self.pick_users()
+        self.ids = self.pick_ids()
+        scenarios = self.scenarios()
+
+        missing = set(route_names(api_urls.urlpatterns)) - {
+            scenario["route"] for scenario in scenarios
+        }
+        missing -= set(UNTIMED_ROUTES)
+        if missing:
+            self.stderr.write(f"Routes without a scenario: {sorted(missing)}")
+
+        # Keep per-request timing logs out of the report.
+        timing_logger = logging.getLogger("api.timing")
+        timing_logger.disabled = True
+        # Keep the throttles in the measurement without ever tripping them.
+        unlimited = {
+            scope: {role: "1000000/s" for role in rates}
+            for scope, rates in settings.API_THROTTLE_RATES.items()
+        }
+        results = {}
+        try:
+            with override_settings(API_THROTTLE_RATES=unlimited):
+                for scenario in scenarios:
+                    result = results[scenario["name"]] = self.run(scenario, options)
+                    self.stdout.write(self.format_row(scenario["name"], result))
+        finally:
+            timing_logger.disabled = False
+
+        report = json.dumps(
+            {"iterations": options["iterations"], "results": results}, indent=2
+        )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(report)
+
+    def pick_users(self):
+        users = {
+            "anonymous": None,
+            "admin": User.objects.filter(is_superuser=True).first(),
+            "manager": User.objects.filter(groups__name=MANAGERS).first(),
+            "crew": User.objects.filter(groups__name=CREW).first(),
+            "customer": User.objects.filter(is_superuser=False, groups=None)
+            .filter(orders__isnull=False)
+            .first(),
+        }
+        empty = [
+            role for role, user in users.items() if role != "anonymous" and not user
+        ]
+        if empty:
+            raise CommandError(
+                f"No {', '.join(empty)} user found; run `manage.py seed_data` first"
+            )
+        return users
+
+    def pick_ids(self):
+        customer = self.users["customer"]
+        return {
+            "category": Category.objects.values_list("pk", flat=True).first(),
+            "menuitem": MenuItem.objects.values_list("pk", flat=True).first(),
+            "order": customer.orders.values_list("pk", flat=True).first(),
+            "crew_order": Order.objects.filter(delivery_crew=self.users["crew"])
+            .values_list("pk", flat=True)
+            .first(),
+            "manager": self.users["manager"].pk,
+            "crew": self.users["crew"].pk,
+        }
+
+    def fill_cart(self):
+        menuitem = MenuItem.objects.first()
+        store = get_cart_store()
+        return store.set_item(self.users["customer"], menuitem, 1).pk
+
+    def failed_job(self):
+        job = enqueue(
+            record_order_sales.task_name,
+            {"order_id": 0, "status": "bogus"},
+        )
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED)
+        return job.pk
+
+    def menu_upload(self):
+        # Re-import the current menu: every row is an update.
+        return SimpleUploadedFile("menu.csv", b"".join(export_rows("csv")))
+
+    def scenarios(self):
+        ids = self.ids
+        menuitem = ids["menuitem"]
+        return [
+            {"name": "api-root", "route": "api-root", "role": "anonymous"},
+            {"name": "category-list", "route": "category-list", "role": "anonymous"},
+            {
+                "name": "category-detail",
+                "route": "category-detail",
+                "role": "anonymous",
+                "args": [ids["category"]],
+            },
+            {"name": "menuitem-list", "route": "menuitem-list", "role": "anonymous"},
+            {
+                "name": "menuitem-list-filtered",
+                "route": "menuitem-list",
+                "role": "customer",
+                "query": f"?category={ids['category']}&ordering=price",
+            },
+            {
+                "name": "menuitem-search",
+                "route": "menuitem-list",
+                "role": "anonymous",
+                "query": "?search=item",
+            },
+            {
+                "name": "menuitem-export",
+                "route": "menuitem-export",
+                "role": "manager",
+                "query": "?file_format=jsonl",
+            },
+            {
+                "name": "menuitem-import",
+                "route": "menuitem-import",
+                "role": "manager",
+                "method": "post",
+                "upload": self.menu_upload,
+            },
+            {
+                "name": "menuitem-detail",
+                "route": "menuitem-detail",
+                "role": "anonymous",
+                "args": [menuitem],
+            },
+            {"name": "order-list-customer", "route": "order-list", "role": "customer"},
+            {"name": "order-list-crew", "route": "order-list", "role": "crew"},
+            {"name": "order-list-manager", "route": "order-list", "role": "manager"},
+            {
+                "name": "order-detail",
+                "route": "order-detail",
+                "role": "customer",
+                "args": [ids["order"]],
+            },
+            {
+                "name": "order-export",
+                "route": "order-export",
+                "role": "manager",
+                "query": "?file_format=jsonl",
+            },
+            {
+                "name": "order-assign",
+                "route": "order-assign",
+                "role": "manager",
+                "method": "post",
+                "data": {"limit": 100},
+            },
+            {
+                "name": "order-checkout",
+                "route": "order-list",
+                "role": "customer",
+                "method": "post",
+                "setup": self.fill_cart,
+            },
+            {
+                "name": "order-status-update",
+                "route": "order-detail",
+                "role": "crew",
+                "method": "patch",
+                "args": [ids["crew_order"]],
+                "data": {"status": "completed"},
+            },
+            {"name": "manager-list", "route": "manager-list", "role": "admin"},
+            {
+                "name": "manager-detail",
+                "route": "manager-detail",
+                "role": "admin",
+                "args": [ids["manager"]],
+            },
+            {
+                "name": "delivery-crew-list",
+                "route": "delivery-crew-list",
+                "role": "manager",
+            },
+            {
+                "name": "delivery-crew-detail",
+                "route": "delivery-crew-detail",
+                "role": "manager",
+                "args": [ids["crew"]],
+            },
+            {"name": "cache-stats", "route": "cache-stats-list", "role": "admin"},
+            {"name": "job-list", "route": "job-list", "role": "admin"},
+            {"name": "job-summary", "route": "job-summary", "role": "admin"},
+            {
+                "name": "job-detail",
+                "route": "job-detail",
+                "role": "admin",
+                "setup": self.failed_job,
+                "setup_arg": True,
+            },
+            {
+                "name": "job-retry",
+                "route": "job-retry",
+                "role": "admin",
+                "method": "post",
+                "setup": self.failed_job,
+                "setup_arg": True,
+            },
+            {"name": "sales-daily", "route": "sales-list", "role": "manager"},
+            {
+                "name": "sales-menu-items",
+                "route": "sales-menu-items",
+                "role": "manager",
+            },
+            {
+                "name": "sales-categories",
+                "route": "sales-categories",
+                "role": "manager",
+            },
+            {"name": "cart-list", "route": "cart-list", "role": "customer"},
+            {
+                "name": "cart-add",
+                "route": "cart-list",
+                "role": "customer",
+                "method": "post",
+                "data": {"menuitem": menuitem, "quantity": 2},
+            },
+            {
+                "name": "cart-batch",
+                "route": "cart-batch",
+                "role": "customer",
+                "method": "post",
+                "data": {"items": [{"menuitem": menuitem, "quantity": 2}]},
+            },
+            {
+                "name": "cart-remove",
+                "route": "cart-remove",
+                "role": "customer",
+                "method": "delete",
+                "setup": self.fill_cart,
+                "setup_arg": True,
+            },
+            {
+                "name": "async-menuitem-list",
+                "route": "async-menuitem-list",
+                "role": "anonymous",
+            },
+            {
+                "name": "async-menuitem-detail",
+                "route": "async-menuitem-detail",
+                "role": "anonymous",
+                "args": [menuitem],
+            },
+            {"name": "async-cart-list", "route": "async-cart-list", "role": "customer"},
+            {
+                "name": "async-cart-add",
+                "route": "async-cart-list",
+                "role": "customer",
+                "method": "post",
+                "data": {"menuitem": menuitem, "quantity": 2},
+            },
+            {
+                "name": "async-cart-remove",
+                "route": "async-cart-remove",
+                "role": "customer",
+                "method": "delete",
+                "setup": self.fill_cart,
+                "setup_arg": True,
+            },
+        ]
+
+    def run(self, scenario, options):
+        client = Client(HTTP_HOST=self.host)
+        user = self.users[scenario["role"]]
+        if user is not None:
+            client.force_login(user)
+
+        timings, queries, sizes, statuses = [], [], [], set()
+        for iteration in range(options["warmup"] + options["iterations"]):
+            # Writes are rolled back so every iteration sees the same data.
+            with transaction.atomic():
+                args = list(scenario.get("args", []))
+                if "setup" in scenario:
+                    value = scenario["setup"]()
+                    if scenario.get("setup_arg"):
+                        args.append(value)
+                url = reverse(scenario["route"], args=args)
+                url += scenario.get("query", "")
+                if options["cold"]:
+                    cache.clear()
+                method = getattr(client, scenario.get("method", "get"))
+                kwargs = {}
+                if "data" in scenario:
+                    kwargs = {
+                        "data": json.dumps(scenario["data"]),
+                        "content_type": "application/json",
+                    }
+                elif "upload" in scenario:
+                    kwargs = {"data": {"file": scenario["upload"]()}}
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = method(url, **kwargs)
+                    if response.streaming:
+                        content = b"".join(response.streaming_content)
+                    else:
+                        content = response.content
+                    elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+
+            if iteration < options["warmup"]:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+            sizes.append(len(content))
+            statuses.add(response.status_code)
+
+        return {
+            "route": scenario["route"],
+            "role": scenario["role"],
+            "method": scenario.get("method", "get").upper(),
+            "status": sorted(statuses),
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "queries": max(queries),
+            "response_bytes": max(sizes),
+        }
+
+    def format_row(self, name, result):
+        return (
+            f"{name:<26} {result['method']:<6} {str(result['status']):<8} "
+            f"p50={result['p50_ms']:>8.2f}ms p95={result['p95_ms']:>8.2f}ms "
+            f"queries={result['queries']:<4} bytes={result['response_bytes']}"
+        )
@@ -0,0 +1,118 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from api.assignment import assign_pending_orders
+from api.models import Order
+from api.roles import CREW
+
+
+def assign_one_by_one():
+    """
+    The manual flow for comparison: per order, count the open orders of
+    every crew member and save the order with the least loaded one.
+    """
+    crew = list(User.objects.filter(groups__name=CREW, is_active=True))
+    pending = Order.objects.filter(status="pending", delivery_crew__isnull=True)
+    for order in pending.order_by("created", "id"):
+        loads = {
+            member: Order.objects.filter(
+                status="pending", delivery_crew=member
+            ).count()
+            for member in crew
+        }
+        order.delivery_crew = min(crew, key=lambda member: (loads[member], member.pk))
+        order.save()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time assigning thousands of pending orders to delivery crew, against "
+        "assigning them one by one. All changes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=5000)
+        parser.add_argument("--crew", type=int, default=20)
+        parser.add_argument(
+            "--baseline-orders",
+            type=int,
+            default=200,
+            help="Orders for the one-by-one baseline, which is much slower",
+        )
+        parser.add_argument("--iterations", type=int, default=3)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        results = {
+            "engine": self.measure(
+                assign_pending_orders, options["orders"], options
+            ),
+            "one-by-one": self.measure(
+                assign_one_by_one, options["baseline_orders"], options
+            ),
+        }
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<12} orders={result['orders']:<6} "
+                f"median={result['median_ms']:>10.2f}ms "
+                f"per-order={result['per_order_ms']:>7.3f}ms "
+                f"queries={result['queries']:<7} spread={result['load_spread']}"
+            )
+        baseline = results["one-by-one"]["per_order_ms"]
+        speedup = baseline / results["engine"]["per_order_ms"]
+        self.stdout.write(f"Per-order speedup: {speedup:.0f}x")
+
+        if options["output"]:
+            report = {"crew": options["crew"], "results": results}
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def setup(self, orders, crew_size):
+        group, created = Group.objects.get_or_create(name=CREW)
+        crew = list(group.user_set.filter(is_active=True)[:crew_size])
+        for index in range(len(crew), crew_size):
+            user = User.objects.create_user(username=f"benchmark-crew-{index}")
+            group.user_set.add(user)
+        customer = User.objects.create_user(username="benchmark-customer")
+        # Start from a clean slate: only the generated orders are waiting.
+        Order.objects.filter(
+            Q(delivery_crew__isnull=True) | Q(status="pending")
+        ).update(status="completed")
+        Order.objects.bulk_create(
+            Order(customer=customer, status="pending") for _ in range(orders)
+        )
+
+    def measure(self, func, orders, options):
+        timings, queries, spreads = [], [], []
+        for _ in range(options["iterations"]):
+            with transaction.atomic():
+                self.setup(orders, options["crew"])
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    func()
+                    timings.append((time.perf_counter() - start) * 1000)
+                queries.append(len(captured))
+                loads = Order.objects.filter(
+                    status="pending", delivery_crew__isnull=False
+                ).values_list("delivery_crew")
+                counts = {}
+                for (crew_id,) in loads:
+                    counts[crew_id] = counts.get(crew_id, 0) + 1
+                spreads.append(max(counts.values()) - min(counts.values()))
+                transaction.set_rollback(True)
+        median = statistics.median(timings)
+        return {
+            "orders": orders,
+            "median_ms": round(median, 3),
+            "per_order_ms": round(median / orders, 4),
+            "queries": max(queries),
+            "load_spread": max(spreads),
+        }
@@ -0,0 +1,85 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import ORJSONRenderer
+from api.serializers import CustomOrderSerializer
+from api.views import OrderViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Time loading, serializing and rendering a large order list with full "
+        "and sparse fieldsets, and with the stdlib and orjson renderers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=1000)
+        parser.add_argument("--iterations", type=int, default=5)
+        parser.add_argument("--fields", default="id,created,status,total")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        requests = {
+            "full": Request(factory.get("/")),
+            "sparse": Request(factory.get("/", {"fields": options["fields"]})),
+        }
+
+        results = {}
+        payloads = {}
+        for mode, request in requests.items():
+            view = OrderViewSet(request=request, format_kwarg=None)
+            queryset = view.get_queryset().order_by("-created", "-id")
+
+            def serialize():
+                orders = list(queryset[: options["orders"]])
+                context = {"request": request}
+                return CustomOrderSerializer(orders, many=True, context=context).data
+
+            payloads[mode] = serialize()
+            if not payloads[mode]:
+                raise CommandError("No orders found; run `manage.py seed_data` first")
+            results[f"load+serialize {mode}"] = self.measure(serialize, options)
+
+        for mode, data in payloads.items():
+            for name, renderer in (
+                ("json", JSONRenderer()),
+                ("orjson", ORJSONRenderer()),
+            ):
+                result = self.measure(lambda: renderer.render(data), options)
+                result["bytes"] = len(renderer.render(data))
+                results[f"render {mode} {name}"] = result
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<26} median={result['median_ms']:>9.2f}ms "
+                f"min={result['min_ms']:>9.2f}ms"
+                + (f" bytes={result['bytes']}" if "bytes" in result else "")
+            )
+        for mode in payloads:
+            stdlib = results[f"render {mode} json"]["median_ms"]
+            fast = results[f"render {mode} orjson"]["median_ms"]
+            self.stdout.write(f"orjson speedup ({mode}): {stdlib / fast:.1f}x")
+
+        if options["output"]:
+            report = {"orders": len(payloads["full"]), "results": results}
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def measure(self, func, options):
+        timings = []
+        for _ in range(options["iterations"]):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return {
+            "median_ms": round(statistics.median(timings), 3),
+            "min_ms": round(min(timings), 3),
+        }
@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api.menu_io import FORMATS, export_rows
+
+
+class Command(BaseCommand):
+    help = "Write the menu as CSV or JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file-format", choices=FORMATS, default="csv")
+        parser.add_argument("--output", help="Defaults to standard output")
+
+    def handle(self, *args, **options):
+        output = open(options["output"], "wb") if options["output"] else None
+        stream = output or sys.stdout.buffer
+        try:
+            for chunk in export_rows(options["file_format"]):
+                stream.write(chunk)
+        finally:
+            if output is not None:
+                output.close()
@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.order_export import export_orders
+from api.serializers import OrderExportQuerySerializer
+
+
+class Command(BaseCommand):
+    help = "Write order history with its items as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file-format", choices=("csv", "jsonl"), default="csv")
+        parser.add_argument("--start", help="First day to include (YYYY-MM-DD)")
+        parser.add_argument("--end", help="Last day to include (YYYY-MM-DD)")
+        parser.add_argument("--status")
+        parser.add_argument("--paid", choices=("true", "false"))
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--output", help="Defaults to standard output")
+
+    def handle(self, *args, **options):
+        params = OrderExportQuerySerializer(
+            data={
+                name: options[name]
+                for name in ("start", "end", "status", "paid")
+                if options[name] is not None
+            }
+        )
+        if not params.is_valid():
+            raise CommandError(params.errors)
+        filters = dict(params.validated_data)
+        filters.pop("file_format")
+        rows = export_orders(
+            options["file_format"], chunk_size=options["chunk_size"], **filters
+        )
+        output = open(options["output"], "wb") if options["output"] else None
+        stream = output or sys.stdout.buffer
+        try:
+            for chunk in rows:
+                stream.write(chunk)
+        finally:
+            if output is not None:
+                output.close()
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.menu_io import FORMATS, MenuImport, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Create or update menu items from a CSV or JSONL file, matched by name"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--file-format",
+            choices=FORMATS,
+            help="Defaults to the file extension",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        file_format = options["file_format"] or guess_format(options["path"])
+        if file_format is None:
+            raise CommandError("Cannot tell the format; pass --file-format")
+        with open(options["path"], "rb") as stream:
+            report = MenuImport(chunk_size=options["chunk_size"]).run(
+                read_rows(stream, file_format)
+            )
+        for error in report["errors"]:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {report['created']}, updated {report['updated']}, "
+                f"{report['error_count']} rows with errors"
+            )
+        )
@@ -0,0 +1,84 @@
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from .benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent requests to a running server and report requests per "
+        "second and tail latency, e.g. to compare the WSGI and ASGI deployments"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="Absolute URLs to request")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--token", help="Send 'Authorization: Token <token>'")
+        parser.add_argument("--label", default="", help="Stored with the results")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        headers = {"Accept": "application/json"}
+        if options["token"]:
+            headers["Authorization"] = f"Token {options['token']}"
+
+        results = {}
+        for url in options["urls"]:
+            results[url] = self.load(
+                url, headers, options["requests"], options["concurrency"]
+            )
+            result = results[url]
+            self.stdout.write(
+                f"{url}: {result['rps']:.1f} req/s p50={result['p50_ms']:.2f}ms "
+                f"p95={result['p95_ms']:.2f}ms p99={result['p99_ms']:.2f}ms "
+                f"errors={result['errors']}"
+            )
+
+        report = json.dumps(
+            {
+                "label": options["label"],
+                "requests": options["requests"],
+                "concurrency": options["concurrency"],
+                "results": results,
+            },
+            indent=2,
+        )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
+
+    def load(self, url, headers, total, concurrency):
+        def fetch(_):
+            request = urllib.request.Request(url, headers=headers)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                    ok = response.status < 400
+            except (urllib.error.URLError, OSError):
+                ok = False
+            return time.perf_counter() - start, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(fetch, range(total)))
+        elapsed = time.perf_counter() - start
+
+        timings = [duration * 1000 for duration, ok in samples]
+        return {
+            "rps": round(total / elapsed, 2),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "errors": sum(1 for duration, ok in samples if not ok),
+        }
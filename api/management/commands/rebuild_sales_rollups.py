@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollup tables from order items"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Number of orders aggregated per query",
+        )
+
+    def handle(self, *args, **options):
+        processed = rebuild_rollups(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt sales rollups from {processed} orders")
+        )
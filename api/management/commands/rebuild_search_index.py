@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from api.models import MenuItem
+from api.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Recreate the menu item full-text search index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options["database"])
+        with transaction.atomic(using=options["database"]):
+            backend.create()
+            backend.rebuild()
+        count = MenuItem.objects.using(options["database"]).count()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} menu items"))
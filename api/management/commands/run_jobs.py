@@ -0,0 +1,88 @@
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from api.jobs import claim_jobs, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "JOB_CONCURRENCY", 4),
+            help="Number of jobs run at the same time",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Jobs claimed per poll (defaults to --concurrency)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=getattr(settings, "JOB_POLL_INTERVAL", 1.0),
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when no jobs are ready instead of polling",
+        )
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        if connection.vendor == "sqlite" and options["concurrency"] > 1:
+            # SQLite allows one writer at a time and fails, rather than waits,
+            # when concurrent transactions upgrade to writes.
+            self.stderr.write("SQLite runs one job at a time; ignoring --concurrency")
+            options["concurrency"] = 1
+        batch_size = options["batch_size"] or options["concurrency"]
+        self.stopping = False
+        if not options["once"]:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        counts = {}
+        executor = None
+        if options["concurrency"] > 1:
+            executor = ThreadPoolExecutor(max_workers=options["concurrency"])
+        try:
+            while not self.stopping:
+                requeue_stale()
+                jobs = claim_jobs(worker, batch_size)
+                if not jobs:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+                if executor is None:
+                    statuses = [run_job(job) for job in jobs]
+                else:
+                    statuses = list(executor.map(self.run_in_thread, jobs))
+                for status in statuses:
+                    counts[status] = counts.get(status, 0) + 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        summary = ", ".join(f"{count} {status}" for status, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Ran jobs: {summary or 'none'}"))
+
+    def run_in_thread(self, job):
+        # Each pool thread keeps its own connection between jobs.
+        close_old_connections()
+        return run_job(job)
+
+    def stop(self, signum, frame):
+        # Finish the current batch, then exit.
+        self.stopping = True
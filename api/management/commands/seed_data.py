@@ -0,0 +1,186 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from api.analytics import rebuild_rollups
+from api.cache import MENU_NAMESPACE, bump_namespace
+from api.models import Cart, CartItem, Category, MenuItem, Order, OrderItem
+from api.roles import CREW, MANAGERS
+from api.search import get_search_backend
+
+SEED_PASSWORD = "seed-pass"
+
+
+class Command(BaseCommand):
+    help = "Seed the database with generated data for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--menu-items", type=int, default=200)
+        parser.add_argument("--customers", type=int, default=100)
+        parser.add_argument("--managers", type=int, default=2)
+        parser.add_argument("--crew", type=int, default=10)
+        parser.add_argument("--carts", type=int, default=50)
+        parser.add_argument("--orders", type=int, default=1000)
+        parser.add_argument("--items-per-order", type=int, default=3)
+        parser.add_argument(
+            "--days", type=int, default=365, help="Spread orders over this many days"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.prefix = f"seed{timezone.now():%Y%m%d%H%M%S}"
+
+        with transaction.atomic():
+            categories = self.seed_categories(options["categories"])
+            menuitems = self.seed_menu_items(options["menu_items"], categories)
+            customers = self.seed_users("customer", options["customers"])
+            managers = self.seed_users("manager", options["managers"], MANAGERS)
+            crew = self.seed_users("crew", options["crew"], CREW)
+            self.seed_users("admin", 1, is_superuser=True, is_staff=True)
+            self.seed_carts(customers[: options["carts"]], menuitems)
+            self.seed_orders(
+                options["orders"],
+                options["items_per_order"],
+                options["days"],
+                customers,
+                crew,
+                menuitems,
+            )
+
+        # bulk_create skips the signals that normally keep these current.
+        bump_namespace(MENU_NAMESPACE)
+        get_search_backend().index(menuitem.pk for menuitem in menuitems)
+        rebuild_rollups()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(categories)} categories, {len(menuitems)} menu items, "
+                f"{len(customers)} customers, {len(managers)} managers, "
+                f"{len(crew)} crew and {options['orders']} orders "
+                f"(password: {SEED_PASSWORD!r}, usernames start with {self.prefix!r})"
+            )
+        )
+
+    def seed_categories(self, count):
+        categories = [
+            Category(name=f"{self.prefix} Category {i}") for i in range(count)
+        ]
+        for category in categories:
+            category.slug = slugify(category.name)
+        return Category.objects.bulk_create(categories, batch_size=self.batch_size)
+
+    def seed_menu_items(self, count, categories):
+        menuitems = []
+        for i in range(count):
+            name = f"{self.prefix} Item {i}"
+            menuitems.append(
+                MenuItem(
+                    name=name,
+                    slug=slugify(name),
+                    price=Decimal(self.rng.randint(100, 5000)) / 100,
+                    featured=self.rng.random() < 0.2,
+                    category=self.rng.choice(categories),
+                    description=f"Generated menu item number {i}",
+                )
+            )
+        return MenuItem.objects.bulk_create(menuitems, batch_size=self.batch_size)
+
+    def seed_users(self, role, count, group_name=None, **flags):
+        password = make_password(SEED_PASSWORD)
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f"{self.prefix}-{role}-{i}",
+                    email=f"{self.prefix}-{role}-{i}@example.com",
+                    password=password,
+                    **flags,
+                )
+                for i in range(count)
+            ],
+            batch_size=self.batch_size,
+        )
+        if group_name:
+            group, created = Group.objects.get_or_create(name=group_name)
+            User.groups.through.objects.bulk_create(
+                [User.groups.through(user=user, group=group) for user in users],
+                batch_size=self.batch_size,
+            )
+        return users
+
+    def seed_carts(self, customers, menuitems):
+        carts = Cart.objects.bulk_create(
+            [Cart(customer=customer) for customer in customers],
+            batch_size=self.batch_size,
+        )
+        cart_items = []
+        for cart in carts:
+            for menuitem in self.rng.sample(menuitems, min(3, len(menuitems))):
+                quantity = self.rng.randint(1, 4)
+                cart_items.append(
+                    CartItem(
+                        cart=cart,
+                        menuitem=menuitem,
+                        quantity=quantity,
+                        unit_price=menuitem.price,
+                        price=menuitem.price * quantity,
+                    )
+                )
+        CartItem.objects.bulk_create(cart_items, batch_size=self.batch_size)
+
+    def seed_orders(self, count, items_per_order, days, customers, crew, menuitems):
+        now = timezone.now()
+        statuses = [status for status, label in Order.STATUS_CHOICES]
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            orders = []
+            lines = []
+            for _ in range(size):
+                order = Order(
+                    customer=self.rng.choice(customers),
+                    delivery_crew=self.rng.choice(crew) if crew else None,
+                    status=self.rng.choice(statuses),
+                    paid=self.rng.random() < 0.7,
+                    discount=self.rng.choice([0, 0, 0, 5, 10]),
+                )
+                items = [
+                    (menuitem, self.rng.randint(1, 3))
+                    for menuitem in self.rng.sample(
+                        menuitems, min(items_per_order, len(menuitems))
+                    )
+                ]
+                order.total = sum(menuitem.price * qty for menuitem, qty in items)
+                order.apply_discount()
+                orders.append(order)
+                lines.append(items)
+
+            orders = Order.objects.bulk_create(orders)
+            # created is auto_now_add, so backdate it with bulk_update, which
+            # skips pre_save.
+            for order in orders:
+                order.created = now - timedelta(
+                    seconds=self.rng.randint(0, days * 24 * 60 * 60)
+                )
+            Order.objects.bulk_update(orders, ["created"])
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(
+                        order=order,
+                        menuitem=menuitem,
+                        quantity=quantity,
+                        price=menuitem.price,
+                    )
+                    for order, items in zip(orders, lines)
+                    for menuitem, quantity in items
+                ],
+                batch_size=self.batch_size,
+            )
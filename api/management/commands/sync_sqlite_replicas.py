@@ -0,0 +1,36 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.dbrouter import PRIMARY
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into every SQLite replica in "
+        "DATABASE_REPLICAS (a stand-in for replication in development)"
+    )
+
+    def handle(self, *args, **options):
+        primary = connections[PRIMARY]
+        if primary.vendor != "sqlite":
+            raise CommandError("The primary database is not SQLite")
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError("No replicas configured; set DB_REPLICAS")
+        primary.ensure_connection()
+        for alias in replicas:
+            replica = connections[alias]
+            if replica.vendor != "sqlite":
+                raise CommandError(f"{alias} is not an SQLite database")
+            replica.close()
+            target = sqlite3.connect(replica.settings_dict["NAME"])
+            try:
+                # The backup API copies a consistent snapshot, even while the
+                # primary is being written to.
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f"Copied {PRIMARY} to {alias}"))
@@ -0,0 +1,218 @@
+"""
+Streaming CSV/JSONL import and export of the menu.
+
+Imports are processed in chunks: categories are resolved or created in bulk
+and menu items are upserted by name, so a chunk costs a handful of queries
+instead of one request per item. Bulk writes skip model signals, so the
+search index and the menu response cache are refreshed here instead.
+"""
+
+import csv
+import io
+import json
+
+from django.db import IntegrityError, router, transaction
+from django.utils.text import slugify
+
+from .cache import MENU_NAMESPACE, bump_namespace
+from .models import Category, MenuItem
+from .search import get_search_backend
+from .serializers import MenuImportRowSerializer
+
+FORMATS = ("csv", "jsonl")
+EXPORT_FIELDS = ["name", "price", "category", "featured", "description"]
+CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+MAX_REPORTED_ERRORS = 1000
+
+
+def guess_format(filename):
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(extension)
+
+
+def read_rows(stream, file_format):
+    """
+    Yield ``(line, row, error)`` from a binary stream, one row at a time.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as exc:
+            yield line, None, {"non_field_errors": [f"Invalid JSON: {exc}"]}
+            continue
+        if not isinstance(row, dict):
+            yield line, None, {"non_field_errors": ["Expected a JSON object"]}
+            continue
+        yield line, row, None
+
+
+class MenuImport:
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+        self.search = get_search_backend(router.db_for_write(MenuItem))
+
+    def run(self, rows):
+        chunk = []
+        for line, row, error in rows:
+            if error is None:
+                # Empty CSV cells mean "use the default".
+                row = {key: value for key, value in row.items() if value != ""}
+                serializer = MenuImportRowSerializer(data=row)
+                if serializer.is_valid():
+                    chunk.append((line, serializer.validated_data))
+                else:
+                    error = serializer.errors
+            if error is not None:
+                self.add_error(line, error)
+            if len(chunk) >= self.chunk_size:
+                self.write_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.write_chunk(chunk)
+        bump_namespace(MENU_NAMESPACE)
+        return self.report()
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def report(self):
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+    def write_chunk(self, chunk):
+        # A later row for the same name wins.
+        rows = {data["name"]: (line, data) for line, data in chunk}
+        # Errors by line, reported once the chunk is done, so that a row
+        # rejected before the retry below is not reported twice.
+        rejected = {}
+        try:
+            with transaction.atomic():
+                self.upsert(list(rows.values()), rejected)
+        except IntegrityError:
+            # Find the offending rows one by one and keep the rest.
+            for line, data in rows.values():
+                if line in rejected:
+                    continue
+                try:
+                    with transaction.atomic():
+                        self.upsert([(line, data)], rejected)
+                except IntegrityError as exc:
+                    rejected[line] = {"non_field_errors": [str(exc)]}
+        for line in sorted(rejected):
+            self.add_error(line, rejected[line])
+
+    def upsert(self, rows, rejected):
+        categories = self.resolve_categories({data["category"] for _, data in rows})
+        items = []
+        for line, data in rows:
+            category = categories.get(data["category"])
+            if category is None:
+                rejected[line] = {
+                    "category": ["Clashes with an existing category slug."]
+                }
+                continue
+            items.append(
+                MenuItem(
+                    name=data["name"],
+                    slug=slugify(data["name"]),
+                    price=data["price"],
+                    featured=data["featured"],
+                    category_id=category,
+                    description=data["description"],
+                )
+            )
+        if not items:
+            return
+        names = [item.name for item in items]
+        existing = MenuItem.objects.filter(name__in=names).count()
+        MenuItem.objects.bulk_create(
+            items,
+            update_conflicts=True,
+            unique_fields=["name"],
+            update_fields=[
+                "slug",
+                "price",
+                "featured",
+                "category",
+                "description",
+                "updated",
+            ],
+        )
+        self.search.index(
+            MenuItem.objects.filter(name__in=names).values_list("pk", flat=True)
+        )
+        self.updated += existing
+        self.created += len(items) - existing
+
+    def resolve_categories(self, names):
+        """
+        Return ``{name: id}``, creating missing categories in one query.
+        """
+        found = dict(
+            Category.objects.filter(name__in=names).values_list("name", "pk")
+        )
+        missing = [name for name in names if name not in found]
+        if missing:
+            Category.objects.bulk_create(
+                [Category(name=name, slug=slugify(name)) for name in missing],
+                ignore_conflicts=True,
+            )
+            found.update(
+                Category.objects.filter(name__in=missing).values_list("name", "pk")
+            )
+        return found
+
+
+class Echo:
+    """
+    File-like object whose write() returns the value, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_rows(file_format, chunk_size=2000):
+    """
+    Yield the menu as encoded CSV or JSONL lines, reading it in chunks.
+    """
+    rows = (
+        MenuItem.objects.order_by("pk")
+        .values_list("name", "price", "category__name", "featured", "description")
+        .iterator(chunk_size=chunk_size)
+    )
+    if file_format == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_FIELDS).encode("utf-8")
+        for row in rows:
+            yield writer.writerow(row).encode("utf-8")
+        return
+    for name, price, category, featured, description in rows:
+        line = json.dumps(
+            {
+                "name": name,
+                "price": str(price),
+                "category": category,
+                "featured": featured,
+                "description": description,
+            }
+        )
+        yield f"{line}\n".encode("utf-8")
@@ -0,0 +1,124 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from .dbrouter import PIN_COOKIE, replica_reads
+from .timing import RequestTimer, activate, deactivate
+
+logger = logging.getLogger("api.timing")
+
+
+class ServerTimingMiddleware:
+    """
+    Time SQL, serializers and rendering for each request and report them in
+    a ``Server-Timing`` header and a structured log line.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(timer, token)
+        return self.finish(request, response, timer)
+
+    async def __acall__(self, request):
+        timer, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(timer, token)
+        return self.finish(request, response, timer)
+
+    def start(self, request):
+        timer = RequestTimer(getattr(settings, "SERVER_TIMING_SLOW_QUERIES", 5))
+        timer.started = time.perf_counter()
+        request.api_timer = timer
+        return timer, activate(timer)
+
+    def stop(self, timer, token):
+        timer.total_time = time.perf_counter() - timer.started
+        deactivate(token)
+
+    def finish(self, request, response, timer):
+        response["Server-Timing"] = timer.server_timing()
+        self.log(request, response, timer)
+        return response
+
+    def process_template_response(self, request, response):
+        timer = request.api_timer
+        start = time.perf_counter()
+
+        def rendered(response):
+            timer.render_time += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def log(self, request, response, timer):
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            **timer.as_dict(),
+        }
+        logger.info(json.dumps(record))
+
+        threshold = getattr(settings, "SERVER_TIMING_SLOW_REQUEST_MS", 500)
+        if record["total_ms"] >= threshold:
+            logger.warning(
+                json.dumps({**record, "slow": True, "slowest_queries": timer.slowest()})
+            )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let safe requests read from replicas (see api/dbrouter.py). After a
+    write, a short-lived cookie keeps the client on the primary for
+    ``DATABASE_REPLICA_PIN_SECONDS`` so it does not read stale data.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.use_replicas(request)) as state:
+            response = self.get_response(request)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        with replica_reads(self.use_replicas(request)) as state:
+            response = await self.get_response(request)
+        return self.finish(response, state)
+
+    def use_replicas(self, request):
+        return request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+
+    def finish(self, response, state):
+        seconds = getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 0)
+        if state.wrote and seconds:
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=seconds, httponly=True, samesite="Lax"
+            )
+        return response
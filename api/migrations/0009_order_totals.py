@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-18 03:27
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_auto_20240521_1949'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['total', 'id'], name='api_order_total_d6fb39_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-18 03:28
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_order_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('canceled', 'Canceled')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='api.category')),
+            ],
+            options={
+                'verbose_name_plural': 'daily category sales',
+                'ordering': ['date', 'category'],
+                'unique_together': {('date', 'category', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyMenuItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('canceled', 'Canceled')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('menuitem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='api.menuitem')),
+            ],
+            options={
+                'verbose_name_plural': 'daily menu item sales',
+                'ordering': ['date', 'menuitem'],
+                'unique_together': {('date', 'menuitem', 'status')},
+            },
+        ),
+    ]
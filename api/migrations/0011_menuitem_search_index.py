@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from api.search import get_search_backend
+
+    backend = get_search_backend(schema_editor.connection.alias)
+    backend.create()
+    backend.rebuild()
+
+
+def drop_search_index(apps, schema_editor):
+    from api.search import get_search_backend
+
+    get_search_backend(schema_editor.connection.alias).drop()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
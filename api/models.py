@@ -1,8 +1,31 @@
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import F, Sum, Value, Prefetch
+from django.db.models.functions import Coalesce
+from django.db.models.sql import UpdateQuery
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
+
+CENTS = Decimal("0.01")
+
+
+def update_version(queryset, values):
+    """
+    Write ``values`` and move ``version`` on in one UPDATE, returning the new
+    version (None if no row matched) with RETURNING (SQLite 3.35+,
+    PostgreSQL) instead of reading it back.
+    """
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values({**values, "version": F("version") + 1})
+    sql, params = query.get_compiler(queryset.db).as_sql()
+    connection = connections[queryset.db]
+    column = connection.ops.quote_name("version")
+    with connection.cursor() as cursor:
+        cursor.execute(f"{sql} RETURNING {column}", params)
+        row = cursor.fetchone()
+    return row[0] if row else None
 
 
 class Category(models.Model):
@@ -33,6 +56,7 @@ class MenuItem(models.Model):
     )
     description = models.CharField(max_length=255, blank=True)
     image = models.ImageField(blank=True, null=True)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -79,6 +103,17 @@ class CartItem(models.Model):
         return self.menuitem.name
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Load orders with everything the order serializers read. Totals are
+        stored on the order row, so no per-order aggregation is needed.
+        """
+        return self.select_related("customer", "delivery_crew").prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("menuitem"))
+        )
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -97,23 +132,118 @@ class Order(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(100)], default=0
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    total = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal(0), editable=False
+    )
+    discount_amount = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal(0), editable=False
+    )
+    subtotal = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal(0), editable=False
+    )
+    # Moves on with every write; exposed as the ETag of the order.
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created"]
-        indexes = [models.Index(fields=["-created"])]
+        indexes = [
+            models.Index(fields=["-created"]),
+            models.Index(fields=["total", "id"]),
+        ]
 
-    @property
-    def subtotal(self):
-        return self.total - self.get_discount()
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.apply_discount()
+            return super().save(*args, **kwargs)
 
-    @property
-    def total(self):
-        return sum(item.total_cost for item in self.items.all())
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            # The loaded total may predate update_totals(), so only write it
+            # when asked to explicitly.
+            update_fields = {
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+            } - self.get_deferred_fields() - {"total"}
+        update_fields = set(update_fields) - {"discount_amount", "subtotal"}
+        using = kwargs.get("using") or router.db_for_write(Order, instance=self)
+        with transaction.atomic(using=using):
+            if {"total", "discount"} & update_fields:
+                if "total" not in update_fields:
+                    self.total = (
+                        Order.objects.using(using)
+                        .select_for_update()
+                        .values_list("total", flat=True)
+                        .get(pk=self.pk)
+                    )
+                self.apply_discount()
+                update_fields |= {"discount_amount", "subtotal"}
+            # _do_update bumps the stored version rather than the loaded one,
+            # which may be stale.
+            kwargs["update_fields"] = update_fields | {"version"}
+            super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        version = update_version(
+            base_qs.filter(pk=pk_val),
+            {field.name: value for field, model, value in values},
+        )
+        if version is None:
+            return False
+        self.version = version
+        return True
+
+    def update_if_version(self, version, **changes):
+        """
+        Write ``changes`` (and a new version) in one UPDATE, only if the order
+        is still at ``version``. Returns False when another write got there
+        first, leaving the instance untouched.
+        """
+        changes["updated"] = timezone.now()
+        updated = Order.objects.filter(pk=self.pk, version=version).update(
+            version=F("version") + 1, **changes
+        )
+        if not updated:
+            return False
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.version = version + 1
+        return True
+
+    def apply_discount(self):
+        self.discount_amount = (
+            Decimal(self.total) * Decimal(self.discount) / Decimal(100)
+        ).quantize(CENTS, rounding=ROUND_HALF_UP)
+        self.subtotal = Decimal(self.total) - self.discount_amount
+
+    def update_totals(self):
+        """
+        Recompute the stored totals from the order items.
+        """
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        self.total = self.items.aggregate(
+            total=Coalesce(
+                Sum(F("price") * F("quantity"), output_field=money),
+                Value(Decimal(0)),
+                output_field=money,
+            )
+        )["total"]
+        self.apply_discount()
+        version = update_version(
+            Order.objects.filter(pk=self.pk),
+            {
+                "total": self.total,
+                "discount_amount": self.discount_amount,
+                "subtotal": self.subtotal,
+            },
+        )
+        if version is not None:
+            self.version = version
 
     def get_discount(self):
-        if self.discount:
-            return self.total * (self.discount / Decimal(100))
-        return Decimal(0)
+        return self.discount_amount
 
     def __str__(self):
         return f"Order {self.id}"
@@ -137,3 +267,76 @@ class OrderItem(models.Model):
     @property
     def total_cost(self):
         return self.price * self.quantity
+
+
+class DailyMenuItemSales(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(
+        MenuItem, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal(0))
+
+    class Meta:
+        ordering = ["date", "menuitem"]
+        unique_together = ("date", "menuitem", "status")
+        verbose_name_plural = "daily menu item sales"
+
+    def __str__(self):
+        return f"{self.date} {self.menuitem_id} {self.status}"
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal(0))
+
+    class Meta:
+        ordering = ["date", "category"]
+        unique_together = ("date", "category", "status")
+        verbose_name_plural = "daily category sales"
+
+    def __str__(self):
+        return f"{self.date} {self.category_id} {self.status}"
+
+
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created", "-id"]
+        indexes = [
+            models.Index(fields=["status", "run_at"]),
+            models.Index(fields=["-created"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
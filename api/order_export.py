@@ -0,0 +1,146 @@
+"""
+Streaming CSV/NDJSON export of order history.
+
+Orders and their items are read as one joined, ordered query through
+``.iterator()`` (a server-side cursor where the database supports it) and
+grouped back into orders on the fly, so memory use does not grow with the
+size of the export.
+"""
+
+import csv
+import json
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import router
+from django.utils import timezone
+
+from .menu_io import Echo
+from .models import Order
+
+ORDER_COLUMNS = [
+    "id",
+    "created",
+    "status",
+    "paid",
+    "customer",
+    "customer__username",
+    "delivery_crew",
+    "total",
+    "discount",
+    "discount_amount",
+    "subtotal",
+]
+ITEM_COLUMNS = [
+    "items__menuitem",
+    "items__menuitem__name",
+    "items__quantity",
+    "items__price",
+]
+CSV_HEADER = [
+    "order_id",
+    "created",
+    "status",
+    "paid",
+    "customer_id",
+    "customer",
+    "delivery_crew_id",
+    "total",
+    "discount",
+    "discount_amount",
+    "subtotal",
+    "menuitem_id",
+    "menuitem",
+    "quantity",
+    "price",
+    "line_total",
+]
+
+
+def day_start(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def export_queryset(start=None, end=None, status=None, paid=None):
+    """
+    Orders in ``[start, end]`` (local dates) as one row per order item.
+    Orders without items appear once, with empty item columns.
+    """
+    # Pick the database now: a streamed response is read after the request
+    # (and its replica routing) has finished.
+    queryset = Order.objects.using(router.db_for_read(Order))
+    # Compare against day boundaries so the index on ``created`` is used.
+    if start is not None:
+        queryset = queryset.filter(created__gte=day_start(start))
+    if end is not None:
+        queryset = queryset.filter(created__lt=day_start(end + timedelta(days=1)))
+    if status is not None:
+        queryset = queryset.filter(status=status)
+    if paid is not None:
+        queryset = queryset.filter(paid=paid)
+    return queryset.order_by("created", "id", "items__id").values_list(
+        *ORDER_COLUMNS, *ITEM_COLUMNS
+    )
+
+
+def iter_orders(queryset, chunk_size=2000):
+    """
+    Yield ``(order, items)`` tuples of column values from ``export_queryset``.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    split = len(ORDER_COLUMNS)
+    for _, group in groupby(rows, key=itemgetter(0)):
+        items = []
+        for row in group:
+            order = row[:split]
+            if row[split] is not None:
+                items.append(row[split:])
+        yield order, items
+
+
+def line_total(quantity, price):
+    return price * quantity
+
+
+def csv_rows(orders):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER).encode("utf-8")
+    for order, items in orders:
+        order = [order[0], order[1].isoformat(), *order[2:]]
+        if not items:
+            yield writer.writerow(order).encode("utf-8")
+        for menuitem, name, quantity, price in items:
+            row = [*order, menuitem, name, quantity, price, line_total(quantity, price)]
+            yield writer.writerow(row).encode("utf-8")
+
+
+def jsonl_rows(orders):
+    for order, items in orders:
+        record = dict(zip(ORDER_COLUMNS, order))
+        record["customer_username"] = record.pop("customer__username")
+        record["created"] = record["created"].isoformat()
+        for name in ("total", "discount_amount", "subtotal"):
+            record[name] = str(record[name])
+        record["quantity"] = sum(item[2] for item in items)
+        record["items"] = [
+            {
+                "menuitem": menuitem,
+                "name": name,
+                "quantity": quantity,
+                "price": str(price),
+                "line_total": str(line_total(quantity, price)),
+            }
+            for menuitem, name, quantity, price in items
+        ]
+        yield f"{json.dumps(record)}\n".encode("utf-8")
+
+
+def export_orders(file_format, chunk_size=2000, **filters):
+    """
+    Yield the matching orders as encoded CSV or NDJSON lines.
+    """
+    orders = iter_orders(export_queryset(**filters), chunk_size=chunk_size)
+    if file_format == "csv":
+        return csv_rows(orders)
+    return jsonl_rows(orders)
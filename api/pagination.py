@@ -0,0 +1,214 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework import filters
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the full ordering key (always ending in
+    ``id``) instead of an OFFSET, so deep pages cost the same as the first.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(
+            queryset, request, self.get_ordering(request, queryset, view)
+        )
+        return self.set_page(list(queryset))
+
+    def page_queryset(self, queryset, request, ordering):
+        """
+        Return the lazy, sliced queryset for the requested page so that it
+        can be evaluated either synchronously or with ``async for``.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = ordering
+        self.reverse, position = self.decode_cursor(request, queryset)
+        self.has_cursor = position is not None
+
+        if self.reverse:
+            ordering = [self._flip(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek(ordering, position))
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if self.reverse:
+            results.reverse()
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, filters.OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        return self.with_tiebreaker(ordering or self.get_default_ordering(queryset))
+
+    def get_default_ordering(self, queryset):
+        return self.ordering
+
+    def with_tiebreaker(self, ordering):
+        ordering = list(ordering)
+        if not any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            ordering.append("-id" if ordering[0].startswith("-") else "id")
+        return ordering
+
+    def get_next_link(self):
+        if not self.page or not (self.has_more or self.reverse):
+            return None
+        return self.encode_cursor(False, self._position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.page:
+            return None
+        if self.reverse and not self.has_more:
+            return None
+        if not self.reverse and not self.has_cursor:
+            return None
+        return self.encode_cursor(True, self._position(self.page[0]))
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def decode_cursor(self, request, queryset):
+        """
+        Return ``(reverse, position)`` from the cursor, with each position
+        value converted for its ordering field. Cursors that were tampered
+        with or made for another ordering are rejected with 404.
+        """
+        encoded = request.GET.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            reverse, position = bool(payload["r"]), list(payload["p"])
+            if len(position) != len(self.ordering):
+                raise ValueError("Cursor does not match the ordering")
+            position = [
+                self._to_python(queryset, field.lstrip("-"), value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def encode_cursor(self, reverse, position):
+        payload = json.dumps({"r": int(reverse), "p": position})
+        encoded = urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def _position(self, instance):
+        position = []
+        for field in self.ordering:
+            value = instance
+            for attr in field.lstrip("-").split("__"):
+                value = getattr(value, attr)
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            position.append(value)
+        return position
+
+    @staticmethod
+    def _to_python(queryset, name, value):
+        if value is None or isinstance(value, (dict, list)):
+            raise ValueError("Invalid cursor value")
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field.to_python(value)
+        model = queryset.model
+        for attr in name.split("__"):
+            field = model._meta.pk if attr == "pk" else model._meta.get_field(attr)
+            model = field.related_model
+        return field.to_python(value)
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _seek(ordering, position):
+        """
+        Build ``(a, b) > (x, y)`` style row comparison for the given ordering.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ("-created", "-id")
+
+
+class MenuItemPagination(KeysetPagination):
+    ordering = ("-created", "-id")
+
+    def get_default_ordering(self, queryset):
+        # Search results come back ranked by relevance.
+        if "search_rank" in queryset.query.annotations:
+            return ("search_rank", "id")
+        return self.ordering
+
+
+class JobPagination(KeysetPagination):
+    ordering = ("-created", "-id")
+
+
+class CategoryPagination(KeysetPagination):
+    ordering = ("name", "id")
@@ -1,5 +1,5 @@
 from rest_framework import permissions
-import logging
+from .roles import get_roles
 
 
 class IsManager(permissions.BasePermission):
@@ -7,15 +7,7 @@ class IsManager(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        user = request.user
-        is_manager = (
-            user
-            and user.is_authenticated
-            and user.groups.filter(name="Managers").exists()
-        )
-        is_superuser = user and user.is_superuser
-
-        return is_manager or is_superuser
+        return get_roles(request.user).is_manager
 
 
 class IsDeliveryCrew(permissions.BasePermission):
@@ -23,10 +15,14 @@ class IsDeliveryCrew(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        user = request.user
-        is_manager = (
-            user and user.is_authenticated and user.groups.filter(name="Crew").exists()
-        )
-        is_superuser = user and user.is_superuser
+        roles = get_roles(request.user)
+        return roles.is_crew or roles.is_superuser
+
 
-        return is_manager or is_superuser
+class IsManagerUser(permissions.BasePermission):
+    """
+    Managers and superusers only, for safe methods too.
+    """
+
+    def has_permission(self, request, view):
+        return get_roles(request.user).is_manager
@@ -0,0 +1,39 @@
+"""
+ETags and ``If-Match`` for optimistic concurrency on orders.
+
+An order's ETag is its version, which moves on with every write. A write
+sent with ``If-Match`` only goes ahead while the order is still at one of
+the listed versions; otherwise the client gets 412 with the current ETag
+and should read the order again before retrying.
+"""
+
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def version_etag(version):
+    return quote_etag(str(version))
+
+
+def if_match(request):
+    """
+    The ETags listed in ``If-Match``, or None without the header.
+    """
+    header = request.headers.get("If-Match")
+    if header is None:
+        return None
+    return parse_etags(header)
+
+
+def matches(etags, version):
+    # If-Match uses strong comparison, so weak ETags never match.
+    return etags is None or "*" in etags or version_etag(version) in etags
+
+
+def precondition_failed(version):
+    return Response(
+        {"detail": "The order was changed by another request.", "status": "fail"},
+        status=status.HTTP_412_PRECONDITION_FAILED,
+        headers={"ETag": version_etag(version)},
+    )
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.core.cache import cache
+
+MANAGERS = "Managers"
+CREW = "Crew"
+
+# Group changes made where the invalidation cannot reach (another process
+# with a per-process cache, raw SQL) are honoured for at most this long.
+ROLE_CACHE_TIMEOUT = getattr(settings, "ROLE_CACHE_TIMEOUT", 30)
+
+
+class Roles:
+    """
+    The roles a user holds, resolved from their group names.
+    """
+
+    def __init__(self, groups=(), is_superuser=False, is_authenticated=True):
+        self.groups = frozenset(groups)
+        self.is_superuser = is_superuser
+        self.is_authenticated = is_authenticated
+
+    @property
+    def is_manager(self):
+        return self.is_superuser or MANAGERS in self.groups
+
+    @property
+    def is_crew(self):
+        return CREW in self.groups
+
+    @property
+    def is_staff_member(self):
+        return self.is_manager or self.is_crew
+
+    @property
+    def is_customer(self):
+        return self.is_authenticated and not self.is_staff_member
+
+    def __repr__(self):
+        return f"<Roles {sorted(self.groups)} superuser={self.is_superuser}>"
+
+
+ANONYMOUS = Roles(is_authenticated=False)
+
+
+def role_cache_key(user_id):
+    return f"api:roles:{user_id}"
+
+
+def get_roles(user):
+    """
+    Return the user's roles, loading group names at most once per request
+    (memoized on the user object) and sharing them across requests through
+    the cache.
+    """
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+
+    roles = getattr(user, "_api_roles", None)
+    if roles is None:
+        key = role_cache_key(user.pk)
+        groups = cache.get(key)
+        if groups is None:
+            groups = list(user.groups.values_list("name", flat=True))
+            cache.set(key, groups, ROLE_CACHE_TIMEOUT)
+        roles = Roles(groups, is_superuser=user.is_superuser)
+        user._api_roles = roles
+    return roles
+
+
+async def aget_roles(user):
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+
+    roles = getattr(user, "_api_roles", None)
+    if roles is None:
+        key = role_cache_key(user.pk)
+        groups = await cache.aget(key)
+        if groups is None:
+            groups = [name async for name in user.groups.values_list("name", flat=True)]
+            await cache.aset(key, groups, ROLE_CACHE_TIMEOUT)
+        roles = Roles(groups, is_superuser=user.is_superuser)
+        user._api_roles = roles
+    return roles
+
+
+def invalidate_roles(*user_ids):
+    cache.delete_many([role_cache_key(user_id) for user_id in user_ids])
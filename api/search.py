@@ -0,0 +1,285 @@
+"""
+Full-text search over menu item name, description and category name.
+
+The index lives in a side table maintained by signals (see
+``api/signals.py``): an FTS5 virtual table on SQLite and a ``tsvector``
+table with a GIN index on PostgreSQL. Other databases fall back to
+unindexed ``icontains`` matching.
+
+Searches return at most ``SEARCH_MAX_RESULTS`` items, the most relevant
+after the other filters of the request, and responses that were cut short
+carry ``X-Search-Truncated: true``.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from rest_framework import filters
+
+SEARCH_MAX_RESULTS = getattr(settings, "SEARCH_MAX_RESULTS", 1000)
+SEARCH_TRUNCATED_HEADER = "X-Search-Truncated"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())[:10]
+
+
+class SearchBackend:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        pass
+
+    def drop(self):
+        pass
+
+    def index(self, menuitem_ids):
+        pass
+
+    def remove(self, menuitem_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, limit, within=None):
+        """
+        Return ``[menuitem_id, ...]`` for ``query``, most relevant first.
+        Every term matches as a prefix, for type-ahead. ``within`` is a
+        MenuItem queryset the results must belong to, applied before
+        ``limit``.
+        """
+        raise NotImplementedError
+
+    def within_sql(self, within):
+        """
+        ``(sql, params)`` selecting the ids of ``within``, or None.
+        """
+        if within is None:
+            return None
+        return within.order_by().values("pk").query.sql_with_params()
+
+    def execute(self, sql, params=()):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            if cursor.description:
+                return cursor.fetchall()
+        return []
+
+
+class SQLiteSearchBackend(SearchBackend):
+    table = "api_menuitem_fts"
+    source = (
+        "SELECT m.id, m.name, m.description, c.name FROM api_menuitem m "
+        "JOIN api_category c ON c.id = m.category_id"
+    )
+
+    def create(self):
+        self.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "name, description, category, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+    def drop(self):
+        self.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, menuitem_ids):
+        menuitem_ids = list(menuitem_ids)
+        if not menuitem_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(menuitem_ids))
+        self.remove(menuitem_ids)
+        self.execute(
+            f"INSERT INTO {self.table} (rowid, name, description, category) "
+            f"{self.source} WHERE m.id IN ({placeholders})",
+            menuitem_ids,
+        )
+
+    def remove(self, menuitem_ids):
+        menuitem_ids = list(menuitem_ids)
+        if not menuitem_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(menuitem_ids))
+        self.execute(
+            f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", menuitem_ids
+        )
+
+    def rebuild(self):
+        self.execute(f"DELETE FROM {self.table}")
+        self.execute(
+            f"INSERT INTO {self.table} (rowid, name, description, category) "
+            f"{self.source}"
+        )
+
+    def search(self, query, limit, within=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"*' for term in terms)
+        where, params = f"{self.table} MATCH %s", [match]
+        subquery = self.within_sql(within)
+        if subquery is not None:
+            where += f" AND rowid IN ({subquery[0]})"
+            params.extend(subquery[1])
+        # bm25() is lower for better matches; weight name over description
+        # over category.
+        rows = self.execute(
+            f"SELECT rowid FROM {self.table} WHERE {where} "
+            f"ORDER BY bm25({self.table}, 10.0, 2.0, 1.0) LIMIT %s",
+            [*params, limit],
+        )
+        return [row[0] for row in rows]
+
+
+class PostgresSearchBackend(SearchBackend):
+    table = "api_menuitem_search"
+    config = "english"
+
+    def document(self):
+        return (
+            f"setweight(to_tsvector('{self.config}', m.name), 'A') || "
+            f"setweight(to_tsvector('{self.config}', m.description), 'B') || "
+            f"setweight(to_tsvector('{self.config}', c.name), 'C')"
+        )
+
+    def source(self):
+        return (
+            f"SELECT m.id, {self.document()} FROM api_menuitem m "
+            "JOIN api_category c ON c.id = m.category_id"
+        )
+
+    def create(self):
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "menuitem_id bigint PRIMARY KEY "
+            "REFERENCES api_menuitem (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        self.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_document "
+            f"ON {self.table} USING GIN (document)"
+        )
+
+    def drop(self):
+        self.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, menuitem_ids):
+        menuitem_ids = list(menuitem_ids)
+        if not menuitem_ids:
+            return
+        self.execute(
+            f"INSERT INTO {self.table} (menuitem_id, document) "
+            f"{self.source()} WHERE m.id = ANY(%s) "
+            "ON CONFLICT (menuitem_id) DO UPDATE SET document = EXCLUDED.document",
+            [menuitem_ids],
+        )
+
+    def remove(self, menuitem_ids):
+        menuitem_ids = list(menuitem_ids)
+        if menuitem_ids:
+            self.execute(
+                f"DELETE FROM {self.table} WHERE menuitem_id = ANY(%s)",
+                [menuitem_ids],
+            )
+
+    def rebuild(self):
+        self.execute(f"TRUNCATE {self.table}")
+        self.execute(
+            f"INSERT INTO {self.table} (menuitem_id, document) {self.source()}"
+        )
+
+    def search(self, query, limit, within=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        where, params = "document @@ query", []
+        subquery = self.within_sql(within)
+        if subquery is not None:
+            where += f" AND menuitem_id IN ({subquery[0]})"
+            params.extend(subquery[1])
+        rows = self.execute(
+            f"SELECT menuitem_id FROM {self.table}, "
+            f"to_tsquery('{self.config}', %s) query WHERE {where} "
+            "ORDER BY ts_rank(document, query) DESC LIMIT %s",
+            [" & ".join(f"{term}:*" for term in terms), *params, limit],
+        )
+        return [row[0] for row in rows]
+
+
+class FallbackSearchBackend(SearchBackend):
+    def search(self, query, limit, within=None):
+        from .models import MenuItem
+
+        terms = tokenize(query)
+        if not terms:
+            return []
+        queryset = within
+        if queryset is None:
+            queryset = MenuItem.objects.using(self.connection.alias)
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term)
+                | Q(description__icontains=term)
+                | Q(category__name__icontains=term)
+            )
+        return list(queryset.order_by("name").values_list("pk", flat=True)[:limit])
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend(using="default"):
+    connection = connections[using]
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)(connection)
+
+
+def apply_search(queryset, query):
+    """
+    Restrict ``queryset`` to the ``SEARCH_MAX_RESULTS`` most relevant menu
+    items matching ``query`` and annotate their relevance as ``search_rank``
+    (0 is the best match). Returns the queryset and whether more items
+    matched than were kept.
+    """
+    if not tokenize(query):
+        return queryset, False
+    # Filters already on the queryset are applied before the cap, so that
+    # they do not remove items from an already truncated list.
+    within = queryset if queryset.query.has_filters() else None
+    ids = get_search_backend(queryset.db).search(
+        query, SEARCH_MAX_RESULTS + 1, within=within
+    )
+    truncated = len(ids) > SEARCH_MAX_RESULTS
+    ids = ids[:SEARCH_MAX_RESULTS]
+    if not ids:
+        return queryset.none(), False
+    rank = Case(
+        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).annotate(search_rank=rank), truncated
+
+
+class MenuItemSearchFilter(filters.BaseFilterBackend):
+    """
+    ``?search=`` backed by the full-text index. Without an explicit
+    ``?ordering=`` results are ordered by relevance. Must come after the
+    backends that filter the queryset, which then apply before the cap.
+    """
+
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "")
+        queryset, truncated = apply_search(queryset, query)
+        if truncated:
+            view.headers[SEARCH_TRUNCATED_HEADER] = "true"
+        return queryset
@@ -1,8 +1,11 @@
 from rest_framework import serializers
-from .models import MenuItem, Category, Cart, CartItem, Order, OrderItem
+from .models import MenuItem, Category, Cart, CartItem, Order, OrderItem, Job
+from .fieldsets import SparseFieldsMixin
+from .images import derivative_urls
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 from django.contrib.auth.models import User
 import bleach
+from decimal import Decimal
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
 
 
@@ -41,11 +44,12 @@ class CategorySerializer(serializers.ModelSerializer):
         return super().validate(attrs)
 
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.StringRelatedField(
         source="category", read_only=True, many=False
     )
     image = serializers.ImageField()
+    image_derivatives = serializers.SerializerMethodField()
 
     class Meta:
         model = MenuItem
@@ -59,11 +63,15 @@ class MenuItemSerializer(serializers.ModelSerializer):
             "category_name",
             "description",
             "image",
+            "image_derivatives",
         ]
         extra_kwargs = {
             "slug": {"read_only": True},
         }
 
+    def get_image_derivatives(self, obj):
+        return derivative_urls(obj, self.context.get("request"))
+
     def validate(self, attrs):
         if attrs["price"] < 0:
             raise serializers.ValidationError("Price cannot be negative")
@@ -73,6 +81,22 @@ class MenuItemSerializer(serializers.ModelSerializer):
         return super().validate(attrs)
 
 
+class MenuImportRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal(0)
+    )
+    category = serializers.CharField(max_length=255)
+    featured = serializers.BooleanField(default=True)
+    description = serializers.CharField(max_length=255, default="", allow_blank=True)
+
+    def validate(self, attrs):
+        attrs["name"] = bleach.clean(attrs["name"])
+        attrs["category"] = bleach.clean(attrs["category"])
+        attrs["description"] = bleach.clean(attrs["description"])
+        return super().validate(attrs)
+
+
 class CartItemSerializer(serializers.ModelSerializer):
     item_name = serializers.StringRelatedField(
         source="menuitem", read_only=True, many=False
@@ -101,6 +125,18 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ["customer", "items"]
 
 
+class CartLineSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    MODE_CHOICES = [("set", "Set"), ("increment", "Increment")]
+
+    items = CartLineSerializer(many=True, allow_empty=False)
+    mode = serializers.ChoiceField(choices=MODE_CHOICES, default="set")
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     item_name = serializers.StringRelatedField(
         source="menuitem", read_only=True, many=False
@@ -111,7 +147,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ["id", "menuitem", "item_name", "quantity", "price", "total_cost"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
@@ -125,21 +161,23 @@ class OrderSerializer(serializers.ModelSerializer):
             "discount",
             "subtotal",
             "total",
+            "version",
             "items",
         ]
+        expandable_fields = ["items"]
 
         extra_kwargs = {
             "paid": {"read_only": True},
             "created": {"read_only": True},
             "updated": {"read_only": True},
             "discount": {"read_only": True},
-            "subtotal": {"read_only": True},
-            "total": {"read_only": True},
+            "subtotal": {"read_only": True, "coerce_to_string": False},
+            "total": {"read_only": True, "coerce_to_string": False},
             "status": {"read_only": True},
         }
 
 
-class CustomOrderSerializer(serializers.ModelSerializer):
+class CustomOrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     customer = UserSerializer(read_only=True)
     delivery_crew = UserSerializer(read_only=True)
@@ -157,15 +195,87 @@ class CustomOrderSerializer(serializers.ModelSerializer):
             "discount",
             "subtotal",
             "total",
+            "version",
             "items",
         ]
+        expandable_fields = ["items", "customer", "delivery_crew"]
 
         extra_kwargs = {
             "paid": {"read_only": True},
             "created": {"read_only": True},
             "updated": {"read_only": True},
             "discount": {"read_only": True},
-            "subtotal": {"read_only": True},
-            "total": {"read_only": True},
+            "subtotal": {"read_only": True, "coerce_to_string": False},
+            "total": {"read_only": True, "coerce_to_string": False},
             "status": {"read_only": True},
         }
+
+
+class OrderAssignmentSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, required=False)
+    max_load = serializers.IntegerField(min_value=1, required=False)
+
+
+class SalesQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+
+    def validate(self, attrs):
+        if "start" in attrs and "end" in attrs and attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must be before end")
+        return super().validate(attrs)
+
+
+class OrderExportQuerySerializer(SalesQuerySerializer):
+    paid = serializers.BooleanField(required=False, allow_null=True)
+    file_format = serializers.ChoiceField(
+        choices=[("csv", "CSV"), ("jsonl", "JSON lines")], default="csv"
+    )
+
+
+class DailySalesSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    quantity = serializers.IntegerField(source="total_quantity")
+    revenue = serializers.DecimalField(
+        source="total_revenue", max_digits=14, decimal_places=2
+    )
+
+
+class MenuItemSalesSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField()
+    item_name = serializers.CharField(source="menuitem__name")
+    orders = serializers.IntegerField(source="total_orders")
+    quantity = serializers.IntegerField(source="total_quantity")
+    revenue = serializers.DecimalField(
+        source="total_revenue", max_digits=14, decimal_places=2
+    )
+
+
+class CategorySalesSerializer(serializers.Serializer):
+    category = serializers.IntegerField()
+    category_name = serializers.CharField(source="category__name")
+    orders = serializers.IntegerField(source="total_orders")
+    quantity = serializers.IntegerField(source="total_quantity")
+    revenue = serializers.DecimalField(
+        source="total_revenue", max_digits=14, decimal_places=2
+    )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "name",
+            "payload",
+            "status",
+            "attempts",
+            "max_attempts",
+            "run_at",
+            "locked_by",
+            "last_error",
+            "created",
+            "finished",
+        ]
+        read_only_fields = fields
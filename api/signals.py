@@ -0,0 +1,88 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.db.models import QuerySet
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .cache import MENU_NAMESPACE, bump_namespace
+from .images import schedule_derivatives
+from .models import Category, MenuItem, Order, OrderItem
+from .roles import invalidate_roles
+from .search import get_search_backend
+
+
+def forget_users(*user_ids):
+    invalidate_roles(*user_ids)
+    token_cache.invalidate_users(*user_ids)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        forget_users(instance.pk)
+    elif action == "pre_clear":
+        forget_users(*instance.user_set.values_list("pk", flat=True))
+    else:
+        forget_users(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    forget_users(*instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    forget_users(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # djoser's logout deletes the user's token.
+    token_cache.invalidate_keys(instance.key)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def menu_changed(sender, **kwargs):
+    bump_namespace(MENU_NAMESPACE)
+
+
+@receiver(post_save, sender=MenuItem)
+def menu_item_saved(sender, instance, using, **kwargs):
+    get_search_backend(using).index([instance.pk])
+    schedule_derivatives(instance)
+
+
+@receiver(post_delete, sender=MenuItem)
+def menu_item_deleted(sender, instance, using, **kwargs):
+    get_search_backend(using).remove([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, using, created, **kwargs):
+    if not created:
+        get_search_backend(using).index(
+            instance.menu_items.values_list("pk", flat=True)
+        )
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_changed(sender, instance, **kwargs):
+    origin = kwargs.get("origin")
+    if isinstance(origin, Order) or (
+        isinstance(origin, QuerySet) and origin.model is Order
+    ):
+        # The order itself is being deleted.
+        return
+    order = Order.objects.filter(pk=instance.order_id).first()
+    if order is not None:
+        order.update_totals()
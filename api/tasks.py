@@ -0,0 +1,39 @@
+from .analytics import record_order_created, record_status_change
+from .carts import CacheCartStore
+from .jobs import task
+from .models import Order
+
+
+@task
+def record_order_sales(order_id, status):
+    """
+    Add a checked out order to the sales rollups under the status it was
+    placed with. Status changes are recorded as moves between statuses, so
+    this commutes with any that happen before the job runs.
+    """
+    order = Order.objects.filter(pk=order_id).first()
+    if order is None:
+        return
+    record_order_created(order, list(order.items.select_related("menuitem")), status)
+
+
+@task
+def move_order_sales(order_id, old_status, new_status):
+    """
+    Move an order's sales in the rollups from ``old_status`` to
+    ``new_status``. Moves and ``record_order_sales`` only add and subtract,
+    so they may run in any order.
+    """
+    order = Order.objects.filter(pk=order_id).first()
+    if order is None:
+        return
+    record_status_change(order, old_status, new_status)
+
+
+@task
+def flush_cart(user_id):
+    """
+    Write a cache-resident cart to the Cart/CartItem tables if it changed
+    since it was last written.
+    """
+    CacheCartStore().flush(user_id)
@@ -2,6 +2,10 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 from api.models import Category, MenuItem, Cart, CartItem, Order, OrderItem
 from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 class CategoryModelTest(TestCase):
@@ -66,6 +70,30 @@ class OrderModelTest(TestCase):
         self.assertTrue(isinstance(self.order, Order))
         self.assertEqual(str(self.order), f"Order {self.order.id}")
 
+    def test_writes_move_version_on(self):
+        self.assertEqual(self.order.version, 1)
+        stale = Order.objects.get(pk=self.order.pk)
+        self.order.paid = True
+        self.order.save(update_fields=["paid"])
+        self.assertEqual(self.order.version, 2)
+
+        self.assertFalse(stale.update_if_version(stale.version, status="completed"))
+        self.assertEqual(stale.status, "pending")
+        self.assertTrue(self.order.update_if_version(2, status="completed"))
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), ("completed", 3))
+
+    def test_version_is_taken_from_the_update(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.order.save(update_fields=["paid"])
+        statements = [q["sql"].split()[0] for q in captured]
+        self.assertNotIn("SELECT", statements)
+        self.assertEqual(statements.count("UPDATE"), 1)
+        self.assertEqual(self.order.version, 2)
+        self.order.update_totals()
+        self.assertEqual(self.order.version, 3)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).version, 3)
+
 
 class OrderItemModelTest(TestCase):
     def setUp(self):
@@ -87,3 +115,65 @@ class OrderItemModelTest(TestCase):
         self.assertTrue(isinstance(self.order_item, OrderItem))
         self.assertEqual(str(self.order_item), str(self.order_item.id))
         self.assertEqual(self.order_item.total_cost, self.order_item.price * 2)
+
+
+class OrderTotalsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.category = Category.objects.create(name="Drinks")
+        self.coke = MenuItem.objects.create(
+            name="Coke", price=Decimal("2.00"), category=self.category
+        )
+        self.tea = MenuItem.objects.create(
+            name="Tea", price=Decimal("1.50"), category=self.category
+        )
+        self.order = Order.objects.create(customer=self.user, discount=10)
+        OrderItem.objects.create(order=self.order, menuitem=self.coke, quantity=2)
+        OrderItem.objects.create(order=self.order, menuitem=self.tea, quantity=4)
+
+    def test_totals_follow_items_and_discount(self):
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("10.00"))
+        self.assertEqual(self.order.get_discount(), Decimal("1.00"))
+        self.assertEqual(self.order.subtotal, Decimal("9.00"))
+
+        self.order.discount = 50
+        self.order.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.subtotal, Decimal("5.00"))
+
+        self.order.items.get(menuitem=self.tea).delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("4.00"))
+        self.assertEqual(self.order.subtotal, Decimal("2.00"))
+
+    def test_full_save_keeps_totals_of_items_added_since_load(self):
+        order = Order.objects.get(pk=self.order.pk)
+        OrderItem.objects.create(order=self.order, menuitem=self.coke, quantity=5)
+        order.discount = 20
+        order.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal("20.00"))
+        self.assertEqual(order.get_discount(), Decimal("4.00"))
+        self.assertEqual(order.subtotal, Decimal("16.00"))
+
+        order = Order.objects.get(pk=self.order.pk)
+        self.order.items.get(menuitem=self.tea).delete()
+        order.paid = True
+        order.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal("14.00"))
+        self.assertEqual(order.subtotal, Decimal("11.20"))
+
+    def test_empty_order_totals(self):
+        order = Order.objects.create(customer=self.user)
+        order = Order.objects.with_totals().get(pk=order.pk)
+        self.assertEqual(order.total, Decimal(0))
+        self.assertEqual(order.subtotal, Decimal(0))
+
+    def test_backfill_order_totals(self):
+        Order.objects.update(total=0, discount_amount=0, subtotal=0)
+        call_command("backfill_order_totals", stdout=StringIO())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("10.00"))
+        self.assertEqual(self.order.subtotal, Decimal("9.00"))
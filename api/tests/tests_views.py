@@ -1,13 +1,42 @@
-from django.test import TestCase
+from django.test import AsyncClient, TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from api.models import Category, MenuItem, Cart, CartItem, Order, OrderItem
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from api.assignment import CrewLoad, assign_pending_orders
+from api.authentication import token_cache
+from api.checks import check_shared_cache
+from api.dbrouter import PIN_COOKIE, replica_reads
+from api.events import InProcessBroker, get_broker
+from api.idempotency import IdempotentRequest
+from api.jobs import TASKS, enqueue, task
+from api.renderers import ORJSONRenderer
+from api.carts import CacheCartStore
+from api.tasks import flush_cart
+from api.throttling import TokenBucket
+from api.models import Category, MenuItem, Cart, CartItem, Order, OrderItem, Job
 from django.contrib.auth.models import User, Group
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.tokens import RefreshToken
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+import asyncio
+import json
+from base64 import urlsafe_b64encode
+import os
+import tempfile
+from unittest.mock import patch
 from PIL import Image
 from io import BytesIO
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, router
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 
 class CategoryViewSetTest(TestCase):
@@ -29,7 +58,7 @@ class CategoryViewSetTest(TestCase):
         Category.objects.create(name="Drinks")
         response = self.client.get(reverse("category-list"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
 
 
 class MenuItemViewSetTest(TestCase):
@@ -72,7 +101,451 @@ class MenuItemViewSetTest(TestCase):
         )
         response = self.client.get(reverse("menuitem-list"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_paginate_menu_items(self):
+        for i in range(5):
+            MenuItem.objects.create(
+                name=f"Item {i}", price=Decimal(i), category=self.category
+            )
+        seen = []
+        url = reverse("menuitem-list") + "?page_size=2&ordering=price"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item["name"] for item in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(seen, [f"Item {i}" for i in range(5)])
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual(
+            [item["name"] for item in response.data["results"]], ["Item 2", "Item 3"]
+        )
+
+    def test_menu_reads_are_cached_until_menu_changes(self):
+        cache.clear()
+        client = APIClient()
+        url = reverse("menuitem-list") + "?featured=true"
+        response = client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(len(response.data["results"]), 0)
+
+        MenuItem.objects.create(name="Tea", price=Decimal(1), category=self.category)
+        response = client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("menuitem-list") + "?cursor=bogus")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor(self):
+        for i in range(3):
+            MenuItem.objects.create(
+                name=f"Item {i}", price=Decimal(i), category=self.category
+            )
+
+        def cursor(position):
+            payload = json.dumps({"r": 0, "p": position}).encode("ascii")
+            return urlsafe_b64encode(payload).decode("ascii")
+
+        url = reverse("menuitem-list")
+        for position in ([{"a": 1}, 1], ["notadate", 1], [None, 1], ["2024", "x"]):
+            response = self.client.get(f"{url}?cursor={cursor(position)}")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            response = self.client.get(
+                reverse("async-menuitem-list") + f"?cursor={cursor(position)}"
+            )
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # A cursor made for the default ordering, replayed with another one.
+        response = self.client.get(url + "?page_size=1")
+        next_url = response.data["next"]
+        response = self.client.get(next_url + "&ordering=price")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_upload_renders_image_derivatives(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, MENU_IMAGE_WORKERS=0
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse("menuitem-list"), self.menu_item_data
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data["image_derivatives"], {})
+
+            response = self.client.get(
+                reverse("menuitem-detail", args=[response.data["id"]])
+            )
+            derivatives = response.data["image_derivatives"]
+            self.assertEqual(set(derivatives), {"thumb", "small", "large"})
+            self.assertTrue(derivatives["thumb"]["webp"].endswith("_thumb.webp"))
+            name = MenuItem.objects.get().image_derivatives["sizes"]["thumb"]["jpeg"]
+            with Image.open(os.path.join(media_root, name)) as thumb:
+                self.assertEqual(thumb.size, (100, 100))
+                self.assertEqual(thumb.format, "JPEG")
+
+            # Replacing the image deletes the old derivatives.
+            menu_item = MenuItem.objects.get()
+            old = os.path.join(media_root, name)
+            image_file = BytesIO()
+            Image.new("RGB", (50, 50)).save(image_file, "jpeg")
+            menu_item.image = SimpleUploadedFile("new.jpg", image_file.getvalue())
+            with self.captureOnCommitCallbacks(execute=True):
+                menu_item.save()
+            self.assertFalse(os.path.exists(old))
+            menu_item.refresh_from_db()
+            derivatives = menu_item.image_derivatives
+            self.assertEqual(derivatives["source"], menu_item.image.name)
+            new = derivatives["sizes"]["thumb"]["jpeg"]
+            self.assertTrue(os.path.exists(os.path.join(media_root, new)))
+
+    def test_search_menu_items(self):
+        MenuItem.objects.create(
+            name="Lemonade", price=Decimal(2), category=self.category
+        )
+        tea = MenuItem.objects.create(
+            name="Iced tea",
+            price=Decimal(2),
+            category=self.category,
+            description="With a slice of lemon",
+        )
+        url = reverse("menuitem-list") + "?search=lem"
+        response = self.client.get(url)
+        self.assertEqual(
+            [item["name"] for item in response.data["results"]],
+            ["Lemonade", "Iced tea"],
+        )
+
+        tea.description = "Unsweetened"
+        tea.save()
+        response = self.client.get(url)
+        self.assertEqual(
+            [item["name"] for item in response.data["results"]], ["Lemonade"]
+        )
+
+        self.category.name = "Cold drinks"
+        self.category.save()
+        response = self.client.get(reverse("menuitem-list") + "?search=cold tea")
+        self.assertEqual(
+            [item["name"] for item in response.data["results"]], ["Iced tea"]
+        )
+
+        tea.delete()
+        response = self.client.get(reverse("menuitem-list") + "?search=tea")
+        self.assertEqual(response.data["results"], [])
+
+    def test_search_cap_applies_after_filters(self):
+        desserts = Category.objects.create(name="Desserts")
+        MenuItem.objects.create(
+            name="Lemonade", price=Decimal(2), category=self.category
+        )
+        for name in ["Lemon tart", "Lemon cake"]:
+            MenuItem.objects.create(name=name, price=Decimal(3), category=desserts)
+
+        with patch("api.search.SEARCH_MAX_RESULTS", 1):
+            for name in ["menuitem-list", "async-menuitem-list"]:
+                url = reverse(name) + f"?search=lemon&category={desserts.id}"
+                response = self.client.get(url)
+                names = [item["name"] for item in response.json()["results"]]
+                self.assertEqual(len(names), 1)
+                self.assertIn(names[0], ["Lemon tart", "Lemon cake"])
+                self.assertEqual(response["X-Search-Truncated"], "true")
+                response = self.client.get(url)
+                self.assertEqual(response["X-Cache"], "HIT")
+                self.assertEqual(response["X-Search-Truncated"], "true")
+
+        url = reverse("menuitem-list") + f"?search=lemon&category={desserts.id}"
+        response = self.client.get(url + "&ordering=price")
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertNotIn("X-Search-Truncated", response)
+
+    def test_import_menu(self):
+        MenuItem.objects.create(name="Coke", price=Decimal(1), category=self.category)
+        upload = SimpleUploadedFile(
+            "menu.csv",
+            b"name,price,category,featured,description\n"
+            b"Coke,2.50,Drinks,false,\n"
+            b"Bagel,3.00,Bakery,,Toasted\n"
+            b"Broken,-1,Bakery,,\n",
+            content_type="text/csv",
+        )
+        cache.clear()
+        self.client.get(reverse("menuitem-list"))
+        response = self.client.post(reverse("menuitem-import"), {"file": upload})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["error_count"], 1)
+        self.assertEqual(response.data["errors"][0]["line"], 4)
+
+        coke = MenuItem.objects.get(name="Coke")
+        self.assertEqual(coke.price, Decimal("2.50"))
+        self.assertFalse(coke.featured)
+        bagel = MenuItem.objects.get(name="Bagel")
+        self.assertEqual(bagel.slug, "bagel")
+        self.assertEqual(bagel.category.name, "Bakery")
+        self.assertTrue(bagel.featured)
+
+        response = self.client.get(reverse("menuitem-list"))
+        self.assertEqual(response["X-Cache"], "MISS")
+        response = self.client.get(reverse("menuitem-list") + "?search=toasted")
+        self.assertEqual(
+            [item["name"] for item in response.data["results"]], ["Bagel"]
+        )
+
+    def test_import_reports_each_rejected_row_once(self):
+        Category.objects.create(name="Hot-drinks", slug="hot-drinks")
+        upload = SimpleUploadedFile(
+            "menu.jsonl",
+            b'{"name": "Tea", "price": "1.50", "category": "Drinks"}\n'
+            b'{"name": "Cocoa", "price": "2.00", "category": "Hot drinks"}\n'
+            b'{"name": "Coffee", "price": "2.50", "category": "Drinks"}\n',
+        )
+        bulk_create = MenuItem.objects.bulk_create
+
+        def fail_for_many(items, **kwargs):
+            # Make the chunk fail as a whole so rows are retried one by one.
+            if len(items) > 1:
+                raise IntegrityError("simulated conflict")
+            return bulk_create(items, **kwargs)
+
+        with patch.object(MenuItem.objects, "bulk_create", fail_for_many):
+            response = self.client.post(reverse("menuitem-import"), {"file": upload})
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["error_count"], 1)
+        [error] = response.data["errors"]
+        self.assertEqual(error["line"], 2)
+        self.assertIn("category", error["errors"])
+
+    def test_export_menu_round_trips(self):
+        MenuItem.objects.create(
+            name="Coke", price=Decimal("1.99"), category=self.category
+        )
+        response = self.client.get(
+            reverse("menuitem-export") + "?file_format=jsonl"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        body = b"".join(response.streaming_content)
+        self.assertEqual(
+            json.loads(body),
+            {
+                "name": "Coke",
+                "price": "1.99",
+                "category": "Drinks",
+                "featured": True,
+                "description": "",
+            },
+        )
+
+        MenuItem.objects.all().delete()
+        upload = SimpleUploadedFile("menu.jsonl", body)
+        response = self.client.post(reverse("menuitem-import"), {"file": upload})
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(MenuItem.objects.get().price, Decimal("1.99"))
+
+    def test_import_menu_requires_known_format(self):
+        upload = SimpleUploadedFile("menu.xlsx", b"")
+        response = self.client.post(reverse("menuitem-import"), {"file": upload})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RoleResolutionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_group = Group.objects.create(name="Managers")
+        self.user = User.objects.create_user(username="manager", password="pass")
+        self.user.groups.add(self.manager_group)
+        self.client.force_authenticate(self.user)
+
+    def test_roles_are_cached_across_requests(self):
+        self.client.get(reverse("order-list"))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("order-list"))
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse(any("auth_user_groups" in query for query in sql))
+
+    def test_group_change_invalidates_roles(self):
+        response = self.client.post(reverse("category-list"), {"name": "Drinks"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.manager_group.user_set.remove(self.user)
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        response = self.client.post(reverse("category-list"), {"name": "Food"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TokenAuthenticationTest(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="customer", password="pass")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def auth_queries(self, captured):
+        return [
+            query["sql"]
+            for query in captured
+            if "authtoken_token" in query["sql"] or "auth_group" in query["sql"]
+        ]
+
+    def test_token_is_cached_until_logout(self):
+        self.client.get(reverse("order-list"))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.auth_queries(captured), [])
+
+        response = self.client.post(reverse("logout"))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.get(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_group_change_invalidates_cached_token(self):
+        url = reverse("category-list")
+        response = self.client.post(url, {"name": "Drinks"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.user.groups.add(Group.objects.create(name="Managers"))
+        response = self.client.post(url, {"name": "Drinks"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_jwt_carries_roles(self):
+        manager = User.objects.create_user(username="manager", password="pass")
+        manager.groups.add(Group.objects.create(name="Managers"))
+        response = self.client.post(
+            reverse("jwt-create"), {"username": "manager", "password": "pass"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        with CaptureQueriesContext(connection) as captured:
+            response = client.post(reverse("category-list"), {"name": "Drinks"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(any("auth_" in query["sql"] for query in captured))
+
+        manager.is_active = False
+        manager.save()
+        response = self.client.post(
+            reverse("jwt-refresh"), {"refresh": str(RefreshToken.for_user(manager))}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class DatabaseRoutingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="customer", password="pass")
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name="Drinks")
+        self.menu_item = MenuItem.objects.create(
+            name="Coke", price=Decimal("1.99"), category=category
+        )
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_reads_go_to_replicas_until_first_write(self):
+        self.assertEqual(router.db_for_read(MenuItem), "default")
+        with replica_reads():
+            self.assertEqual(router.db_for_read(MenuItem), "replica")
+            self.assertEqual(router.db_for_read(Order), "replica")
+            self.assertEqual(router.db_for_read(Cart), "default")
+            self.assertEqual(router.db_for_write(Cart), "default")
+            # Routing a lookup as a write does not pin the request...
+            self.assertEqual(router.db_for_read(MenuItem), "replica")
+            Cart.objects.create(customer=self.user)
+            # ...sending a write does.
+            self.assertEqual(router.db_for_read(MenuItem), "default")
+        with replica_reads(enabled=False):
+            self.assertEqual(router.db_for_read(MenuItem), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_get_or_create_lookup_keeps_replica_reads(self):
+        Cart.objects.create(customer=self.user)
+        with replica_reads() as state:
+            cart, created = Cart.objects.get_or_create(customer=self.user)
+            self.assertFalse(created)
+            self.assertFalse(state.wrote)
+            self.assertEqual(router.db_for_read(MenuItem), "replica")
+
+    @override_settings(DATABASE_REPLICAS=["default"])
+    def test_write_pins_client_to_primary(self):
+        response = self.client.get(reverse("menuitem-list"))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = self.client.post(
+            reverse("cart-list"), {"menuitem": self.menu_item.pk, "quantity": 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 5)
+
+
+class ThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="customer", password="pass")
+        self.client.force_authenticate(self.user)
+
+    def test_token_bucket_refills_up_to_capacity(self):
+        bucket = TokenBucket("test", 2, 10)
+        self.assertEqual(bucket.consume(now=0).remaining, 1)
+        self.assertEqual(bucket.consume(now=0).remaining, 0)
+        limit = bucket.consume(now=0)
+        self.assertFalse(limit.allowed)
+        self.assertEqual(limit.wait, 5)
+        self.assertTrue(bucket.consume(now=5).allowed)
+        self.assertFalse(bucket.consume(now=5).allowed)
+        # An idle bucket holds at most ``capacity`` tokens.
+        self.assertEqual(bucket.consume(now=100).remaining, 1)
+        self.assertEqual(bucket.consume(now=100).remaining, 0)
+        self.assertFalse(bucket.consume(now=100).allowed)
+
+    @override_settings(
+        API_THROTTLE_RATES={
+            "default": {"customer": "2/min"},
+            "cart_write": {"customer": "1/min"},
+        }
+    )
+    def test_requests_over_the_limit_are_refused(self):
+        url = reverse("cart-list")
+        response = self.client.get(url)
+        self.assertEqual(response["RateLimit-Limit"], "2")
+        self.assertEqual(response["RateLimit-Remaining"], "1")
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "30")
+        self.assertEqual(response["RateLimit-Remaining"], "0")
+
+        # Cart writes have a budget of their own.
+        response = self.client.delete(reverse("cart-remove", args=[1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.delete(reverse("cart-remove", args=[1]))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(API_THROTTLE_RATES={"menu": {"anonymous": "1/min"}})
+    def test_anonymous_clients_are_limited_by_address(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse("menuitem-list")).status_code, 200)
+        response = client.get(reverse("async-menuitem-list"))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "60")
+        response = client.get(reverse("category-list"), REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_per_process_cache_warning(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ["api.W001"])
+        file_cache = "django.core.cache.backends.filebased.FileBasedCache"
+        with override_settings(CACHES={"default": {"BACKEND": file_cache}}):
+            [warning] = check_shared_cache(None)
+            self.assertIn("no atomic add or incr", warning.msg)
+        redis_cache = "django.core.cache.backends.redis.RedisCache"
+        with override_settings(CACHES={"default": {"BACKEND": redis_cache}}):
+            self.assertEqual(check_shared_cache(None), [])
 
 
 class CartViewSetTest(TestCase):
@@ -93,6 +566,43 @@ class CartViewSetTest(TestCase):
         self.assertEqual(CartItem.objects.count(), 1)
         self.assertEqual(CartItem.objects.get().quantity, 2)
 
+    def test_batch_update_cart(self):
+        tea = MenuItem.objects.create(
+            name="Tea", price=Decimal("1.50"), category=self.category
+        )
+        cart = Cart.objects.create(customer=self.user)
+        CartItem.objects.create(cart=cart, menuitem=self.menu_item, quantity=2)
+        payload = {
+            "mode": "increment",
+            "items": [
+                {"menuitem": self.menu_item.id, "quantity": 1},
+                {"menuitem": tea.id, "quantity": 4},
+            ],
+        }
+        lock = Cart.objects.select_for_update
+        with patch.object(Cart.objects, "select_for_update", wraps=lock) as locked:
+            response = self.client.post(
+                reverse("cart-batch"), payload, format="json"
+            )
+        # The cart is locked before its quantities are read and added to.
+        locked.assert_called_once_with()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(CartItem.objects.get(menuitem=self.menu_item).quantity, 3)
+        tea_line = CartItem.objects.get(menuitem=tea)
+        self.assertEqual(tea_line.quantity, 4)
+        self.assertEqual(tea_line.price, Decimal("6.00"))
+
+        payload = {"items": [{"menuitem": tea.id, "quantity": 0}]}
+        response = self.client.post(reverse("cart-batch"), payload, format="json")
+        self.assertEqual(len(response.data["items"]), 1)
+        self.assertFalse(CartItem.objects.filter(menuitem=tea).exists())
+
+    def test_batch_update_cart_unknown_item(self):
+        payload = {"items": [{"menuitem": 999, "quantity": 1}]}
+        response = self.client.post(reverse("cart-batch"), payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(CartItem.objects.exists())
+
     def test_list_cart_items(self):
         cart = Cart.objects.create(customer=self.user)
         CartItem.objects.create(cart=cart, menuitem=self.menu_item, quantity=2)
@@ -101,6 +611,100 @@ class CartViewSetTest(TestCase):
         self.assertEqual(len(response.data["items"]), 1)
 
 
+@override_settings(CART_BACKEND="api.carts.CacheCartStore")
+class CacheCartTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="customer", password="pass")
+        self.client.login(username="customer", password="pass")
+        self.category = Category.objects.create(name="Drinks")
+        self.coke = MenuItem.objects.create(
+            name="Coke", price=Decimal("1.99"), category=self.category
+        )
+        self.tea = MenuItem.objects.create(
+            name="Tea", price=Decimal("1.50"), category=self.category
+        )
+
+    def test_cart_writes_stay_in_cache_until_flushed(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(
+                reverse("cart-list"), {"menuitem": self.coke.id, "quantity": 2}
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data["id"], self.coke.id)
+            self.assertEqual(response.data["price"], "3.98")
+
+            payload = {
+                "mode": "increment",
+                "items": [
+                    {"menuitem": self.coke.id, "quantity": 1},
+                    {"menuitem": self.tea.id, "quantity": 4},
+                ],
+            }
+            response = self.client.post(reverse("cart-batch"), payload, format="json")
+            self.assertEqual(len(response.data["items"]), 2)
+            url = reverse("cart-remove", args=[self.tea.id])
+            response = self.client.delete(url)
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+            response = self.client.get(reverse("cart-list"))
+            self.assertEqual(response.data["customer"], self.user.id)
+            [line] = response.data["items"]
+            self.assertEqual((line["item_name"], line["quantity"]), ("Coke", 3))
+
+        writes = [
+            query["sql"]
+            for query in captured
+            if "api_cart" in query["sql"] and not query["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(writes, [])
+        self.assertFalse(CartItem.objects.exists())
+
+        # The changes were coalesced into one delayed flush.
+        job = Job.objects.get(name=flush_cart.task_name)
+        flush_cart(**job.payload)
+        cart_item = CartItem.objects.get(cart__customer=self.user)
+        self.assertEqual(cart_item.quantity, 3)
+        self.assertEqual(cart_item.price, Decimal("5.97"))
+
+    def test_checkout_places_cached_cart(self):
+        payload = {"menuitem": self.coke.id, "quantity": 2}
+        self.client.post(reverse("cart-list"), payload)
+        response = self.client.post(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Decimal(str(response.data["total"])), Decimal("3.98"))
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.client.get(reverse("cart-list"))
+        self.assertEqual(response.data["items"], [])
+        response = self.client.post(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_busy_cart_is_refused_and_foreign_lock_kept(self):
+        store = CacheCartStore()
+        lock_key = f"{store.key(self.user.pk)}:lock"
+        cache.set(lock_key, "other-request")
+        payload = {"menuitem": self.coke.id, "quantity": 2}
+        with patch("api.carts.CART_LOCK_TIMEOUT", 0):
+            response = self.client.post(reverse("cart-list"), payload)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.data["status"], "fail")
+            self.assertEqual(response["Retry-After"], "1")
+            response = self.client.post(reverse("async-cart-list"), payload)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(cache.get(lock_key), "other-request")
+        self.assertIsNone(cache.get(store.key(self.user.pk)))
+
+        # A lock that expired and was taken over is left to its new owner.
+        cache.delete(lock_key)
+        with store.locked(self.user.pk):
+            cache.set(lock_key, "other-request")
+        self.assertEqual(cache.get(lock_key), "other-request")
+
+
 class OrderViewSetTest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -121,9 +725,746 @@ class OrderViewSetTest(TestCase):
         self.assertEqual(Order.objects.count(), 1)
         self.assertEqual(OrderItem.objects.count(), 1)
 
+    def test_create_order_copies_prices_and_empties_cart(self):
+        tea = MenuItem.objects.create(
+            name="Tea", price=Decimal("1.50"), category=self.category
+        )
+        CartItem.objects.create(cart=self.cart, menuitem=tea, quantity=3)
+        response = self.client.post(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Decimal(str(response.data["total"])), Decimal("8.48"))
+        self.assertEqual(
+            sorted(OrderItem.objects.values_list("price", flat=True)),
+            [Decimal("1.50"), Decimal("1.99")],
+        )
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.client.post(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_create_order_without_cart(self):
+        self.cart.delete()
+        response = self.client.post(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_list_orders(self):
         order = Order.objects.create(customer=self.user)
         OrderItem.objects.create(order=order, menuitem=self.menu_item, quantity=2)
         response = self.client.get(reverse("order-list"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_list_orders_filtered_by_status(self):
+        Order.objects.create(customer=self.user, status="completed")
+        Order.objects.create(customer=self.user)
+        response = self.client.get(reverse("order-list") + "?status=completed")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["status"], "completed")
+
+    def test_order_orders_by_total_and_filter_range(self):
+        for quantity in (3, 1, 2):
+            order = Order.objects.create(customer=self.user)
+            OrderItem.objects.create(
+                order=order, menuitem=self.menu_item, quantity=quantity
+            )
+        response = self.client.get(reverse("order-list") + "?ordering=-total")
+        totals = [Decimal(str(o["total"])) for o in response.data["results"]]
+        self.assertEqual(totals, [Decimal("5.97"), Decimal("3.98"), Decimal("1.99")])
+
+        response = self.client.get(reverse("order-list") + "?total__gte=3")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_list_orders_query_count_is_constant(self):
+        order = Order.objects.create(customer=self.user)
+        OrderItem.objects.create(order=order, menuitem=self.menu_item, quantity=2)
+        self.client.get(reverse("order-list"))
+        with CaptureQueriesContext(connection) as one_order:
+            self.client.get(reverse("order-list"))
+
+        for _ in range(5):
+            order = Order.objects.create(customer=self.user)
+            OrderItem.objects.create(order=order, menuitem=self.menu_item, quantity=1)
+        with CaptureQueriesContext(connection) as many_orders:
+            response = self.client.get(reverse("order-list"))
+
+        self.assertEqual(len(response.data["results"]), 6)
+        self.assertEqual(len(one_order), len(many_orders))
+
+    def test_sparse_fieldsets(self):
+        order = Order.objects.create(customer=self.user)
+        item = OrderItem.objects.create(
+            order=order, menuitem=self.menu_item, quantity=2
+        )
+        url = reverse("order-list")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url + "?fields=id,total")
+        self.assertEqual(response.data["results"], [{"id": order.pk, "total": Decimal("3.98")}])
+        self.assertFalse(any("api_orderitem" in q["sql"] for q in captured))
+
+        response = self.client.get(url + "?fields=id,items")
+        self.assertEqual(response.data["results"][0]["items"], [item.pk])
+        response = self.client.get(url + "?fields=id,items&expand=items")
+        self.assertEqual(response.data["results"][0]["items"][0]["item_name"], "Coke")
+
+        manager = User.objects.create_user(username="manager")
+        manager.groups.add(Group.objects.create(name="Managers"))
+        self.client.force_authenticate(manager)
+        response = self.client.get(url + "?fields=customer")
+        self.assertEqual(response.data["results"], [{"customer": self.user.pk}])
+        response = self.client.get(url + "?fields=customer&expand=customer")
+        customer = response.data["results"][0]["customer"]
+        self.assertEqual(customer["username"], "customer")
+
+    def test_export_orders(self):
+        order = Order.objects.create(customer=self.user, paid=True)
+        OrderItem.objects.create(order=order, menuitem=self.menu_item, quantity=2)
+        Order.objects.create(customer=self.user)
+        url = reverse("order-export")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        manager = User.objects.create_user(username="manager")
+        manager.groups.add(Group.objects.create(name="Managers"))
+        self.client.force_authenticate(manager)
+        response = self.client.get(url + "?file_format=jsonl&paid=true")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record["id"], order.pk)
+        self.assertEqual(record["total"], "3.98")
+        self.assertEqual(
+            record["items"],
+            [
+                {
+                    "menuitem": self.menu_item.pk,
+                    "name": "Coke",
+                    "quantity": 2,
+                    "price": "1.99",
+                    "line_total": "3.98",
+                }
+            ],
+        )
+
+        response = self.client.get(url)
+        rows = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(rows[0].startswith("order_id,created,status"))
+
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        response = self.client.get(url + f"?start={tomorrow}")
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+        response = self.client.get(url + "?file_format=xml")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_orjson_renderer_matches_json_renderer(self):
+        order = Order.objects.create(customer=self.user, discount=5)
+        OrderItem.objects.create(order=order, menuitem=self.menu_item, quantity=2)
+        response = self.client.get(reverse("order-list"))
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        data = {**response.data, "note": "line\u2028separator"}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+        # Raw values, as views that skip serializers return them.
+        created = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        data = {
+            "created": created,
+            "local": created.replace(tzinfo=None),
+            "day": created.date(),
+            "at": created.time(),
+            "total": Decimal("12.50"),
+        }
+        rendered = ORJSONRenderer().render(data)
+        self.assertEqual(rendered, JSONRenderer().render(data))
+        self.assertEqual(
+            json.loads(rendered),
+            {
+                "created": "2024-05-01T12:30:15.123456Z",
+                "local": "2024-05-01T12:30:15.123456",
+                "day": "2024-05-01",
+                "at": "12:30:15.123456",
+                "total": 12.5,
+            },
+        )
+        # The one known difference: exponents of very large or small floats.
+        self.assertEqual(ORJSONRenderer().render({"n": 1e16}), b'{"n":1e16}')
+        self.assertEqual(JSONRenderer().render({"n": 1e16}), b'{"n":1e+16}')
+
+
+class IdempotencyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="customer", password="pass")
+        self.client.login(username="customer", password="pass")
+        self.menu_item = MenuItem.objects.create(
+            name="Coke", price=Decimal("1.99"), category=Category.objects.create()
+        )
+        self.cart = Cart.objects.create(customer=self.user)
+        CartItem.objects.create(cart=self.cart, menuitem=self.menu_item, quantity=2)
+
+    def test_checkout_retry_replays_response(self):
+        headers = {"HTTP_IDEMPOTENCY_KEY": "checkout-1"}
+        first = self.client.post(reverse("order-list"), **headers)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as captured:
+            retry = self.client.post(reverse("order-list"), **headers)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.data, first.data)
+        self.assertFalse([q for q in captured if "api_order" in q["sql"]])
+        self.assertEqual(Order.objects.count(), 1)
+
+        # Without a key, or with a new one, checkout runs again.
+        response = self.client.post(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_concurrent_checkout_on_sqlite_conflicts(self):
+        # The second of two simultaneous checkouts cannot get SQLite's write
+        # lock while the first holds it.
+        locked = OperationalError("database is locked")
+        headers = {"HTTP_IDEMPOTENCY_KEY": "checkout-2"}
+        with patch.object(OrderItem.objects, "bulk_create", side_effect=locked):
+            response = self.client.post(reverse("order-list"), **headers)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["status"], "fail")
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(self.cart.items.exists())
+
+        # The conflict is not stored, so the retry places the order once.
+        response = self.client.post(reverse("order-list"), **headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse("order-list"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_different_request(self):
+        url = reverse("cart-list")
+        headers = {"HTTP_IDEMPOTENCY_KEY": "cart-1"}
+        payload = {"menuitem": self.menu_item.id, "quantity": 3}
+        response = self.client.post(url, payload, format="json", **headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        payload["quantity"] = 5
+        response = self.client.post(url, payload, format="json", **headers)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(CartItem.objects.get().quantity, 3)
+
+    def test_retry_waits_for_request_in_flight(self):
+        url = reverse("cart-list")
+        payload = {"menuitem": self.menu_item.id, "quantity": 3}
+        request = SimpleNamespace(method="POST", path=url, user=self.user, data=payload)
+        in_flight = IdempotentRequest(request, "cart-2")
+        self.assertTrue(in_flight.acquire())
+        headers = {"HTTP_IDEMPOTENCY_KEY": "cart-2"}
+
+        with patch("api.idempotency.WAIT_TIMEOUT", 0):
+            response = self.client.post(url, payload, format="json", **headers)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        # The first request finishes while the retry waits.
+        finished = Response({"id": 1}, status=status.HTTP_201_CREATED)
+        with patch("api.idempotency.time.sleep") as sleep:
+            sleep.side_effect = lambda delay: in_flight.store(finished)
+            response = self.client.post(url, payload, format="json", **headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"id": 1})
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+    def test_release_keeps_lock_taken_over_after_expiry(self):
+        url = reverse("cart-list")
+        request = SimpleNamespace(method="POST", path=url, user=self.user, data={})
+        first = IdempotentRequest(request, "cart-3")
+        second = IdempotentRequest(request, "cart-3")
+        self.assertTrue(first.acquire())
+        cache.delete(first.lock_key)  # The first request's lock expires.
+        self.assertTrue(second.acquire())
+        first.release()
+        self.assertFalse(IdempotentRequest(request, "cart-3").acquire())
+        second.release()
+        self.assertTrue(IdempotentRequest(request, "cart-3").acquire())
+
+
+class OrderConcurrencyTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username="manager")
+        self.manager.groups.add(Group.objects.create(name="Managers"))
+        self.client.force_authenticate(self.manager)
+        self.crew = User.objects.create_user(username="crew")
+        self.crew.groups.add(Group.objects.create(name="Crew"))
+        self.order = Order.objects.create(customer=self.manager)
+        self.url = reverse("order-detail", args=[self.order.id])
+
+    def test_if_match_guards_partial_update(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(etag, '"1"')
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.patch(
+                self.url, {"delivery_crew": self.crew.id}, HTTP_IF_MATCH=etag
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["ETag"], '"2"')
+        updates = [q["sql"] for q in captured if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"delivery_crew_id"', updates[0])
+        self.assertNotIn('"status"', updates[0])
+
+        # The ETag the client read is stale now.
+        response = self.client.patch(
+            self.url, {"status": "completed"}, HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response["ETag"], '"2"')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "pending")
+
+    def test_lost_race_is_retried_without_if_match(self):
+        update_if_version = Order.update_if_version
+
+        def race(order, version, **changes):
+            if version == 1:
+                # Another request assigns crew between our read and write.
+                Order.objects.filter(pk=order.pk).update(
+                    delivery_crew=self.crew, version=2
+                )
+            return update_if_version(order, version, **changes)
+
+        with patch.object(Order, "update_if_version", autospec=True) as update:
+            update.side_effect = race
+            response = self.client.patch(self.url, {"status": "completed"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(update.call_count, 2)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "completed")
+        self.assertEqual(self.order.delivery_crew, self.crew)
+        self.assertEqual(self.order.version, 3)
+
+
+class OrderAssignmentTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        manager = User.objects.create_user(username="manager")
+        manager.groups.add(Group.objects.create(name="Managers"))
+        self.client.force_authenticate(manager)
+        crew_group = Group.objects.create(name="Crew")
+        self.crew = []
+        for index in range(3):
+            member = User.objects.create_user(username=f"crew{index}")
+            member.groups.add(crew_group)
+            self.crew.append(member)
+        self.customer = User.objects.create_user(username="customer")
+
+    def test_assigns_pending_orders_to_least_loaded_crew(self):
+        busy = self.crew[0]
+        for _ in range(2):
+            Order.objects.create(customer=self.customer, delivery_crew=busy)
+        orders = [Order.objects.create(customer=self.customer) for _ in range(4)]
+        done = Order.objects.create(customer=self.customer, status="completed")
+
+        response = self.client.post(reverse("order-assign"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["assigned"], 4)
+        loads = {crew["id"]: crew["open_orders"] for crew in response.data["crew"]}
+        self.assertEqual(loads, {member.pk: 2 for member in self.crew})
+        self.assertFalse(
+            Order.objects.filter(pk__in=[o.pk for o in orders], delivery_crew=busy)
+        )
+        done.refresh_from_db()
+        self.assertIsNone(done.delivery_crew)
+
+        response = self.client.post(reverse("order-assign"))
+        self.assertEqual(response.data["assigned"], 0)
+
+    def test_respects_limit_and_max_load(self):
+        for _ in range(10):
+            Order.objects.create(customer=self.customer)
+        response = self.client.post(reverse("order-assign"), {"limit": 2})
+        self.assertEqual(response.data["assigned"], 2)
+        response = self.client.post(reverse("order-assign"), {"max_load": 2})
+        self.assertEqual(response.data["assigned"], 4)
+        self.assertEqual(Order.objects.filter(delivery_crew=None).count(), 4)
+
+    def test_order_taken_by_a_concurrent_run_is_not_reassigned(self):
+        order = Order.objects.create(customer=self.customer)
+        original_load = CrewLoad.load
+
+        def load_while_another_run_assigns(*args, **kwargs):
+            Order.objects.filter(pk=order.pk).update(delivery_crew=self.crew[2])
+            return original_load(*args, **kwargs)
+
+        with patch.object(CrewLoad, "load", load_while_another_run_assigns):
+            report = assign_pending_orders()
+        self.assertEqual(report["assigned"], 0)
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_crew, self.crew[2])
+
+    def test_order_taken_for_the_same_crew_is_counted_once(self):
+        order = Order.objects.create(customer=self.customer)
+        original_take = CrewLoad.take
+
+        def take_as_another_run_assigns(loads):
+            # The other run planned the same crew member and wrote first.
+            crew_id = original_take(loads)
+            Order.objects.filter(pk=order.pk).update(delivery_crew=crew_id)
+            return crew_id
+
+        with patch.object(CrewLoad, "take", take_as_another_run_assigns):
+            report = assign_pending_orders()
+        self.assertEqual(report["assigned"], 0)
+
+    def test_customers_cannot_assign(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(reverse("order-assign"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderEventsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username="manager")
+        self.manager.groups.add(Group.objects.create(name="Managers"))
+        self.crew = User.objects.create_user(username="crew")
+        self.crew.groups.add(Group.objects.create(name="Crew"))
+        self.customer = User.objects.create_user(username="customer")
+        self.order = Order.objects.create(customer=self.customer)
+
+    def test_broker_delivers_to_subscribed_channels(self):
+        async def exchange():
+            broker = InProcessBroker()
+            subscription = broker.subscribe(["user:1"])
+            broker.publish("user:2", "other")
+            broker.publish("user:1", "mine")
+            self.assertEqual(await subscription.get(1), "mine")
+            self.assertIsNone(await subscription.get(0.01))
+            subscription.close()
+            self.assertEqual(broker.channels, {})
+
+        asyncio.run(exchange())
+
+    def test_partial_update_publishes_after_commit(self):
+        self.client.force_authenticate(self.manager)
+        url = reverse("order-detail", args=[self.order.id])
+        with patch("api.events.get_broker") as get_broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(url, {"delivery_crew": self.crew.id})
+            publish = get_broker.return_value.publish
+            channels = {call.args[0] for call in publish.call_args_list}
+            expected = {f"user:{self.customer.id}", f"user:{self.crew.id}"}
+            self.assertEqual(channels, {"managers", *expected})
+            message = json.loads(publish.call_args.args[1])
+            self.assertEqual(message["order"], self.order.id)
+            self.assertEqual(message["delivery_crew"], self.crew.id)
+
+            publish.reset_mock()
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.patch(url, {"status": "completed"})
+            publish.assert_not_called()
+            callbacks[0]()
+            message = json.loads(publish.call_args.args[1])
+            self.assertEqual(message["status"], "completed")
+
+    def test_stream_hides_other_customers_orders(self):
+        other = User.objects.create_user(username="other")
+        self.client.force_login(other)
+        url = reverse("async-order-events")
+        response = self.client.get(url + f"?order={self.order.id}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(url + "?order=abc")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_stream_sends_snapshot_and_changes(self):
+        client = AsyncClient()
+        await client.aforce_login(self.customer)
+        url = reverse("async-order-events") + f"?order={self.order.id}"
+        response = await client.get(url)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+        snapshot = await anext(stream)
+        self.assertIn(b'"status": "pending"', snapshot)
+
+        get_broker().publish(
+            f"user:{self.customer.id}",
+            json.dumps({"order": self.order.id, "status": "completed"}),
+        )
+        frame = await anext(stream)
+        self.assertTrue(frame.startswith(b"event: order\ndata: "))
+        self.assertIn(b'"status": "completed"', frame)
+        # A client disconnecting cancels the response while it waits.
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(get_broker().channels, {})
+
+
+class SalesAnalyticsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username="customer", password="pass")
+        self.manager = User.objects.create_user(username="manager", password="pass")
+        self.manager.groups.add(Group.objects.create(name="Managers"))
+        self.category = Category.objects.create(name="Drinks")
+        self.coke = MenuItem.objects.create(
+            name="Coke", price=Decimal("2.00"), category=self.category
+        )
+        self.tea = MenuItem.objects.create(
+            name="Tea", price=Decimal("1.00"), category=self.category
+        )
+        cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.create(cart=cart, menuitem=self.coke, quantity=2)
+        CartItem.objects.create(cart=cart, menuitem=self.tea, quantity=1)
+        self.client.force_authenticate(self.customer)
+        self.order_id = self.client.post(reverse("order-list")).data["id"]
+        call_command("run_jobs", "--once", "--concurrency", "1", stdout=StringIO())
+        self.client.force_authenticate(self.manager)
+
+    def test_rollups_follow_checkout_and_status(self):
+        response = self.client.get(reverse("sales-categories"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["orders"], 1)
+        self.assertEqual(response.data[0]["quantity"], 3)
+        self.assertEqual(response.data[0]["revenue"], "5.00")
+
+        with CaptureQueriesContext(connection) as captured:
+            self.client.patch(
+                reverse("order-detail", args=[self.order_id]), {"status": "canceled"}
+            )
+        # The move between statuses is left to a job.
+        self.assertFalse([q for q in captured if "api_daily" in q["sql"]])
+        response = self.client.get(reverse("sales-menu-items"))
+        self.assertEqual(len(response.data), 2)
+        call_command("run_jobs", "--once", "--concurrency", "1", stdout=StringIO())
+        response = self.client.get(reverse("sales-menu-items"))
+        self.assertEqual(response.data, [])
+        response = self.client.get(reverse("sales-list") + "?status=canceled")
+        self.assertEqual(response.data[0]["revenue"], "5.00")
+
+    def test_rebuild_matches_incremental_rollups(self):
+        before = self.client.get(reverse("sales-menu-items")).data
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        after = self.client.get(reverse("sales-menu-items")).data
+        self.assertEqual(before, after)
+        self.assertEqual([row["item_name"] for row in after], ["Coke", "Tea"])
+
+    def checkout(self, discount=0):
+        # Checkout empties the customer's cart but keeps it.
+        cart = Cart.objects.get(customer=self.customer)
+        CartItem.objects.create(cart=cart, menuitem=self.coke, quantity=2)
+        CartItem.objects.create(cart=cart, menuitem=self.tea, quantity=1)
+        self.client.force_authenticate(self.customer)
+        order = Order.objects.get(pk=self.client.post(reverse("order-list")).data["id"])
+        self.client.force_authenticate(self.manager)
+        order.discount = discount
+        order.save(update_fields=["discount"])
+
+    def test_revenue_is_net_of_discount(self):
+        self.checkout(discount=10)
+        call_command("run_jobs", "--once", "--concurrency", "1", stdout=StringIO())
+        before = self.client.get(reverse("sales-menu-items")).data
+        # 10% off 5.00 is shared 4:1 between the coke and the tea.
+        self.assertEqual([row["revenue"] for row in before], ["7.60", "1.90"])
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        self.assertEqual(self.client.get(reverse("sales-menu-items")).data, before)
+
+    def test_rebuild_skips_queued_sales_jobs(self):
+        self.checkout()
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
+        call_command("run_jobs", "--once", "--concurrency", "1", stdout=StringIO())
+        response = self.client.get(reverse("sales-categories"))
+        self.assertEqual(response.data[0]["orders"], 2)
+        self.assertEqual(response.data[0]["revenue"], "10.00")
+
+    def test_analytics_is_manager_only(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(reverse("sales-list"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="admin", password="pass")
+        self.client.force_authenticate(self.admin)
+        self.calls = []
+
+        @task(name="test.flaky")
+        def flaky(fail_times):
+            self.calls.append(len(self.calls))
+            if len(self.calls) <= fail_times:
+                raise ValueError("boom")
+
+        self.addCleanup(TASKS.pop, "test.flaky")
+
+    def run_jobs(self):
+        call_command("run_jobs", "--once", "--concurrency", "1", stdout=StringIO())
+
+    def test_job_retries_with_backoff_then_succeeds(self):
+        job = enqueue("test.flaky", {"fail_times": 1})
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("ValueError: boom", job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+
+        # Not due yet.
+        self.run_jobs()
+        self.assertEqual(len(self.calls), 1)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_failed_job_status_and_retry_endpoints(self):
+        job = enqueue("test.flaky", {"fail_times": 1}, max_attempts=1)
+        self.run_jobs()
+        response = self.client.get(reverse("job-list") + "?status=failed")
+        self.assertEqual([row["id"] for row in response.data["results"]], [job.pk])
+        response = self.client.get(reverse("job-summary"))
+        self.assertEqual(response.data["counts"]["failed"], 1)
+
+        response = self.client.post(reverse("job-retry", args=[job.pk]))
+        self.assertEqual(response.data["status"], Job.QUEUED)
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        response = self.client.post(reverse("job-retry", args=[job.pk]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(User.objects.create_user(username="bob"))
+        response = self.client.get(reverse("job-list"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_seed_and_benchmark(self):
+        call_command(
+            "seed_data",
+            categories=2,
+            menu_items=5,
+            customers=3,
+            crew=2,
+            carts=2,
+            orders=10,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Order.objects.count(), 10)
+        self.assertEqual(OrderItem.objects.count(), 30)
+
+        output = os.path.join(tempfile.mkdtemp(), "bench.json")
+        call_command(
+            "benchmark", iterations=2, warmup=0, output=output, stdout=StringIO()
+        )
+        with open(output) as report:
+            results = json.load(report)["results"]
+        self.assertIn("order-list-manager", results)
+        for name, result in results.items():
+            self.assertTrue(all(code < 400 for code in result["status"]), name)
+            self.assertIn("p95_ms", result)
+
+    def test_benchmark_serialization(self):
+        call_command("seed_data", customers=2, crew=1, orders=5, stdout=StringIO())
+        stdout = StringIO()
+        output = os.path.join(tempfile.mkdtemp(), "serialization.json")
+        call_command(
+            "benchmark_serialization",
+            orders=5,
+            iterations=1,
+            output=output,
+            stdout=stdout,
+        )
+        self.assertIn("orjson speedup (sparse)", stdout.getvalue())
+        with open(output) as report:
+            report = json.load(report)
+        self.assertEqual(report["orders"], 5)
+        results = report["results"]
+        for mode in ("full", "sparse"):
+            self.assertIn(f"load+serialize {mode}", results)
+            # Both renderers produce the same bytes.
+            self.assertEqual(
+                results[f"render {mode} json"]["bytes"],
+                results[f"render {mode} orjson"]["bytes"],
+            )
+        self.assertLess(
+            results["render sparse orjson"]["bytes"],
+            results["render full orjson"]["bytes"],
+        )
+
+
+class ServerTimingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="customer", password="pass")
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("cart-list"))
+        metrics = [part.split(";")[0] for part in response["Server-Timing"].split(", ")]
+        self.assertEqual(metrics, ["db", "ser", "render", "total"])
+
+    @override_settings(SERVER_TIMING_SLOW_REQUEST_MS=0)
+    def test_slow_request_logs_slowest_queries(self):
+        with self.assertLogs("api.timing", level="WARNING") as logs:
+            self.client.get(reverse("cart-list"))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(record["slow"])
+        self.assertGreater(record["queries"], 0)
+        self.assertTrue(record["slowest_queries"])
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="customer", password="pass")
+        self.category = Category.objects.create(name="Drinks")
+        self.menu_item = MenuItem.objects.create(
+            name="Coke", price=Decimal("1.99"), category=self.category
+        )
+
+    def test_menu_items_match_sync_view(self):
+        cache.clear()
+        sync = self.client.get(reverse("menuitem-list") + "?featured=true")
+        response = self.client.get(reverse("async-menuitem-list") + "?featured=true")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"], sync.json()["results"])
+
+        response = self.client.get(
+            reverse("async-menuitem-detail", args=[self.menu_item.id])
+        )
+        self.assertEqual(response.json()["name"], "Coke")
+        response = self.client.get(reverse("async-menuitem-detail", args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cart_requires_authentication(self):
+        response = self.client.get(reverse("async-cart-list"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_cart_add_list_remove_with_token(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        response = self.client.post(
+            reverse("async-cart-list"),
+            {"menuitem": self.menu_item.id, "quantity": 2},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["price"], "3.98")
+
+        response = self.client.get(reverse("async-cart-list"))
+        items = response.json()["items"]
+        self.assertEqual(len(items), 1)
+
+        url = reverse("async-cart-remove", args=[items[0]["id"]])
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(CartItem.objects.exists())
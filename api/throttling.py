@@ -0,0 +1,193 @@
+"""
+Token-bucket rate limits per endpoint scope and role.
+
+Every client (the user, or the IP address when anonymous) gets a bucket per
+scope in the default cache. Limits only hold across worker processes when
+that cache is shared by them (Redis); with the per-process ``LocMemCache``
+each process keeps its own buckets, which ``api.W001`` warns about. A rate
+like ``"60/min"`` in ``API_THROTTLE_RATES[scope][role]`` is a bucket of 60
+tokens that refills at 60 per minute: short bursts are fine, a sustained
+flood is not. Roles missing from a scope use the ``default`` scope's rate.
+
+Views pick their scope with ``throttle_scope``, or per action with
+``throttle_scopes``.
+"""
+
+import math
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .roles import get_roles
+
+DEFAULT_SCOPE = "default"
+DURATIONS = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+
+RateLimit = namedtuple(
+    "RateLimit", ["allowed", "limit", "remaining", "reset", "wait"]
+)
+
+
+def parse_rate(rate):
+    """
+    ``"60/min"`` -> ``(60, 60)``: bucket size and the seconds to refill it.
+    """
+    num, period = rate.split("/")
+    return int(num), DURATIONS[period[0]]
+
+
+def get_rate(scope, role):
+    rates = getattr(settings, "API_THROTTLE_RATES", {})
+    rate = rates.get(scope, {}).get(role) or rates.get(DEFAULT_SCOPE, {}).get(role)
+    return parse_rate(rate) if rate else None
+
+
+def role_name(roles):
+    if roles.is_manager:
+        return "manager"
+    if roles.is_crew:
+        return "crew"
+    if roles.is_authenticated:
+        return "customer"
+    return "anonymous"
+
+
+class TokenBucket:
+    """
+    A bucket stored as two cache keys: when it was last full (``start``) and
+    the tokens taken since (``used``). ``used`` only changes through cache
+    increments, which Redis makes atomic, so concurrent requests in
+    different processes cannot take the same token.
+    """
+
+    def __init__(self, key, capacity, duration):
+        self.start_key = f"{key}:start"
+        self.used_key = f"{key}:used"
+        self.capacity = capacity
+        self.rate = capacity / duration
+        # An idle bucket is full again after ``duration``; then it can go.
+        self.timeout = math.ceil(duration) + 1
+
+    def consume(self, now=None):
+        now = time.time() if now is None else now
+        start = cache.get(self.start_key)
+        if start is None:
+            if cache.add(self.start_key, now, self.timeout):
+                cache.set(self.used_key, 0, self.timeout)
+            start = cache.get(self.start_key, now)
+        try:
+            used = cache.incr(self.used_key)
+        except ValueError:
+            cache.add(self.used_key, 0, self.timeout)
+            used = cache.incr(self.used_key)
+        cache.touch(self.start_key, self.timeout)
+        cache.touch(self.used_key, self.timeout)
+
+        limit, start = self.settle(now, start, used)
+        if start is not None:
+            cache.set(self.start_key, start, self.timeout)
+        if not limit.allowed:
+            # Refused requests do not use up a token.
+            try:
+                cache.decr(self.used_key)
+            except ValueError:
+                pass
+        return limit
+
+    async def aconsume(self, now=None):
+        now = time.time() if now is None else now
+        start = await cache.aget(self.start_key)
+        if start is None:
+            if await cache.aadd(self.start_key, now, self.timeout):
+                await cache.aset(self.used_key, 0, self.timeout)
+            start = await cache.aget(self.start_key, now)
+        try:
+            used = await cache.aincr(self.used_key)
+        except ValueError:
+            await cache.aadd(self.used_key, 0, self.timeout)
+            used = await cache.aincr(self.used_key)
+        await cache.atouch(self.start_key, self.timeout)
+        await cache.atouch(self.used_key, self.timeout)
+
+        limit, start = self.settle(now, start, used)
+        if start is not None:
+            await cache.aset(self.start_key, start, self.timeout)
+        if not limit.allowed:
+            try:
+                await cache.adecr(self.used_key)
+            except ValueError:
+                pass
+        return limit
+
+    def settle(self, now, start, used):
+        """
+        Return the outcome of taking token number ``used``, and a new
+        ``start`` if the bucket overflowed while idle (else None).
+        """
+        new_start = None
+        allowance = self.capacity + (now - start) * self.rate
+        if allowance - (used - 1) > self.capacity:
+            # Tokens beyond the bucket size are lost.
+            new_start = now - (used - 1) / self.rate
+            allowance = self.capacity + used - 1
+        remaining = allowance - used
+        if remaining < 0:
+            limit = RateLimit(False, self.capacity, 0, 0, -remaining / self.rate)
+        else:
+            reset = (self.capacity - remaining) / self.rate
+            limit = RateLimit(True, self.capacity, int(remaining), reset, 0)
+        return limit, new_start
+
+
+def rate_limit_headers(limit):
+    headers = {
+        "RateLimit-Limit": str(limit.limit),
+        "RateLimit-Remaining": str(limit.remaining),
+        "RateLimit-Reset": str(math.ceil(limit.reset)),
+    }
+    if not limit.allowed:
+        headers["Retry-After"] = str(math.ceil(limit.wait))
+    return headers
+
+
+def get_bucket(scope, roles, ident):
+    """
+    The bucket for a client in ``scope``, or None if it is not limited.
+    """
+    rate = get_rate(scope, role_name(roles))
+    if rate is None:
+        return None
+    return TokenBucket(f"api:throttle:{scope}:{ident}", *rate)
+
+
+class RoleRateThrottle(BaseThrottle):
+    """
+    Token-bucket throttle keyed by user (or IP address) and scope, with the
+    rate chosen by role. Adds ``RateLimit-*`` headers to the response.
+    """
+
+    def get_scope(self, view):
+        scopes = getattr(view, "throttle_scopes", {})
+        scope = scopes.get(getattr(view, "action", None))
+        return scope or getattr(view, "throttle_scope", None) or DEFAULT_SCOPE
+
+    def get_client(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        bucket = get_bucket(
+            self.get_scope(view), get_roles(request.user), self.get_client(request)
+        )
+        if bucket is None:
+            return True
+        self.limit = bucket.consume()
+        view.headers.update(rate_limit_headers(self.limit))
+        return self.limit.allowed
+
+    def wait(self):
+        return self.limit.wait
@@ -0,0 +1,130 @@
+import heapq
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from rest_framework import serializers
+
+_current_timer = ContextVar("api_request_timer", default=None)
+
+
+class RequestTimer:
+    """
+    Accumulates where the time of a single request goes.
+    """
+
+    def __init__(self, keep_queries=5):
+        self.keep_queries = keep_queries
+        self.query_count = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.slowest_queries = []
+        self._serializer_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.query_count += 1
+            self.db_time += duration
+            entry = (duration, self.query_count, sql)
+            if len(self.slowest_queries) < self.keep_queries:
+                heapq.heappush(self.slowest_queries, entry)
+            else:
+                heapq.heappushpop(self.slowest_queries, entry)
+
+    @contextmanager
+    def serializing(self):
+        # Only the outermost serializer counts; nested ones run inside it.
+        self._serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._serializer_depth -= 1
+            if not self._serializer_depth:
+                self.serializer_time += time.perf_counter() - start
+
+    def slowest(self):
+        return [
+            {"ms": round(duration * 1000, 3), "sql": sql}
+            for duration, order, sql in sorted(self.slowest_queries, reverse=True)
+        ]
+
+    def server_timing(self):
+        metrics = [
+            ("db", self.db_time, f"{self.query_count} queries"),
+            ("ser", self.serializer_time, "serializers"),
+            ("render", self.render_time, "rendering"),
+            ("total", self.total_time, None),
+        ]
+        parts = []
+        for name, seconds, description in metrics:
+            part = f"{name};dur={seconds * 1000:.2f}"
+            if description:
+                part += f';desc="{description}"'
+            parts.append(part)
+        return ", ".join(parts)
+
+    def as_dict(self):
+        return {
+            "queries": self.query_count,
+            "db_ms": round(self.db_time * 1000, 3),
+            "serializer_ms": round(self.serializer_time * 1000, 3),
+            "render_ms": round(self.render_time * 1000, 3),
+            "total_ms": round(self.total_time * 1000, 3),
+        }
+
+
+def get_current_timer():
+    return _current_timer.get()
+
+
+def record_query(execute, sql, params, many, context):
+    timer = get_current_timer()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer.record_query(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver. The wrapper reads the timer from a
+    context variable, so it also sees queries that async views run through
+    ``sync_to_async`` on another thread.
+    """
+    if record_query not in connection.execute_wrappers:
+        # Insert first: execute_wrapper() context managers pop from the end.
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def activate(timer):
+    return _current_timer.set(timer)
+
+
+def deactivate(token):
+    _current_timer.reset(token)
+
+
+def instrument_serializers():
+    """
+    Time ``Serializer.data`` for the request timer. Serializer and
+    ListSerializer both build their output through BaseSerializer.data.
+    """
+    base_data = serializers.BaseSerializer.data
+    if getattr(base_data.fget, "_api_timed", False):
+        return
+
+    def data(self):
+        timer = get_current_timer()
+        if timer is None:
+            return base_data.fget(self)
+        with timer.serializing():
+            return base_data.fget(self)
+
+    data._api_timed = True
+    serializers.BaseSerializer.data = property(data)
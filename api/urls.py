@@ -7,8 +7,11 @@ from .views import (
     CategoryViewSet,
     ManagerViewSet,
     DeliveryCrewViewSet,
+    CacheStatsViewSet,
+    SalesAnalyticsViewSet,
+    JobViewSet,
 )
-from rest_framework.routers import DefaultRouter
+from . import async_views
 
 router = DefaultRouter()
 
@@ -17,12 +20,38 @@ router.register(r"menu-items", MenuItemViewSet, basename="menuitem")
 router.register(r"orders", OrderViewSet, basename="order")
 router.register(r"managers", ManagerViewSet, basename="manager")
 router.register(r"delivery_crew", DeliveryCrewViewSet, basename="delivery-crew")
+router.register(r"cache-stats", CacheStatsViewSet, basename="cache-stats")
+router.register(r"analytics/sales", SalesAnalyticsViewSet, basename="sales")
+router.register(r"jobs", JobViewSet, basename="job")
 
 cart_list = CartViewSet.as_view({"get": "list", "post": "add_to_cart"})
 cart_remove = CartViewSet.as_view({"delete": "remove_from_cart"})
+cart_batch = CartViewSet.as_view({"post": "batch"})
 
 urlpatterns = [
     path("", include(router.urls)),
     path("cart/", cart_list, name="cart-list"),
+    path("cart/batch/", cart_batch, name="cart-batch"),
     path("cart/<int:pk>/", cart_remove, name="cart-remove"),
+    path(
+        "async/menu-items/",
+        async_views.menu_item_list,
+        name="async-menuitem-list",
+    ),
+    path(
+        "async/menu-items/<int:pk>/",
+        async_views.menu_item_detail,
+        name="async-menuitem-detail",
+    ),
+    path("async/cart/", async_views.cart, name="async-cart-list"),
+    path(
+        "async/cart/<int:pk>/",
+        async_views.cart_item_remove,
+        name="async-cart-remove",
+    ),
+    path(
+        "async/orders/events/",
+        async_views.order_events,
+        name="async-order-events",
+    ),
 ]
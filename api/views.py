@@ -1,6 +1,15 @@
 from django.shortcuts import render
 from rest_framework.response import Response
-from .models import MenuItem, Cart, CartItem, Order, OrderItem, Category
+from .models import (
+    MenuItem,
+    Cart,
+    Order,
+    OrderItem,
+    Category,
+    DailyMenuItemSales,
+    DailyCategorySales,
+    Job,
+)
 from .serializers import (
     CategorySerializer,
     MenuItemSerializer,
@@ -10,24 +19,65 @@ from .serializers import (
     OrderSerializer,
     UserSerializer,
     CustomOrderSerializer,
+    CartBatchSerializer,
+    SalesQuerySerializer,
+    OrderExportQuerySerializer,
+    OrderAssignmentSerializer,
+    DailySalesSerializer,
+    MenuItemSalesSerializer,
+    CategorySalesSerializer,
+    JobSerializer,
 )
 from rest_framework import viewsets, status, filters
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import (
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
     IsAdminUser,
 )
 from django.shortcuts import get_object_or_404
-from .permissions import IsManager, IsDeliveryCrew
+from django.http import Http404, StreamingHttpResponse
+from django.db import OperationalError, transaction
+from django.db.models import Count, Min, Prefetch, Sum
+from .permissions import IsManager, IsDeliveryCrew, IsManagerUser
+from .jobs import enqueue, retry_job
+from .tasks import move_order_sales, record_order_sales
+from .roles import get_roles
+from .cache import CachedReadMixin, MENU_NAMESPACE, get_cache_stats
+from .pagination import (
+    CategoryPagination,
+    JobPagination,
+    MenuItemPagination,
+    OrderPagination,
+)
+from .search import SEARCH_TRUNCATED_HEADER, MenuItemSearchFilter
+from .assignment import assign_pending_orders
+from .fieldsets import field_selection, load_only
+from .order_export import export_orders
+from .events import publish_order_change
+from .idempotency import idempotent
+from .carts import get_cart_store
+from .preconditions import if_match, matches, precondition_failed, version_etag
+from .menu_io import (
+    CONTENT_TYPES,
+    FORMATS,
+    MenuImport,
+    export_rows,
+    guess_format,
+    read_rows,
+)
 from django.contrib.auth.models import User, Group
-from django.db.models import Q
 from django_filters.rest_framework import DjangoFilterBackend
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedReadMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsManager]
+    pagination_class = CategoryPagination
+    cache_namespace = MENU_NAMESPACE
+    throttle_scope = "menu"
     filter_backends = [
         DjangoFilterBackend,
         filters.SearchFilter,
@@ -35,45 +85,117 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ]
 
 
-class MenuItemViewSet(viewsets.ModelViewSet):
-    queryset = MenuItem.objects.all()
+class MenuItemViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    queryset = MenuItem.objects.select_related("category")
     serializer_class = MenuItemSerializer
     permission_classes = [IsManager]
+    pagination_class = MenuItemPagination
+    cache_namespace = MENU_NAMESPACE
+    throttle_scope = "menu"
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
+        MenuItemSearchFilter,
         filters.OrderingFilter,
     ]
     filterset_fields = ["category", "featured"]
-    search_fields = ["title"]
     ordering_fields = ["price"]
+    cached_headers = (SEARCH_TRUNCATED_HEADER,)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        selection = field_selection(self.request)
+        if selection is None:
+            return queryset
+        fields, expand = selection
+        queryset = load_only(
+            queryset, fields, always=("id", "created", "price", "category", "image")
+        )
+        if "category_name" not in fields:
+            queryset = queryset.select_related(None)
+        return queryset
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        url_name="import",
+        permission_classes=[IsAuthenticated, IsManagerUser],
+        parser_classes=[MultiPartParser],
+    )
+    def import_menu(self, request):
+        """
+        Create or update menu items, matched by name, from an uploaded CSV or
+        JSONL ``file``
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"detail": "Upload the menu as 'file'", "status": "fail"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        file_format = request.data.get("file_format") or guess_format(upload.name)
+        if file_format not in FORMATS:
+            return Response(
+                {"detail": "file_format must be csv or jsonl", "status": "fail"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        report = MenuImport().run(read_rows(upload.file, file_format))
+        return Response(report)
+
+    @action(
+        detail=False,
+        url_path="export",
+        url_name="export",
+        permission_classes=[IsAuthenticated, IsManagerUser],
+    )
+    def export_menu(self, request):
+        """
+        Stream the whole menu as CSV (default) or JSONL (``?file_format=jsonl``)
+        """
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in FORMATS:
+            return Response(
+                {"detail": "file_format must be csv or jsonl", "status": "fail"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        response = StreamingHttpResponse(
+            export_rows(file_format), content_type=CONTENT_TYPES[file_format]
+        )
+        response["Content-Disposition"] = f'attachment; filename="menu.{file_format}"'
+        return response
 
 
 class CartViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {
+        "add_to_cart": "cart_write",
+        "batch": "cart_write",
+        "remove_from_cart": "cart_write",
+    }
 
     def list(self, request):
         """
         List all cart items
         """
-        cart, created = Cart.objects.get_or_create(customer=request.user)
-        serializer = CartSerializer(cart)
+        items = get_cart_store().items(request.user)
+        serializer = CartSerializer({"customer": request.user, "items": items})
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
         """
         Get an item from cart
         """
-        cart_item = get_object_or_404(CartItem, cart__customer=self.request.user, pk=pk)
+        cart_item = get_cart_store().get_item(request.user, pk)
+        if cart_item is None:
+            raise Http404("No CartItem matches the given query.")
         serializer = CartItemSerializer(cart_item)
         return Response(serializer.data)
 
+    @idempotent
     def add_to_cart(self, request):
         """
         Add an item to cart
         """
-        cart, created = Cart.objects.get_or_create(customer=request.user)
-
         item_id = request.data.get("menuitem")
         quantity = int(request.data.get("quantity", 1))
         menuitem = get_object_or_404(MenuItem, pk=item_id)
@@ -83,27 +205,46 @@ class CartViewSet(viewsets.ViewSet):
                 {"detail": "quantity cannot be negative", "status": "fail"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart, menuitem=menuitem
-        )
-
-        if not created:
-            cart_item.quantity = quantity
-        else:
-            cart_item.quantity = quantity
-
-        cart_item.save()
+        cart_item = get_cart_store().set_item(request.user, menuitem, quantity)
 
         # Serialize the cart item after it's saved
         serializer = CartItemSerializer(cart_item)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @idempotent
+    def batch(self, request):
+        """
+        Set or increment many cart lines in one request
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        increment = serializer.validated_data["mode"] == "increment"
+
+        quantities = {}
+        for line in serializer.validated_data["items"]:
+            previous = quantities.get(line["menuitem"], 0) if increment else 0
+            quantities[line["menuitem"]] = previous + line["quantity"]
+
+        menuitems = MenuItem.objects.only("id", "price").in_bulk(quantities)
+        missing = sorted(set(quantities) - set(menuitems))
+        if missing:
+            return Response(
+                {"detail": f"Menu items not found: {missing}", "status": "fail"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        store = get_cart_store()
+        store.update(request.user, quantities, menuitems, increment)
+        items = store.items(request.user)
+        serializer = CartSerializer({"customer": request.user, "items": items})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     def remove_from_cart(self, request, pk=None):
         """
         Remove an item from cart
         """
-        cart_item = get_object_or_404(CartItem, cart__customer=request.user, pk=pk)
-        cart_item.delete()
+        if not get_cart_store().remove(request.user, pk):
+            raise Http404("No CartItem matches the given query.")
         return Response(
             {"detail": "Item removed from cart", "status": "ok"},
             status=status.HTTP_204_NO_CONTENT,
@@ -114,89 +255,198 @@ class OrderViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerializer
     queryset = Order.objects.all()
+    pagination_class = OrderPagination
     filter_backends = [
         DjangoFilterBackend,
         filters.OrderingFilter,
     ]
-    filterset_fields = ["paid", "status"]
+    filterset_fields = {
+        "paid": ["exact"],
+        "status": ["exact"],
+        "total": ["gte", "lte"],
+    }
     ordering_fields = ["created", "total"]
+    throttle_scopes = {"create": "checkout"}
+    # Conditional writes that lose a race re-read the order this many times.
+    update_attempts = 3
+
+    def get_queryset(self):
+        # Views built by hand (benchmark_serialization) have no action.
+        if getattr(self, "action", None) == "partial_update":
+            # Status and crew changes only need the order row itself.
+            return Order.objects.all()
+        selection = field_selection(self.request)
+        if selection is None:
+            return Order.objects.with_totals()
+        fields, expand = selection
+        # Keys used by ordering and the ownership checks are always loaded.
+        queryset = load_only(
+            Order.objects.all(),
+            fields,
+            always=("id", "created", "total", "customer", "delivery_crew", "version"),
+        )
+        related = [
+            name for name in ("customer", "delivery_crew") if name in fields & expand
+        ]
+        if related:
+            queryset = queryset.select_related(*related)
+        if "items" in fields:
+            if "items" in expand:
+                items = OrderItem.objects.select_related("menuitem")
+            else:
+                items = OrderItem.objects.only("id", "order")
+            queryset = queryset.prefetch_related(Prefetch("items", items))
+        return queryset
 
     def get_serializer_class(self):
-        user = self.request.user
-        if (
-            user.is_superuser
-            or user.groups.filter(name__in=["Managers", "Crew"]).exists()
-        ):
+        if get_roles(self.request.user).is_staff_member:
             return CustomOrderSerializer
         return OrderSerializer
 
     def get_permissions(self):
         if self.action in ["list", "update", "partial_update"]:
             permission_classes = [IsAuthenticated]
-            if (
-                self.request.user.groups.filter(name="Managers").exists()
-                or self.request.user.is_superuser
-            ):
+            roles = get_roles(self.request.user)
+            if roles.is_manager:
                 permission_classes.append(IsManager)
-            elif self.request.user.groups.filter(name="Crew").exists():
+            elif roles.is_crew:
                 permission_classes.append(IsDeliveryCrew)
 
         return [permission() for permission in self.permission_classes]
 
     def list(self, request, *args, **kwargs):
         user = request.user
-        if user.groups.filter(name="Managers").exists() or user.is_superuser:
-            queryset = Order.objects.all()
-        elif user.groups.filter(name="Crew").exists():
-            queryset = Order.objects.filter(delivery_crew=user)
+        roles = get_roles(user)
+        if roles.is_manager:
+            queryset = self.get_queryset()
+        elif roles.is_crew:
+            queryset = self.get_queryset().filter(delivery_crew=user)
         else:
-            queryset = Order.objects.filter(customer=user)
-
-        serializer = self.get_serializer(queryset, many=True)
-
-        return Response(serializer.data)
+            queryset = self.get_queryset().filter(customer=user)
+
+        queryset = self.filter_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        url_path="export",
+        url_name="export",
+        permission_classes=[IsAuthenticated, IsManagerUser],
+    )
+    def export(self, request):
+        """
+        Stream order history with its items as CSV or NDJSON
+        """
+        params = OrderExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = dict(params.validated_data)
+        file_format = filters.pop("file_format")
+        response = StreamingHttpResponse(
+            export_orders(file_format, **filters),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="orders.{file_format}"'
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="assign",
+        url_name="assign",
+        permission_classes=[IsAuthenticated, IsManagerUser],
+    )
+    def assign(self, request):
+        """
+        Assign unassigned pending orders to the least loaded delivery crew
+        """
+        serializer = OrderAssignmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = assign_pending_orders(**serializer.validated_data)
+        return Response(report, status=status.HTTP_200_OK)
 
     def retrieve(self, request, *args, **kwargs):
         order = self.get_object()
         user = request.user
         if (
-            user.groups.filter(name="Managers").exists()
-            or user.is_superuser
-            or order.customer == user
-            or order.delivery_crew == user
+            get_roles(user).is_manager
+            or order.customer_id == user.pk
+            or order.delivery_crew_id == user.pk
         ):
             serializer = self.get_serializer(order)
-            return Response(serializer.data)
+            return Response(
+                serializer.data, headers={"ETag": version_etag(order.version)}
+            )
         return Response(
             {"detail": "Not authorized to view this order"},
             status=status.HTTP_403_FORBIDDEN,
         )
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         user = request.user
-        if user.groups.filter(Q(name="Managers") | Q(name="Crew")):
+        if get_roles(user).is_staff_member:
             return Response(
                 {"only customers can make orders"}, status=status.HTTP_403_FORBIDDEN
             )
 
-        cart = Cart.objects.get(customer=user)
-        if cart.items.count() == 0:
+        try:
+            return self.place_order(user)
+        except OperationalError as exc:
+            # SQLite has no row locks: a concurrent checkout of the same cart
+            # cannot get the write lock instead of waiting for it.
+            if "locked" not in str(exc):
+                raise
             return Response(
-                {"detail": "Cart is empty", "status": "fail"},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"detail": "The cart is already being checked out.", "status": "fail"},
+                status=status.HTTP_409_CONFLICT,
             )
-        order = Order.objects.create(customer=user)
-        for item in cart.items.all():
-            OrderItem.objects.create(
-                order=order, menuitem=item.menuitem, quantity=item.quantity
+
+    def place_order(self, user):
+        with get_cart_store().checkout(user), transaction.atomic():
+            # Lock the cart so a concurrent double-submit waits here and then
+            # finds the cart already emptied (on PostgreSQL; see create).
+            cart = Cart.objects.select_for_update().filter(customer=user).first()
+            items = []
+            if cart is not None:
+                items = list(cart.items.select_related("menuitem"))
+            if not items:
+                return Response(
+                    {"detail": "Cart is empty", "status": "fail"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            order = Order.objects.create(
+                customer=user,
+                total=sum(item.menuitem.price * item.quantity for item in items),
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(
+                    order=order,
+                    menuitem=item.menuitem,
+                    quantity=item.quantity,
+                    price=item.menuitem.price,
+                )
+                for item in items
+            )
+            cart.items.all().delete()
+            # Committed together with the order; a worker updates the rollups.
+            enqueue(
+                record_order_sales.task_name,
+                {"order_id": order.pk, "status": order.status},
             )
-        cart.items.all().delete()
-        serializer = self.get_serializer(order)
+        serializer = self.get_serializer(self.get_queryset().get(pk=order.pk))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def update(self, request, *args, **kwargs):
-        user = request.user
-        if user.groups.filter(name="Managers").exists() or user.is_superuser:
+        if get_roles(request.user).is_manager:
+            etags = if_match(request)
+            if etags is not None:
+                order = self.get_object()
+                if not matches(etags, order.version):
+                    return precondition_failed(order.version)
             return super().update(request, *args, **kwargs)
         return Response(
             {"detail": "Not authorized to update this order."},
@@ -204,41 +454,85 @@ class OrderViewSet(viewsets.ModelViewSet):
         )
 
     def partial_update(self, request, *args, **kwargs):
-        user = request.user
+        roles = get_roles(request.user)
         order = self.get_object()
-        if (
-            user.groups.filter(name="Managers").exists()
-            or user.is_superuser
-            or user.groups.filter(name="Crew").exists()
-        ):
-            if "status" in request.data:
-                order.status = request.data["status"]
-                order.save()
-                return Response(
-                    {"order_status": order.status}, status=status.HTTP_200_OK
-                )
+        if not roles.is_staff_member:
+            return Response(
+                {"detail": "Not authorized to update this order."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
 
-            if "delivery_crew" in request.data and (
-                user.groups.filter(name="Managers").exists() or user.is_superuser
-            ):
-                order.delivery_crew = get_object_or_404(
-                    User, pk=request.data["delivery_crew"]
-                )
-                order.save()
-                serializer = UserSerializer(order.delivery_crew)
+        if "status" in request.data:
+            if request.data["status"] not in dict(Order.STATUS_CHOICES):
                 return Response(
-                    {"delivery_crew": serializer.data}, status=status.HTTP_200_OK
-                )
-            else:
-                return Response(
-                    {
-                        "detail": "Only the status and delivery_crew fields can be updated."
-                    },
+                    {"detail": "Invalid order status.", "status": "fail"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
+            order, failure = self.apply_changes(
+                order, {"status": request.data["status"]}, if_match(request)
+            )
+            if failure is not None:
+                return failure
+            return Response(
+                {"order_status": order.status},
+                status=status.HTTP_200_OK,
+                headers={"ETag": version_etag(order.version)},
+            )
+
+        if "delivery_crew" in request.data and roles.is_manager:
+            crew = get_object_or_404(User, pk=request.data["delivery_crew"])
+            order, failure = self.apply_changes(
+                order, {"delivery_crew_id": crew.pk}, if_match(request)
+            )
+            if failure is not None:
+                return failure
+            return Response(
+                {"delivery_crew": UserSerializer(crew).data},
+                status=status.HTTP_200_OK,
+                headers={"ETag": version_etag(order.version)},
+            )
         return Response(
-            {"detail": "Not authorized to update this order."},
-            status=status.HTTP_403_FORBIDDEN,
+            {"detail": "Only the status and delivery_crew fields can be updated."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    def apply_changes(self, order, changes, etags):
+        """
+        Write the fields in ``changes`` that differ from ``order`` with one
+        conditional UPDATE, re-reading the order when another write got in
+        first. ``etags`` from If-Match must match the version written over.
+        Returns ``(order, failure)``.
+        """
+        for attempt in range(self.update_attempts):
+            if attempt:
+                order = self.get_object()
+            if not matches(etags, order.version):
+                return order, precondition_failed(order.version)
+            changed = {
+                name: value
+                for name, value in changes.items()
+                if getattr(order, name) != value
+            }
+            if not changed:
+                return order, None
+            old_status, old_crew_id = order.status, order.delivery_crew_id
+            with transaction.atomic():
+                if order.update_if_version(order.version, **changed):
+                    if order.status != old_status:
+                        # Committed with the change; a worker moves the sales.
+                        enqueue(
+                            move_order_sales.task_name,
+                            {
+                                "order_id": order.pk,
+                                "old_status": old_status,
+                                "new_status": order.status,
+                            },
+                        )
+                    publish_order_change(order, old_crew_id)
+                    return order, None
+        return order, Response(
+            {"detail": "The order is being changed, try again.", "status": "fail"},
+            status=status.HTTP_409_CONFLICT,
         )
 
 
@@ -338,3 +632,117 @@ class DeliveryCrewViewSet(viewsets.ViewSet):
             {"detail": "User is removed from Delivery Crew group.", "status": "ok"},
             status=status.HTTP_204_NO_CONTENT,
         )
+
+
+class CacheStatsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def list(self, request):
+        """
+        Hit/miss counters for the response cache
+        """
+        return Response(get_cache_stats(MENU_NAMESPACE))
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    pagination_class = JobPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["status", "name"]
+
+    @action(detail=False)
+    def summary(self, request):
+        """
+        Number of jobs per status and the oldest job still waiting to run
+        """
+        counts = dict(
+            Job.objects.values_list("status").annotate(count=Count("id")).order_by()
+        )
+        oldest = Job.objects.filter(status=Job.QUEUED).aggregate(Min("run_at"))
+        return Response(
+            {
+                "counts": {key: counts.get(key, 0) for key, _ in Job.STATUS_CHOICES},
+                "oldest_queued": oldest["run_at__min"],
+            }
+        )
+
+    @action(detail=True, methods=["post"])
+    def retry(self, request, pk=None):
+        """
+        Queue a failed job again
+        """
+        job = self.get_object()
+        if not retry_job(job):
+            return Response(
+                {"detail": "Only failed jobs can be retried", "status": "fail"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+
+class SalesAnalyticsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated, IsManagerUser]
+
+    def filter_rollups(self, queryset):
+        params = SalesQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        # Rows emptied by a status change are kept with zero counts.
+        queryset = queryset.filter(orders__gt=0)
+        if "start" in params.validated_data:
+            queryset = queryset.filter(date__gte=params.validated_data["start"])
+        if "end" in params.validated_data:
+            queryset = queryset.filter(date__lte=params.validated_data["end"])
+        if "status" in params.validated_data:
+            queryset = queryset.filter(status=params.validated_data["status"])
+        else:
+            queryset = queryset.exclude(status="canceled")
+        return queryset
+
+    def list(self, request):
+        """
+        Quantity and revenue per day
+        """
+        rows = (
+            self.filter_rollups(DailyCategorySales.objects.all())
+            .values("date")
+            .annotate(total_quantity=Sum("quantity"), total_revenue=Sum("revenue"))
+            .order_by("date")
+        )
+        return Response(DailySalesSerializer(rows, many=True).data)
+
+    @action(detail=False, url_path="menu-items")
+    def menu_items(self, request):
+        """
+        Orders, quantity and revenue per menu item
+        """
+        rows = (
+            self.filter_rollups(DailyMenuItemSales.objects.all())
+            .values("menuitem", "menuitem__name")
+            .annotate(
+                total_orders=Sum("orders"),
+                total_quantity=Sum("quantity"),
+                total_revenue=Sum("revenue"),
+            )
+            .order_by("-total_revenue")
+        )
+        return Response(MenuItemSalesSerializer(rows, many=True).data)
+
+    @action(detail=False)
+    def categories(self, request):
+        """
+        Orders, quantity and revenue per category
+        """
+        rows = (
+            self.filter_rollups(DailyCategorySales.objects.all())
+            .values("category", "category__name")
+            .annotate(
+                total_orders=Sum("orders"),
+                total_quantity=Sum("quantity"),
+                total_revenue=Sum("revenue"),
+            )
+            .order_by("-total_revenue")
+        )
+        return Response(CategorySalesSerializer(rows, many=True).data)
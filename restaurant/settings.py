@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 import os
+import sys
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -33,6 +36,8 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8080",
     "http://localhost:8080",
 ]
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key", "if-match")
+CORS_EXPOSE_HEADERS = ["ETag", "X-Search-Truncated"]
 
 
 # Application definition
@@ -54,6 +59,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.ServerTimingMiddleware",
+    "api.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -92,9 +99,87 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"timeout": 20},
     }
 }
 
+# Read replicas as a comma-separated list of database names. With SQLite, a
+# second file works as a local stand-in; refresh it from the primary with
+# `manage.py sync_sqlite_replicas`. Leave DB_REPLICAS unset when running the
+# tests; they cover the routing with DATABASE_REPLICAS overridden.
+DATABASE_REPLICAS = []
+for index, name in enumerate(filter(None, os.getenv("DB_REPLICAS", "").split(","))):
+    alias = f"replica{index + 1}"
+    DATABASES[alias] = {**DATABASES["default"], "NAME": name}
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["api.dbrouter.ReplicaRouter"]
+# Models whose reads may be served by a replica in safe requests.
+DATABASE_REPLICA_MODELS = [
+    "api.Category",
+    "api.MenuItem",
+    "api.Order",
+    "api.OrderItem",
+    "api.DailyMenuItemSales",
+    "api.DailyCategorySales",
+]
+# Keep a client on the primary for this long after it wrote something.
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+# Applied to every new SQLite connection. WAL lets readers run alongside
+# the writer.
+SQLITE_PRAGMAS = {"journal_mode": "wal", "synchronous": "normal"}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Cached responses, roles, rate limit buckets, idempotency keys and
+# cache-resident carts must be seen by every worker process, so the cache
+# has to be shared. Use Redis (REDIS_URL) in production: its add/incr are
+# atomic across processes. Without it, a file cache shares entries between
+# the processes of one host, but its add/incr read and then write, so the
+# idempotency and cart locks and the rate limits are best-effort there (see
+# the api.W001 check). Tests get a fresh in-memory cache.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+elif sys.argv[1:2] == ["test"]:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "restaurant-tests",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+    SILENCED_SYSTEM_CHECKS = ["api.W001"]
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR", BASE_DIR / ".cache"),
+            "OPTIONS": {"MAX_ENTRIES": 50000},
+        }
+    }
+
+API_RESPONSE_CACHE_TIMEOUT = 60 * 10
+ROLE_CACHE_TIMEOUT = 30
+
+# Background jobs (manage.py run_jobs). Failed jobs are retried after
+# JOB_RETRY_BACKOFF * 2 ** (attempt - 1) seconds, up to JOB_RETRY_BACKOFF_MAX.
+JOB_CONCURRENCY = 4
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10
+JOB_RETRY_BACKOFF_MAX = 60 * 60
+JOB_LOCK_TIMEOUT = 60 * 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -133,6 +218,13 @@ USE_TZ = True
 STATIC_URL = "static/"
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Resized derivatives of menu item images (longest side in pixels), rendered
+# by MENU_IMAGE_WORKERS background processes (0 renders them inline).
+MENU_IMAGE_SIZES = {"thumb": 160, "small": 480, "large": 1024}
+MENU_IMAGE_FORMATS = ("webp", "jpeg")
+MENU_IMAGE_WORKERS = 2
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -140,15 +232,89 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "api.renderers.ORJSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
     ],
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
     ],
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "api.authentication.CachedTokenAuthentication",
+        "api.authentication.RoleJWTAuthentication",
+        "rest_framework.authentication.SessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+    "DEFAULT_THROTTLE_CLASSES": ["api.throttling.RoleRateThrottle"],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+# Token-bucket rate limits, see api/throttling.py. "120/min" allows bursts
+# of 120 requests and refills at 120 per minute. Roles missing from a scope
+# use the "default" scope's rate, in a bucket of their own.
+API_THROTTLE_RATES = {
+    "default": {
+        "anonymous": "60/min",
+        "customer": "120/min",
+        "crew": "300/min",
+        "manager": "600/min",
+    },
+    "menu": {"anonymous": "120/min", "customer": "300/min"},
+    "cart_write": {"customer": "60/min"},
+    "checkout": {"customer": "10/min"},
+}
+
+# Order status events streamed at /api/v1/async/orders/events/, see
+# api/events.py. The in-process broker only reaches clients connected to the
+# same process; point ORDER_EVENTS_BACKEND at a shared broker to run several.
+ORDER_EVENTS_BACKEND = "api.events.InProcessBroker"
+ORDER_EVENTS_KEEPALIVE = 15
+ORDER_EVENTS_QUEUE_SIZE = 100
+
+# Responses to POSTs with an Idempotency-Key are replayed to retries for
+# IDEMPOTENCY_KEY_TIMEOUT seconds, see api/idempotency.py. A retry arriving
+# while the first request runs waits up to IDEMPOTENCY_WAIT seconds for it.
+IDEMPOTENCY_KEY_TIMEOUT = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+IDEMPOTENCY_WAIT = 10
+
+# Where carts live, see api/carts.py. "api.carts.CacheCartStore" keeps them
+# in the cache and writes them to the database at checkout and in a flush job
+# CART_FLUSH_INTERVAL seconds (None: only at checkout) after the first change.
+CART_BACKEND = "api.carts.DatabaseCartStore"
+CART_CACHE_TIMEOUT = 60 * 60 * 24 * 14
+CART_FLUSH_INTERVAL = 60 * 5
+
+# Token -> user cache of CachedTokenAuthentication (per process).
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TIMEOUT = 60
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "api.authentication.RoleTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.authentication.RoleTokenRefreshSerializer",
+}
+
+# Per-request timing, see api/middleware.py
+SERVER_TIMING_SLOW_REQUEST_MS = 500
+SERVER_TIMING_SLOW_QUERIES = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # Set API_LOG_LEVEL=INFO to log the timing line of every request.
+        "api": {
+            "handlers": ["console"],
+            "level": os.getenv("API_LOG_LEVEL", "WARNING"),
+        },
+    },
+}
+
 DJOSER = {
     "USER_ID_FILED": "username",
     "LOGIN_FIELD": "email",
@@ -30,6 +30,7 @@ urlpatterns = [
     path("api/v1/", include("api.urls")),
     path("api-auth/", include("rest_framework.urls")),
     path("auth/", include("djoser.urls.authtoken"), name="token-login"),
+    path("auth/", include("djoser.urls.jwt")),
     path("accounts/", include("djoser.urls")),
 ]
 